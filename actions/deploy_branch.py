@@ -1,18 +1,32 @@
 from enum import Enum
 
+from concurrent.futures import ThreadPoolExecutor
+from helpers.approval_tracker import ApprovalOutcome, get_approval_tracker
+from helpers.bulk_deploy_results import BranchDeployResult, get_bulk_deploy_result_store
 from helpers.blocks import generate_deploy_preamble_block, generate_divider_block, \
     generate_deploy_approved_at_timestamp_block, generate_deploy_cancelled_at_timestamp_block, \
-    generate_deploy_commit_block
+    generate_deploy_commit_block, generate_branch_deploy_result_block
 from helpers.command_helpers import BASE_CIRCLE_CI_API_URL, parse_argument, SlackHerokuDeployError
+from helpers.http_client import http_post
+from helpers.pending_approvals import get_pending_approval_store
+from helpers.rate_limiter import with_request_priority
 from http import HTTPStatus
+from requests import RequestException
 from slack_sdk import WebClient
-from typing import Dict
+from typing import Dict, List, Optional
 import json
 import logging
-import requests
+import os
 
 LOG = logging.getLogger(__name__)
 
+# Each branch of a bulk deploy prompt has its approve button in an actions block with this block_id prefix
+BRANCH_DEPLOY_BLOCK_ID_PREFIX = 'deploy_branch:'
+# and, once approved or failed, its result in a section block with this one
+BRANCH_DEPLOY_RESULT_BLOCK_ID_PREFIX = 'deploy_result:'
+APPROVE_ALL_DEPLOYS_ACTION = 'approve_all_deploys'
+CIRCLE_CI_APPROVAL_MAX_WORKERS = int(os.environ.get('CIRCLE_CI_APPROVAL_MAX_WORKERS', 8))
+
 
 class DeployPromptContext(Enum):
     BRANCH_NAME = 'branch_name'
@@ -26,6 +40,15 @@ class BranchDeployError(SlackHerokuDeployError):
     pass
 
 
+def get_branch_name_from_block_id(block_id: str) -> Optional[str]:
+    """ The branch of a bulk deploy prompt's approve button or result block
+    """
+    for prefix in (BRANCH_DEPLOY_BLOCK_ID_PREFIX, BRANCH_DEPLOY_RESULT_BLOCK_ID_PREFIX):
+        if block_id.startswith(prefix):
+            return block_id[len(prefix):]
+    return None
+
+
 class BranchDeployAction:
     def __init__(self, body: Dict, web_client: WebClient, circle_ci_token: str):
         self.body = body
@@ -37,24 +60,95 @@ class BranchDeployAction:
 
         LOG.info(f'Action entry: {self.action}')
         block_context = json.loads(self.action['value'])
+        # The approve all button of a bulk deploy prompt only carries the branch pattern
         self.branch_name = block_context[DeployPromptContext.BRANCH_NAME.value]
-        self.commit_sha = block_context[DeployPromptContext.COMMIT_SHA.value]
-        self.commit_subject = block_context[DeployPromptContext.COMMIT_SUBJECT.value]
-        self.job_id = block_context[DeployPromptContext.JOB_ID.value]
-        self.workflow_id = block_context[DeployPromptContext.WORKFLOW_ID.value]
+        self.commit_sha = block_context.get(DeployPromptContext.COMMIT_SHA.value)
+        self.commit_subject = block_context.get(DeployPromptContext.COMMIT_SUBJECT.value)
+        self.job_id = block_context.get(DeployPromptContext.JOB_ID.value)
+        self.workflow_id = block_context.get(DeployPromptContext.WORKFLOW_ID.value)
 
     def deploy(self) -> None:
+        outcome = self.approve_job(branch_name=self.branch_name, workflow_id=self.workflow_id, job_id=self.job_id)
+        if outcome.is_duplicate:
+            # Another click of the button already updated the prompt. Slack never redelivers interactive payloads,
+            # so repeated clicks are the only duplicates, and the single-flight on job ID is what catches them
+            LOG.info(f'Ignoring duplicate approval of job {self.job_id} for {self.branch_name}')
+            if outcome.error:
+                raise BranchDeployError(outcome.error)
+            return
+        if outcome.error:
+            raise BranchDeployError(outcome.error)
+
+        if self.action.get('block_id', '').startswith(BRANCH_DEPLOY_BLOCK_ID_PREFIX):
+            self.update_bulk_deploy_prompt(results={self.branch_name: None})
+            return
+        timestamp = self.body['message']['ts']
+        blocks = self.generate_deploy_approved_at_timestamp_message(timestamp=timestamp)
+        self.web_client.chat_update(channel=self.body['channel']['id'], ts=timestamp, blocks=blocks)
+
+    def deploy_all(self) -> None:
+        """ Approve every branch of a bulk deploy prompt that still has its approve button, all at once,
+        then report each branch's result in a single update of the prompt
+        """
+        deploy_contexts = self.get_pending_deploy_contexts()
+        if not deploy_contexts:
+            raise BranchDeployError(f'No branches matching {self.branch_name} are left to approve')
+
+        with ThreadPoolExecutor(max_workers=min(len(deploy_contexts), CIRCLE_CI_APPROVAL_MAX_WORKERS)) as executor:
+            approvals = {
+                context[DeployPromptContext.BRANCH_NAME.value]: executor.submit(
+                    with_request_priority(self.approve_job),
+                    branch_name=context[DeployPromptContext.BRANCH_NAME.value],
+                    workflow_id=context[DeployPromptContext.WORKFLOW_ID.value],
+                    job_id=context[DeployPromptContext.JOB_ID.value],
+                ) for context in deploy_contexts
+            }
+        outcomes = {branch_name: approval.result() for branch_name, approval in approvals.items()}
+        if all(outcome.is_duplicate for outcome in outcomes.values()):
+            LOG.info(f'Ignoring duplicate approval of all branches matching {self.branch_name}')
+            return
+
+        results: Dict[str, Optional[str]] = {}
+        for branch_name, outcome in outcomes.items():
+            if outcome.error:
+                LOG.error(f'Unable to approve {branch_name}: {outcome.error}')
+            results[branch_name] = outcome.error
+        self.update_bulk_deploy_prompt(results=results)
+
+    def update_bulk_deploy_prompt(self, results: Dict[str, Optional[str]]) -> None:
+        """ Record each branch's error, or None once approved, and update the prompt with every result so far
+        """
+        channel_id, timestamp = self.body['channel']['id'], self.body['message']['ts']
+        branch_results = {branch_name: BranchDeployResult(user_id=self.user_id, error=error)
+                          for branch_name, error in results.items()}
+        with get_bulk_deploy_result_store().record_results(channel_id, timestamp, branch_results) as all_results:
+            blocks = self.generate_bulk_deploy_results_message(results=all_results, timestamp=timestamp)
+            self.web_client.chat_update(channel=channel_id, ts=timestamp, blocks=blocks)
+
+    def approve_job(self, branch_name: str, workflow_id: str, job_id: str) -> ApprovalOutcome:
+        """ Approve a job once, however many clicks or retries ask for it, see helpers.approval_tracker
+        """
+        return get_approval_tracker().approve(job_id, lambda: self.send_approval(branch_name=branch_name,
+                                                                                 workflow_id=workflow_id,
+                                                                                 job_id=job_id))
+
+    def send_approval(self, branch_name: str, workflow_id: str, job_id: str) -> None:
         # https://circleci.com/docs/api/v2/#operation/approvePendingApprovalJobById
-        response = requests.post(BASE_CIRCLE_CI_API_URL + 'workflow/' + self.workflow_id + '/approve/' + self.job_id,
-                                 headers=self.circle_headers)
+        try:
+            response = http_post(BASE_CIRCLE_CI_API_URL + 'workflow/' + workflow_id + '/approve/' + job_id,
+                                 endpoint='circleci.approve', headers=self.circle_headers)
+        except RequestException as e:
+            raise BranchDeployError(f'Unable to reach CircleCI to approve job {job_id}: {e}')
         if response.status_code != HTTPStatus.ACCEPTED:
             raise BranchDeployError(f'Bad status received from CircleCI: {response.status_code} '
-                                    f'for approving job {self.job_id}:\n {response.content.decode("utf-8")}')
+                                    f'for approving job {job_id}:\n {response.content.decode("utf-8")}')
 
         LOG.info(f'Got status {response.status_code} for job approval, info: {response.content.decode("utf-8")}')
-        timestamp = self.body['message']['ts']
-        blocks = self.generate_deploy_approved_at_timestamp_message(timestamp=timestamp)
-        self.web_client.chat_update(channel=self.body['channel']['id'], ts=timestamp, blocks=blocks)
+        get_pending_approval_store().clear_approval_job(branch_name, workflow_id)
+
+    def get_pending_deploy_contexts(self) -> List[Dict]:
+        return [json.loads(block['elements'][0]['value']) for block in self.body['message'].get('blocks', [])
+                if block.get('block_id', '').startswith(BRANCH_DEPLOY_BLOCK_ID_PREFIX)]
 
     def cancel_prompt(self):
         timestamp = self.body['message']['ts']
@@ -82,6 +176,35 @@ class BranchDeployAction:
         ]
         return all_blocks
 
+    def generate_bulk_deploy_results_message(self, results: Dict[str, BranchDeployResult],
+                                             timestamp: str) -> List[Dict]:
+        """ Swap the approve button of each approved branch in a bulk deploy prompt for who approved it. Branches
+        that failed keep their button below the error, and approve all goes once no buttons are left. The message
+        may be from before or after an earlier update, so results already shown are rendered again in place.
+        """
+        blocks = []
+        rendered_branches = set()
+        for block in self.body['message']['blocks']:
+            block_id = block.get('block_id', '')
+            branch_name = get_branch_name_from_block_id(block_id)
+            result = results.get(branch_name) if branch_name else None
+            if result is None:
+                blocks.append(block)
+                continue
+
+            if branch_name not in rendered_branches:
+                blocks.append(generate_branch_deploy_result_block(
+                    branch_name=branch_name, timestamp=timestamp, user_id=result.user_id, error=result.error,
+                    block_id=BRANCH_DEPLOY_RESULT_BLOCK_ID_PREFIX + branch_name
+                ))
+                rendered_branches.add(branch_name)
+            if block_id.startswith(BRANCH_DEPLOY_BLOCK_ID_PREFIX) and result.error is not None:
+                blocks.append(block)
+
+        if not any(block.get('block_id', '').startswith(BRANCH_DEPLOY_BLOCK_ID_PREFIX) for block in blocks):
+            blocks = [block for block in blocks if block.get('block_id') != APPROVE_ALL_DEPLOYS_ACTION]
+        return blocks
+
     def generate_deploy_canceled_at_timestamp_message(self, timestamp: str):
         section_block = generate_deploy_preamble_block(branch_name=self.branch_name)
         commit_block = generate_deploy_commit_block(commit_sha=self.commit_sha, commit_subject=self.commit_subject)
@@ -0,0 +1,135 @@
+from aiohttp import web
+from concurrent.futures import ThreadPoolExecutor
+from slack_bolt.adapter.aiohttp import to_aiohttp_response, to_bolt_request
+from slack_bolt.async_app import AsyncAck, AsyncApp, AsyncBoltRequest
+from slack_bolt.context.ack import Ack
+from slack_bolt.context.respond import Respond
+from slack_bolt.context.say import Say
+from http import HTTPStatus
+from typing import Callable, Dict, Optional
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import time
+
+from helpers.metrics import instrument_listener, record_duration
+from helpers.prometheus import PROMETHEUS_CONTENT_TYPE, render_metrics
+from listeners import ACTION_LISTENERS, COMMAND_LISTENERS, MESSAGE_LISTENERS, client, start_background_workers
+
+LOG = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Listeners block on GitHub, Heroku and CircleCI, so they run on these threads while the event loop
+# keeps acknowledging and dispatching other requests
+ASYNC_LISTENER_MAX_WORKERS = int(os.environ.get("ASYNC_LISTENER_MAX_WORKERS", 32))
+
+async_app = AsyncApp(
+    token=os.environ.get("SLACK_BOT_TOKEN"),
+    signing_secret=os.environ.get("SLACK_SIGNING_SECRET")
+)
+listener_executor = ThreadPoolExecutor(max_workers=ASYNC_LISTENER_MAX_WORKERS, thread_name_prefix="slack-listener")
+
+
+async def run_blocking(function: Callable, *args, **kwargs):
+    """ Run a blocking function on the listener threads, carrying over context such as the request priority
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        listener_executor, functools.partial(context.run, function, *args, **kwargs)
+    )
+
+
+def get_channel_id(body: Dict, payload: Dict) -> Optional[str]:
+    return body.get("channel_id") or body.get("channel", {}).get("id") or payload.get("channel")
+
+
+def to_async_listener(listener: Callable, name: Optional[str] = None) -> Callable:
+    """ Wrap one of the listeners shared with the Bolt App: acknowledge straight away on the event loop,
+    then run the listener on a listener thread with synchronous say and respond utilities. Given the name
+    it's instrumented under, the ack is timed here, as the listener itself only gets a stand-in.
+    """
+    listener_args = inspect.signature(listener).parameters
+    if name:
+        listener = instrument_listener(name, inspect.unwrap(listener), time_ack=False)
+
+    async def async_listener(ack: AsyncAck, body: Dict, payload: Dict, request: AsyncBoltRequest) -> None:
+        started_at = time.monotonic()
+        await ack()
+        if name:
+            record_duration(f"ack.{name}", time.monotonic() - started_at)
+        available_args = {
+            "ack": Ack(),
+            "body": body,
+            "command": payload,
+            "message": payload,
+            "request": request,
+            "respond": Respond(response_url=body.get("response_url")),
+            "say": Say(client=client, channel=get_channel_id(body, payload)),
+        }
+        await run_blocking(listener, **{name: available_args[name] for name in listener_args})
+
+    async_listener.__name__ = listener.__name__
+    return async_listener
+
+
+for keyword, message_listener in MESSAGE_LISTENERS.items():
+    async_app.message(keyword)(to_async_listener(message_listener, name=keyword))
+for command_name, command_listener in COMMAND_LISTENERS.items():
+    async_app.command(command_name)(to_async_listener(command_listener, name=command_name))
+for action_id, action_listener in ACTION_LISTENERS.items():
+    async_app.action(action_id)(to_async_listener(action_listener, name=action_id))
+
+
+async def slack_events(request: web.Request) -> web.Response:
+    bolt_request = await to_bolt_request(request)
+    bolt_response = await async_app.async_dispatch(bolt_request)
+    return await to_aiohttp_response(bolt_response)
+
+
+async def heroku_release_webhook(request: web.Request) -> web.Response:
+    # Imported on first use, like the listeners, to keep dyno boots short
+    from webhooks.heroku_release import HerokuReleaseWebhook, HerokuReleaseWebhookError
+
+    body = await request.read()
+    try:
+        app_name = await run_blocking(HerokuReleaseWebhook(body=body, headers=request.headers).handle)
+    except HerokuReleaseWebhookError as e:
+        LOG.error(e)
+        return web.json_response({'error': str(e)}, status=HTTPStatus.UNAUTHORIZED)
+    return web.json_response({'app': app_name}, status=HTTPStatus.OK)
+
+
+async def circleci_webhook(request: web.Request) -> web.Response:
+    from webhooks.circleci import CircleCIWebhook, CircleCIWebhookError
+
+    body = await request.read()
+    try:
+        branch_name = await run_blocking(CircleCIWebhook(body=body, headers=request.headers, web_client=client).handle)
+    except CircleCIWebhookError as e:
+        LOG.error(e)
+        return web.json_response({'error': str(e)}, status=HTTPStatus.UNAUTHORIZED)
+    return web.json_response({'branch': branch_name}, status=HTTPStatus.OK)
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(body=render_metrics(), headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+
+def create_web_app() -> web.Application:
+    """ Serve the AsyncApp and the webhook endpoints of server.py from a single aiohttp server
+    """
+    web_app = web.Application()
+    web_app.router.add_post("/slack/events", slack_events)
+    web_app.router.add_post("/webhooks/heroku/release", heroku_release_webhook)
+    web_app.router.add_post("/webhooks/circleci", circleci_webhook)
+    web_app.router.add_get("/metrics", metrics)
+    return web_app
+
+
+# Start your app
+if __name__ == "__main__":
+    start_background_workers()
+    web.run_app(create_web_app(), port=int(os.environ.get("PORT", 3000)))
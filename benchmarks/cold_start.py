@@ -0,0 +1,115 @@
+""" Report how long a freshly booted dyno takes before it can acknowledge Slack: the time to import each server
+module, the packages that time goes to, and the time from starting a server process to its first acknowledged
+request. Heavy dependencies (PyGitHub, dateutil, requests) and the command modules should only be loaded by the
+first command that needs them, so the report also lists any of them found loaded at boot.
+
+Each import is measured in a fresh interpreter with `python -X importtime`, with Slack's auth.test stubbed out.
+
+Usage: python -m benchmarks.cold_start [--modules server async_app] [--servers flask aiohttp] [--top 10]
+"""
+from benchmarks.serving import SIGNING_SECRET, generate_signed_request, get_free_port
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Tuple
+import argparse
+import json
+import os
+import requests
+import subprocess
+import sys
+import time
+
+# Loaded on first use by the listeners and webhook routes, never while booting
+LAZY_MODULES = ['github', 'dateutil', 'requests', 'commands', 'actions', 'webhooks']
+IMPORT_SCRIPT = '''
+from unittest.mock import patch
+with patch('slack_sdk.web.client.WebClient.auth_test'):
+    import {module}
+import json, sys
+print(json.dumps(sorted(sys.modules)))
+'''
+MODULES = ['app', 'server', 'async_app']
+SERVERS = ['bolt', 'flask', 'aiohttp']
+
+
+class ImportReport(NamedTuple):
+    module: str
+    seconds: float
+    # Seconds spent importing each top-level package, excluding the packages it imported in turn
+    package_seconds: Dict[str, float]
+    lazy_modules_loaded: List[str]
+
+
+def get_offline_env() -> Dict[str, str]:
+    return {**os.environ, 'SLACK_BOT_TOKEN': 'xoxb-benchmark', 'SLACK_SIGNING_SECRET': SIGNING_SECRET}
+
+
+def measure_import(module: str) -> ImportReport:
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORT_SCRIPT.format(module=module)],
+                               env=get_offline_env(), capture_output=True, text=True, check=True)
+    seconds = 0.0
+    package_seconds: Dict[str, float] = defaultdict(float)
+    subtree: List[Tuple[str, int]] = []
+    # Lines look like "import time: self [us] | cumulative | <indent>name", with each module listed after the
+    # modules it imported and indented one level further, so a top-level import closes the run of lines before it
+    for line in completed.stderr.splitlines():
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        self_us, cumulative_us, name = fields
+        subtree.append((name.strip(), int(self_us)))
+        if name.startswith('  '):
+            continue
+        if name.strip() == module:
+            seconds = int(cumulative_us) / 1e6
+            for imported_name, imported_self_us in subtree:
+                package_seconds[imported_name.split('.')[0]] += imported_self_us / 1e6
+        subtree = []
+
+    loaded_modules = set(json.loads(completed.stdout.splitlines()[-1]))
+    lazy_modules_loaded = [lazy_module for lazy_module in LAZY_MODULES if lazy_module in loaded_modules]
+    return ImportReport(module=module, seconds=seconds, package_seconds=dict(package_seconds),
+                        lazy_modules_loaded=lazy_modules_loaded)
+
+
+def measure_first_ack(server: str, timeout: float = 20) -> float:
+    """ Seconds from starting a server process until it answers a signed Slack request
+    """
+    port = get_free_port()
+    url = f'http://127.0.0.1:{port}/slack/events'
+    started_at = time.monotonic()
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.offline_server', server, str(port)],
+                               env={**get_offline_env(), 'PORT': str(port)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.monotonic() - started_at < timeout:
+            try:
+                requests.post(url, **generate_signed_request(), timeout=5).raise_for_status()
+                return time.monotonic() - started_at
+            except requests.RequestException:
+                time.sleep(0.01)
+        raise RuntimeError(f'{server} server did not answer within {timeout:.0f}s')
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', choices=MODULES, default=MODULES)
+    parser.add_argument('--servers', nargs='+', choices=SERVERS, default=SERVERS)
+    parser.add_argument('--top', type=int, default=10, help='Number of packages to list per module')
+    args = parser.parse_args()
+
+    for module in args.modules:
+        report = measure_import(module)
+        print(f'import {module}: {report.seconds * 1000:.0f}ms, loaded at boot: '
+              f'{", ".join(report.lazy_modules_loaded) or "none of " + ", ".join(LAZY_MODULES)}')
+        top_packages = sorted(report.package_seconds.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for package, package_seconds in top_packages:
+            print(f'    {package:>24}: {package_seconds * 1000:6.1f}ms')
+    for server in args.servers:
+        print(f'first ack from {server}: {measure_first_ack(server) * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+""" Compare the REST and GraphQL GitHub backends behind /commit-list against a local stub server.
+
+Usage: python -m benchmarks.github_backends [--commits 100] [--latency 0.05]
+"""
+from benchmarks.stub_github import StubGitHub
+from unittest.mock import MagicMock, patch
+import argparse
+import os
+import time
+
+
+def run_backend(stub: StubGitHub, backend, repo):
+    from commands.commit_list import CommitList
+    from helpers.compare_cache import CompareCache
+    from helpers.pr_cache import PullRequestCache
+
+    command = {'text': 'stub-app app1', 'user_id': None, 'channel_id': None}
+    commit_list = CommitList(respond=MagicMock(), command=command, backend=backend)
+    stub.reset_request_count()
+    with patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:')), \
+            patch('commands.commit_list.get_compare_cache', return_value=CompareCache()):
+        start = time.perf_counter()
+        blocks = commit_list.get_commits_matching_filter(repo=repo, heroku_git_hash=stub.base,
+                                                         latest_stable_commit=stub.head)
+        elapsed = time.perf_counter() - start
+    return blocks, elapsed, stub.request_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commits', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every stub response')
+    args = parser.parse_args()
+
+    stub = StubGitHub(commit_count=args.commits, latency=args.latency).start()
+    os.environ['GITHUB_GRAPHQL_URL'] = f'{stub.base_url}/graphql'
+
+    from github import Github
+    from helpers.command_helpers import GITHUB_REPOSITORY, GitHubBackend
+    repo = Github(base_url=stub.base_url).get_repo(GITHUB_REPOSITORY)
+
+    try:
+        results = {backend: run_backend(stub, backend, repo) for backend in GitHubBackend}
+    finally:
+        stub.stop()
+
+    rest_blocks, *_ = results[GitHubBackend.REST]
+    graphql_blocks, *_ = results[GitHubBackend.GRAPHQL]
+    assert rest_blocks == graphql_blocks, 'REST and GraphQL backends produced different blocks'
+
+    print(f'{args.commits} commits, {args.latency * 1000:.0f}ms stub latency, {len(rest_blocks)} matching PRs')
+    for backend, (_, elapsed, request_count) in results.items():
+        print(f'{backend.value:>8}: {elapsed:6.2f}s, {request_count:4} requests')
+
+
+if __name__ == '__main__':
+    main()
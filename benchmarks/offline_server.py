@@ -0,0 +1,34 @@
+""" Run one of the bot's servers with Slack's auth.test stubbed out, so it starts without a real bot token.
+
+Usage: python -m benchmarks.offline_server {bolt,flask,gunicorn,aiohttp} PORT
+"""
+from unittest.mock import patch
+import logging
+import sys
+
+
+def main():
+    server, port = sys.argv[1], int(sys.argv[2])
+    logging.disable(logging.INFO)
+    # Patched before gunicorn forks, so its workers inherit the stub
+    patch('slack_sdk.web.client.WebClient.auth_test').start()
+
+    if server == 'bolt':
+        from app import app
+        app.start(port=port)
+    elif server == 'flask':
+        from server import flask_app
+        flask_app.run(host='127.0.0.1', port=port)
+    elif server == 'gunicorn':
+        from gunicorn.app.wsgiapp import run
+        sys.argv = ['gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'server:flask_app']
+        run()
+    elif server == 'aiohttp':
+        from async_app import create_web_app, web
+        web.run_app(create_web_app(), host='127.0.0.1', port=port, access_log=None, print=None)
+    else:
+        raise SystemExit(f'Unknown server {server}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+""" Compare requests/second of the ways to serve the bot: Bolt's development server (`python3 app.py`), Flask's
+development server (`python3 server.py`), gunicorn (the Procfile) and the aiohttp AsyncApp (`python3 async_app.py`).
+
+Each server is started locally with Slack's auth.test stubbed out and sent signed url_verification requests,
+which go through request verification and Bolt's middleware like every Slack request does, for a fixed time.
+
+Usage: python -m benchmarks.serving [--concurrency 16] [--seconds 5] [--servers bolt flask gunicorn aiohttp]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import requests
+import socket
+import subprocess
+import sys
+import time
+
+SIGNING_SECRET = 'benchmark-signing-secret'
+SERVERS = ['bolt', 'flask', 'gunicorn', 'aiohttp']
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def generate_signed_request() -> Dict:
+    body = json.dumps({'type': 'url_verification', 'token': 'benchmark', 'challenge': 'benchmark-challenge'})
+    timestamp = str(int(time.time()))
+    signature = hmac.new(SIGNING_SECRET.encode('utf-8'), f'v0:{timestamp}:{body}'.encode('utf-8'),
+                         hashlib.sha256).hexdigest()
+    return {
+        'data': body,
+        'headers': {'Content-Type': 'application/json', 'X-Slack-Request-Timestamp': timestamp,
+                    'X-Slack-Signature': f'v0={signature}'},
+    }
+
+
+def wait_until_serving(url: str, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.post(url, **generate_signed_request(), timeout=5)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server at {url} did not start')
+
+
+def send_requests(url: str, deadline: float) -> Tuple[List[float], int]:
+    """ Send requests back to back until the deadline, returning the latencies of those answered and
+    how many failed, e.g. connections reset by a server whose listen backlog is full
+    """
+    latencies, errors = [], 0
+    signed_request = generate_signed_request()
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        started_at = time.monotonic()
+        try:
+            response = session.post(url, **signed_request, timeout=10)
+            response.raise_for_status()
+            latencies.append(time.monotonic() - started_at)
+        except requests.RequestException:
+            errors += 1
+            session.close()
+            session = requests.Session()
+    session.close()
+    return latencies, errors
+
+
+def run_server_benchmark(server: str, concurrency: int, seconds: float) -> Dict[str, float]:
+    port = get_free_port()
+    env = {**os.environ, 'SLACK_BOT_TOKEN': 'xoxb-benchmark', 'SLACK_SIGNING_SECRET': SIGNING_SECRET,
+           'PORT': str(port)}
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.offline_server', server, str(port)], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}/slack/events'
+    try:
+        wait_until_serving(url)
+        deadline = time.monotonic() + seconds
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda _: send_requests(url, deadline), range(concurrency)))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    return {
+        'requests_per_second': len(latencies) / seconds,
+        'errors': sum(errors for _, errors in results),
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--servers', nargs='+', choices=SERVERS, default=SERVERS)
+    args = parser.parse_args()
+
+    print(f'{args.concurrency} concurrent clients for {args.seconds:.0f}s each, '
+          f'GUNICORN_WORKERS={os.environ.get("GUNICORN_WORKERS", 1)} GUNICORN_THREADS='
+          f'{os.environ.get("GUNICORN_THREADS", 8)}')
+    for server in args.servers:
+        result = run_server_benchmark(server, concurrency=args.concurrency, seconds=args.seconds)
+        print(f'{server:>8}: {result["requests_per_second"]:7.0f} req/s, p50 {result["p50_ms"]:6.1f}ms, '
+              f'p95 {result["p95_ms"]:6.1f}ms, {result["errors"]:5} errors')
+
+
+if __name__ == '__main__':
+    main()
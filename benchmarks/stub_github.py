@@ -0,0 +1,144 @@
+""" A local stand-in for the GitHub REST and GraphQL APIs, serving a linear `stable` history where
+every commit is the squash merge of one PR. Each request sleeps for `latency` seconds to mimic a round-trip.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Dict, List
+import hashlib
+import json
+import re
+import time
+
+STUB_MERGED_AT = '2021-09-01T12:00:00Z'
+
+
+def generate_sha(index: int) -> str:
+    return hashlib.sha1(str(index).encode('utf-8')).hexdigest()
+
+
+class StubGitHub:
+    def __init__(self, commit_count: int, latency: float, files_per_commit: int = 3):
+        self.latency = latency
+        self.shas = [generate_sha(index) for index in range(commit_count + 1)]
+        self.files = {sha: [f'app{index % 5}/module{index}/file{file_index}.py' for file_index in range(files_per_commit)]
+                      for index, sha in enumerate(self.shas)}
+        self.request_count = 0
+        self._lock = Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.build_handler())
+        self._thread = Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def base(self) -> str:
+        return self.shas[0]
+
+    @property
+    def head(self) -> str:
+        return self.shas[-1]
+
+    def start(self) -> 'StubGitHub':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+    def reset_request_count(self) -> None:
+        with self._lock:
+            self.request_count = 0
+
+    def pull_number(self, sha: str) -> int:
+        return self.shas.index(sha) + 1
+
+    def rest_commit(self, repo_url: str, sha: str, with_files: bool) -> Dict:
+        commit = {'sha': sha, 'url': f'{repo_url}/commits/{sha}', 'commit': {'message': f'Commit {sha}'}}
+        if with_files:
+            commit['files'] = [{'filename': filename, 'status': 'modified'} for filename in self.files[sha]]
+        return commit
+
+    def rest_pull(self, repo_url: str, sha: str) -> Dict:
+        number = self.pull_number(sha)
+        return {'number': number, 'title': f'PR {number}', 'html_url': f'https://github.com/stub/pull/{number}',
+                'url': f'{repo_url}/pulls/{number}', 'merged_at': STUB_MERGED_AT}
+
+    def graphql_pull(self, sha: str) -> Dict:
+        number = self.pull_number(sha)
+        return {'number': number, 'title': f'PR {number}', 'url': f'https://github.com/stub/pull/{number}',
+                'mergedAt': STUB_MERGED_AT,
+                'files': {'pageInfo': {'hasNextPage': False, 'endCursor': None},
+                          'nodes': [{'path': filename} for filename in self.files[sha]]}}
+
+    def handle_rest(self, path: str, repo_url: str):
+        repo_match = re.fullmatch(r'/repos/([^/]+)/([^/]+)(/.*)?', path)
+        if not repo_match:
+            return None
+        owner, name, rest = repo_match.groups()
+        rest = rest or ''
+        if not rest:
+            return {'name': name, 'full_name': f'{owner}/{name}', 'url': repo_url}
+        if rest.startswith('/branches/'):
+            return {'name': rest.split('/')[-1], 'commit': self.rest_commit(repo_url, self.head, with_files=False)}
+        compare_match = re.fullmatch(r'/compare/(\w+)\.\.\.(\w+)', rest)
+        if compare_match:
+            base, head = compare_match.groups()
+            shas = self.shas[self.shas.index(base) + 1:self.shas.index(head) + 1]
+            return {'status': 'ahead', 'total_commits': len(shas),
+                    'merge_base_commit': self.rest_commit(repo_url, base, with_files=False),
+                    'commits': [self.rest_commit(repo_url, sha, with_files=False) for sha in shas]}
+        pulls_match = re.fullmatch(r'/commits/(\w+)/pulls', rest)
+        if pulls_match:
+            return [self.rest_pull(repo_url, pulls_match.group(1))]
+        commit_match = re.fullmatch(r'/commits/(\w+)', rest)
+        if commit_match:
+            return self.rest_commit(repo_url, commit_match.group(1), with_files=True)
+        return None
+
+    def handle_graphql(self, variables: Dict) -> Dict:
+        if 'sha' in variables:
+            commit = {'associatedPullRequests': {'nodes': [self.graphql_pull(variables['sha'])]}}
+            return {'data': {'repository': {'object': commit}}}
+
+        history: List[str] = list(reversed(self.shas[:self.shas.index(variables['head']) + 1]))
+        start = int(variables.get('after') or 0)
+        page = history[start:start + 50]
+        has_next_page = start + 50 < len(history)
+        nodes = [{'oid': sha, 'associatedPullRequests': {'nodes': [self.graphql_pull(sha)]}} for sha in page]
+        history_page = {'pageInfo': {'hasNextPage': has_next_page, 'endCursor': str(start + 50)}, 'nodes': nodes}
+        return {'data': {'repository': {'object': {'history': history_page}}}}
+
+    def build_handler(self):
+        stub = self
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def respond_json(self, body) -> None:
+                with stub._lock:
+                    stub.request_count += 1
+                time.sleep(stub.latency)
+                if body is None:
+                    self.send_response(404)
+                    payload = b'{"message": "Not Found"}'
+                else:
+                    self.send_response(200)
+                    payload = json.dumps(body).encode('utf-8')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                repo_url = stub.base_url + '/'.join(path.split('/')[:4])
+                self.respond_json(stub.handle_rest(path, repo_url))
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                self.respond_json(stub.handle_graphql(request['variables']))
+
+        return StubHandler
@@ -1,12 +1,23 @@
-from github import Github
+from concurrent.futures import ThreadPoolExecutor
+from github.Commit import Commit
 from github.Repository import Repository
-from helpers.blocks import generate_no_commits_block, generate_pr_summary_block
+from helpers.block_stream import BlockStream, SLACK_MAX_RESPONSES
+from helpers.blocks import (
+    generate_app_section_block, generate_compare_error_block, generate_no_commits_block, generate_pr_summary_block
+)
+from helpers.commit_index import get_commit_index
+from helpers.compare_cache import CachedCommit, get_compare_cache, to_cached_commit
+from helpers.deployed_hash_cache import get_cached_heroku_git_hash
+from helpers.github_client import get_branch_head_sha, get_github_repository, get_graphql_source
+from helpers.path_filter import PathFilter
+from helpers.pr_cache import CachedPullRequest, get_or_fetch_commit_pulls
+from helpers.rate_limiter import RateLimitExceeded
 from helpers.command_helpers import (
-    parse_argument, GITHUB_TOKEN, get_heroku_git_hash,
-    ResponseType, SlackHerokuDeployError
+    parse_argument, parse_app_names, has_flag, REFRESH_FLAG, GITHUB_REPOSITORY,
+    ResponseType, SlackHerokuDeployError, COMMIT_LIST_MAX_WORKERS, STABLE_BRANCH, GITHUB_BACKEND, GitHubBackend
 )
 from slack_bolt import Respond
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional, Tuple
 import logging
 import os
 
@@ -18,76 +29,244 @@ class CommitListError(SlackHerokuDeployError):
 
 
 class CommitList:
-    def __init__(self, respond: Respond, command: Dict):
+    def __init__(self,
+                 respond: Respond,
+                 command: Dict,
+                 max_workers: int = COMMIT_LIST_MAX_WORKERS,
+                 backend: GitHubBackend = GITHUB_BACKEND):
         self.respond = respond
         self.command = command
+        self.max_workers = max_workers
+        self.backend = backend
         self.app_name = parse_argument(command_text=self.command['text'], arg_index=0)
+        self.app_names = parse_app_names(self.app_name)
         self.item_filter = parse_argument(command_text=self.command['text'], arg_index=1)
+        self.path_filter = PathFilter(self.item_filter) if self.item_filter else None
+        self.force_refresh = has_flag(command_text=self.command['text'], flag=REFRESH_FLAG)
+        self.rate_limited_count = 0
+        # Commits from this command's own REST comparisons, whose PRs can be listed without fetching the commit again
+        self.compared_commit_objects: Dict[str, Commit] = {}
 
     def get_commit_list(self) -> List[Dict]:
         """ Get a list of commits that have been merged into `stable`
-        since the last time app_name (first parameter) that touched any files
-        listed in the specified item_filter (second parameter)
+        since the last time app_name (first parameter, or several comma-separated apps) was deployed
+        that touched any files listed in the specified item_filter (second parameter),
+        a comma-separated list of paths and globs
         """
-        if not self.app_name or not self.item_filter:
+        if not self.app_names or not self.item_filter:
             raise CommitListError(f'Missing app_name or item_filter in command text')
 
         self.respond(f'`{self.app_name}`: loading latest undeployed commits with item_filter `{self.item_filter}`...',
                      response_type=ResponseType.IN_CHANNEL)
 
-        repo = Github(GITHUB_TOKEN).get_repo('StatesTitle/underwriter')
-        latest_stable_commit = repo.get_branch('stable').commit
+        repo = get_github_repository(GITHUB_REPOSITORY)
+        latest_stable_commit = get_branch_head_sha(GITHUB_REPOSITORY, STABLE_BRANCH)
         LOG.info(f'Got latest stable commit {latest_stable_commit}')
 
-        heroku_git_hash = self.get_deployed_git_hash()
-        filtered_commits = self.get_commits_matching_filter(
-            repo=repo,
-            heroku_git_hash=heroku_git_hash,
-            latest_stable_commit=latest_stable_commit.sha,
-        )
-        self.respond(blocks=filtered_commits, response_type=ResponseType.IN_CHANNEL)
-        return filtered_commits
+        # Apps deployed from the same hash share a single comparison
+        apps_by_git_hash = self.get_apps_by_deployed_git_hash()
+        is_multi_app = len(self.app_names) > 1
+
+        # Stream PRs back as they're found, keeping a response for the summary under Slack's response_url limit
+        block_stream = BlockStream(respond=self.respond, max_messages=SLACK_MAX_RESPONSES - 2)
+        pr_count = 0
+        for heroku_git_hash, app_names in apps_by_git_hash.items():
+            if not is_multi_app:
+                compared_commits = self.try_get_compared_commits(
+                    repo=repo,
+                    heroku_git_hash=heroku_git_hash,
+                    latest_stable_commit=latest_stable_commit,
+                )
+                if compared_commits is None:
+                    return []
+            else:
+                compared_commits, error_message = self.get_compared_commits_or_error(
+                    repo=repo,
+                    base=heroku_git_hash,
+                    head=latest_stable_commit,
+                )
+                block_stream.add(generate_app_section_block(app_names=app_names, git_hash=heroku_git_hash))
+                if compared_commits is None:
+                    # Reported in the apps' section rather than with a response of its own, which would
+                    # take the command past the response_url limit and lose the summary
+                    block_stream.add(generate_compare_error_block(error_message))
+                    continue
+
+            app_pr_count = 0
+            for block in self.generate_pr_summary_blocks(repo=repo, compared_commits=compared_commits):
+                block_stream.add(block)
+                app_pr_count += 1
+            if is_multi_app and not app_pr_count:
+                block_stream.add(generate_no_commits_block(app_name=', '.join(app_names),
+                                                           item_filter=self.item_filter))
+            pr_count += app_pr_count
+        block_stream.flush()
+
+        if not block_stream.block_count:
+            no_commits_block = generate_no_commits_block(app_name=self.app_name, item_filter=self.item_filter)
+            self.respond(blocks=[no_commits_block], response_type=ResponseType.IN_CHANNEL)
+            return [no_commits_block]
+
+        self.respond(self.get_summary_message(block_stream=block_stream, pr_count=pr_count),
+                     response_type=ResponseType.IN_CHANNEL)
+        return block_stream.sent_blocks
+
+    def get_apps_by_deployed_git_hash(self) -> Dict[Optional[str], List[str]]:
+        """ Fetch every app's deployed git hash at the same time, grouping apps that share one
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            git_hashes = list(executor.map(self.get_deployed_git_hash, self.app_names))
+
+        apps_by_git_hash = {}
+        for app_name, git_hash in zip(self.app_names, git_hashes):
+            apps_by_git_hash.setdefault(git_hash, []).append(app_name)
+        return apps_by_git_hash
 
     def get_commits_matching_filter(self,
                                     repo: Repository,
                                     heroku_git_hash: str,
                                     latest_stable_commit: str) -> List[Dict]:
-        results = []
+        compared_commits = self.try_get_compared_commits(
+            repo=repo, heroku_git_hash=heroku_git_hash, latest_stable_commit=latest_stable_commit
+        )
+        if compared_commits is None:
+            return []
+
+        results = list(self.generate_pr_summary_blocks(repo=repo, compared_commits=compared_commits))
+        if not results:
+            results = [generate_no_commits_block(app_name=self.app_name, item_filter=self.item_filter)]
+        return results
+
+    def try_get_compared_commits(self,
+                                 repo: Repository,
+                                 heroku_git_hash: str,
+                                 latest_stable_commit: str) -> Optional[List[CachedCommit]]:
+        compared_commits, error_message = self.get_compared_commits_or_error(
+            repo=repo, base=heroku_git_hash, head=latest_stable_commit
+        )
+        if compared_commits is None:
+            self.respond(error_message, response_type=ResponseType.IN_CHANNEL)
+        return compared_commits
+
+    def get_compared_commits_or_error(self,
+                                      repo: Repository,
+                                      base: str,
+                                      head: str) -> Tuple[Optional[List[CachedCommit]], Optional[str]]:
+        """ Get the compared commits, or None and a message for the user when they can't be retrieved
+        """
         try:
-            comparison = repo.compare(base=heroku_git_hash, head=latest_stable_commit)
+            return self.get_compared_commits(repo=repo, base=base, head=head), None
+        except RateLimitExceeded as e:
+            LOG.warning(f'Unable to compare hashes: {e}')
+            return None, 'GitHub rate limit is running low, unable to retrieve commits. Try again in a few minutes'
         except Exception as e:
             LOG.error(f'Unable to compare hashes: {e}')
-            self.respond('Unable to retrieve commits. See logs for details', response_type=ResponseType.IN_CHANNEL)
-            return []
+            return None, 'Unable to retrieve commits. See logs for details'
 
-        for commit in comparison.commits:
-            LOG.info(f'Found commit in comparison: {commit}')
-            # For each commit, check and see if it affected files in the specified directory
-            valid_files = any(file for file in commit.files if self.item_filter in file.filename)
-            if not valid_files:
-                LOG.debug(f'No files matching `{self.item_filter}` found in {commit}')
-                continue
+    def generate_pr_summary_blocks(self, repo: Repository, compared_commits: List[CachedCommit]) -> Iterator[Dict]:
+        """ Yield a summary block per PR of the commits matching item_filter, in commit order and without duplicates
+        """
+        # For each commit, check and see if it affected files in the specified directory
+        matching_commits = [commit for commit in compared_commits if self.commit_matches_filter(commit)]
 
-            # For relevant commits, generate the summary block in a human readable fashion
-            for pr in commit.get_pulls():
-                LOG.debug(f'Adding {pr} to summary')
-                results.append(generate_pr_summary_block(pr))
+        seen_pr_numbers = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for commit_prs in executor.map(lambda commit: self.try_get_cached_commit_prs(repo, commit),
+                                           matching_commits):
+                if commit_prs is None:
+                    self.rate_limited_count += 1
+                    continue
+                for pr in commit_prs:
+                    if pr.number in seen_pr_numbers:
+                        LOG.debug(f'Skipping duplicate {pr}')
+                        continue
+                    seen_pr_numbers.add(pr.number)
 
-        if not results:
-            results = [generate_no_commits_block(app_name=self.app_name, item_filter=self.item_filter)]
-        return results
+                    # For relevant commits, generate the summary block in a human readable fashion
+                    LOG.debug(f'Adding {pr} to summary')
+                    yield generate_pr_summary_block(pr)
+
+    def get_summary_message(self, block_stream: BlockStream, pr_count: int) -> str:
+        summary = f'`{self.app_name}`: found {pr_count} undeployed PR(s) matching item_filter `{self.item_filter}`'
+        if block_stream.dropped_count:
+            summary += f', {block_stream.dropped_count} not shown due to Slack message limits'
+        if self.rate_limited_count:
+            summary += f', skipped {self.rate_limited_count} uncached commit(s) while GitHub\'s rate limit recovers'
+        return summary
+
+    def get_compared_commits(self, repo: Repository, base: str, head: str) -> List[CachedCommit]:
+        """ Get the commits between base and head with their files, from the local
+        stable commit index when running, else comparing via GitHub the first time a pair of SHAs is seen
+        """
+        commit_index = get_commit_index()
+        if commit_index:
+            indexed_commits = commit_index.get_commits_between(base=base, head=head)
+            if indexed_commits is None and commit_index.get_position(base) is not None:
+                # The head may have landed since the index was last refreshed in the background
+                commit_index.refresh()
+                indexed_commits = commit_index.get_commits_between(base=base, head=head)
+            if indexed_commits is not None:
+                LOG.info(f'Using indexed commits {base}...{head}')
+                return indexed_commits
+
+        compare_cache = get_compare_cache()
+        compared_commits = compare_cache.get(base, head)
+        if compared_commits is not None:
+            LOG.info(f'Using cached comparison {base}...{head}')
+            return compared_commits
+
+        if self.backend is GitHubBackend.GRAPHQL:
+            compared_commits = get_graphql_source(GITHUB_REPOSITORY).get_compared_commits(base=base, head=head)
+        else:
+            comparison = repo.compare(base=base, head=head)
+            commits = list(comparison.commits)
+            self.compared_commit_objects.update((commit.sha, commit) for commit in commits)
+            # Files are lazily fetched per commit, so look them up on a bounded pool; PRs are only looked up
+            # later for the commits matching item_filter. `map` yields in submission order, keeping commit order
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                compared_commits = list(executor.map(to_cached_commit, commits))
+
+        compare_cache.put(base, head, compared_commits)
+        return compared_commits
+
+    def commit_matches_filter(self, commit: CachedCommit) -> bool:
+        if not self.path_filter.matches_any(commit.filenames):
+            LOG.debug(f'No files matching `{self.item_filter}` found in {commit.sha}')
+            return False
+        return True
+
+    def get_cached_commit_prs(self, repo: Repository, commit: CachedCommit) -> List[CachedPullRequest]:
+        if commit.pr_numbers is not None and not commit.pr_numbers:
+            return []
+
+        def fetch_pulls():
+            commit_object = self.compared_commit_objects.get(commit.sha) or repo.get_commit(commit.sha)
+            return commit_object.get_pulls()
+        return get_or_fetch_commit_pulls(commit.sha, fetch_pulls)
+
+    def try_get_cached_commit_prs(self, repo: Repository, commit: CachedCommit) -> Optional[List[CachedPullRequest]]:
+        """ Get a commit's PRs, or None when they aren't cached and GitHub's rate limit budget is exhausted
+        """
+        try:
+            return self.get_cached_commit_prs(repo, commit)
+        except RateLimitExceeded as e:
+            LOG.warning(f'Skipping PRs of {commit.sha}: {e}')
+            return None
 
-    def get_deployed_git_hash(self):
+    def get_deployed_git_hash(self, app_name: str) -> Optional[str]:
         sample_heroku_git_hash = os.environ.get('SAMPLE_HEROKU_GIT_HASH')
         if sample_heroku_git_hash:
             LOG.info(f'Sample heroku git hash {sample_heroku_git_hash}')
             return sample_heroku_git_hash
 
-        return get_heroku_git_hash(self.app_name)
+        return get_cached_heroku_git_hash(app_name, force_refresh=self.force_refresh)
 
 
 def get_commit_list_help_message(command: Dict, exception: Exception) -> str:
     return f"Unable to get latest commits with parameters: `{command['text']}`, example usages:\n"\
            f"`/commit-list stp-instant-cd fee_collab`\n"\
            f"`/commit-list stp-resware-api-plus resware`\n"\
+           f"`/commit-list stp-instant-cd fee_collab,shared/**/*.py`\n"\
+           f"`/commit-list stp-instant-cd,stp-resware-api-plus shared`\n"\
+           f"`/commit-list stp-instant-cd fee_collab --refresh` to skip the cached deployed hash\n"\
            f"Error: {exception}"
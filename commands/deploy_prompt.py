@@ -1,26 +1,61 @@
-from actions.deploy_branch import DeployPromptContext
+from actions.deploy_branch import APPROVE_ALL_DEPLOYS_ACTION, BRANCH_DEPLOY_BLOCK_ID_PREFIX, DeployPromptContext
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from fnmatch import fnmatchcase
 from helpers.blocks import (
     generate_deploy_actions_block, generate_divider_block,
-    generate_deploy_preamble_block, generate_deploy_commit_block
+    generate_deploy_preamble_block, generate_deploy_commit_block,
+    generate_approve_all_deploys_block, generate_branch_deploy_commit_block,
+    generate_bulk_deploy_preamble_block, generate_skipped_branches_block, generate_truncated_branches_block
 )
+from helpers.circleci_cache import get_circleci_cache
 from helpers.command_helpers import SlackHerokuDeployError, parse_argument, BASE_CIRCLE_CI_API_URL
+from helpers.http_client import http_get
+from helpers.pending_approvals import get_pending_approval_store
+from helpers.rate_limiter import with_request_priority
 from http import HTTPStatus
 from slack_sdk import WebClient
-from typing import Tuple, Optional, Dict
+from threading import Event
+from typing import Tuple, Optional, Dict, Iterator, List, NamedTuple
 import json
 import logging
+import os
 import requests
 
 LOG = logging.getLogger(__name__)
 
-PIPELINE_URL_SUFFIX = 'project/gh/StatesTitle/underwriter/pipeline?branch='
+PROJECT_PIPELINES_URL_SUFFIX = 'project/gh/StatesTitle/underwriter/pipeline'
+PIPELINE_URL_SUFFIX = PROJECT_PIPELINES_URL_SUFFIX + '?branch='
+BRANCH_PATTERN_CHARACTERS = '*?['
 APPROVAL_JOB = 'approval'
+APPROVAL_PENDING_STATUS = 'on_hold'
+CIRCLE_CI_MAX_PAGES = int(os.environ.get('CIRCLE_CI_MAX_PAGES', 10))
+CIRCLE_CI_MAX_WORKERS = int(os.environ.get('CIRCLE_CI_MAX_WORKERS', 4))
+# A bulk prompt takes two blocks per branch, and Slack allows 50 blocks per message
+CIRCLE_CI_BULK_MAX_BRANCHES = int(os.environ.get('CIRCLE_CI_BULK_MAX_BRANCHES', 20))
+CIRCLE_CI_BULK_PIPELINE_PAGES = int(os.environ.get('CIRCLE_CI_BULK_PIPELINE_PAGES', 3))
 
 
 class PromptBranchDeployError(SlackHerokuDeployError):
     pass
 
 
+class BranchPipelines(NamedTuple):
+    # The newest pipeline of each branch to prompt for, by branch name
+    pipelines: Dict[str, Dict]
+    # Matching branches found, including those beyond CIRCLE_CI_BULK_MAX_BRANCHES
+    matching_branch_count: int
+    # Whether every pipeline of the project was searched, rather than the first CIRCLE_CI_BULK_PIPELINE_PAGES pages
+    is_search_complete: bool
+
+
+class BranchApproval(NamedTuple):
+    branch_name: str
+    commit_sha: str
+    commit_subject: str
+    workflow_id: str
+    job_id: str
+
+
 def get_request_items(response: requests.Response, key: str, from_type: str, to_type: str):
     if response.status_code != HTTPStatus.OK:
         raise PromptBranchDeployError(f'Bad status received from CircleCI: {response.status_code} '
@@ -32,9 +67,26 @@ def get_request_items(response: requests.Response, key: str, from_type: str, to_
     return values
 
 
+def iter_request_pages(url: str, endpoint: str, circle_headers: Dict[str, str], key: str, from_type: str,
+                       to_type: str, page_token: Optional[str] = None) -> Iterator[List[Dict]]:
+    """ Yield each page of a CircleCI list endpoint, only requesting the next page once the previous one
+    has been consumed, so a caller that finds what it's after early saves the remaining requests
+    """
+    for _ in range(CIRCLE_CI_MAX_PAGES):
+        # https://circleci.com/docs/api/v2/#section/Pagination
+        page_params = {'params': {'page-token': page_token}} if page_token else {}
+        response = http_get(url, endpoint=endpoint, headers=circle_headers, **page_params)
+        yield get_request_items(response=response, key=key, from_type=from_type, to_type=to_type)
+
+        page_token = response.json().get('next_page_token')
+        if not page_token:
+            return
+    LOG.warning(f'Stopped paging through the {to_type}s of {from_type} {key} after {CIRCLE_CI_MAX_PAGES} pages')
+
+
 class PromptBranchDeploy:
     """ Usage: /deploy-by-branch release/fee_collab
-
+               /deploy-by-branch release/devex/*
     """
     def __init__(self, command: Dict, web_client: WebClient, circle_ci_token: str):
         self.command = command
@@ -43,81 +95,356 @@ class PromptBranchDeploy:
 
         self.branch_name = parse_argument(self.command['text'], arg_index=0)
         self.tag_recipient = parse_argument(self.command['text'], arg_index=1)
+        # Approval jobs already found while searching a pipeline's workflows, by workflow_id
+        self._approval_jobs: Dict[str, str] = {}
 
     def prompt_deploy(self):
         if not self.branch_name:
             raise PromptBranchDeployError(f"Unable to deploy: no branch name specified in {self.command['text']}")
+        if is_branch_pattern(self.branch_name):
+            return self.prompt_bulk_deploy()
 
-        pipeline_id, commit_subject, commit_sha = self.get_pipeline_id_by_branch_name()
-        workflow_id = self.get_workflow_id_by_pipeline_id(pipeline_id)
-        job_id = self.get_approval_job_id_by_workflow_id(workflow_id)
-        if not job_id:
-            raise PromptBranchDeployError(f'No approval job_id found for pipeline_id {pipeline_id} '
-                                          f'and workflow_id {workflow_id}')
-
+        commit_subject, commit_sha, workflow_id, job_id = self.get_pending_approval()
         blocks = json.dumps(self.generate_deploy_prompt_message(
             commit_subject=commit_subject, commit_sha=commit_sha, workflow_id=workflow_id, job_id=job_id
         ))
         self.web_client.chat_postMessage(channel=self.command['channel_id'], blocks=blocks)
 
+    def get_pending_approval(self) -> Tuple[str, str, str, str]:
+        """ Look up the branch's newest pipeline, its workflow and that workflow's approval job on CircleCI.
+        An approval on hold per webhooks is used without rechecking it, as long as it's on the newest pipeline.
+        A pipeline fetched within the cache's TTL is taken to still be the newest, so only its approval is rechecked.
+        """
+        pending_approval = get_pending_approval_store().get(self.branch_name)
+        known_job_id = pending_approval.job_id if pending_approval else None
+        if known_job_id:
+            last_pipeline_id, last_workflow_id = pending_approval.pipeline_id, pending_approval.workflow_id
+        else:
+            circleci_cache = get_circleci_cache()
+            last_pipeline = circleci_cache.get_branch_pipeline(self.branch_name)
+            last_pipeline_id = last_pipeline.pipeline_id if last_pipeline else None
+            last_workflow_id = circleci_cache.get_pipeline_workflow(last_pipeline_id)
+            # Unless the webhooks have since reported a different pipeline for the branch
+            is_newest_per_webhooks = not pending_approval or pending_approval.pipeline_id == last_pipeline_id
+            if last_workflow_id and circleci_cache.is_fresh(last_pipeline) and is_newest_per_webhooks:
+                LOG.info(f'Branch {self.branch_name} was on pipeline {last_pipeline_id} moments ago, '
+                         f'rechecking only its approval')
+                try:
+                    job_id = self.get_approval_job_id_by_workflow_id(last_workflow_id)
+                except PromptBranchDeployError as e:
+                    LOG.info(f'{e}, checking for a newer pipeline')
+                    job_id = None
+                if job_id:
+                    return last_pipeline.commit_subject, last_pipeline.commit_sha, last_workflow_id, job_id
+                # Already rechecked, so look the newest pipeline up on its own
+                last_workflow_id = None
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # The newest pipeline is usually the one prompted last time, so recheck its approval
+            # while confirming that, making a re-prompt a single round trip
+            pipeline_future = executor.submit(self.get_pipeline_id_by_branch_name)
+            job_future = executor.submit(self.get_approval_job_id_by_workflow_id, last_workflow_id) \
+                if last_workflow_id and not known_job_id else None
+
+            pipeline_id, commit_subject, commit_sha = pipeline_future.result()
+            if known_job_id and pipeline_id == last_pipeline_id:
+                LOG.info(f'Branch {self.branch_name} has approval job {known_job_id} on hold per webhooks')
+                workflow_id, job_id = last_workflow_id, known_job_id
+            elif job_future and pipeline_id == last_pipeline_id:
+                LOG.info(f'Branch {self.branch_name} is still on pipeline {pipeline_id}, using its cached workflow')
+                workflow_id = last_workflow_id
+                job_id = job_future.result()
+            else:
+                workflow_id = self.get_workflow_id_by_pipeline_id(pipeline_id)
+                job_id = self.get_approval_job_id_by_workflow_id(workflow_id)
+        if not job_id:
+            raise PromptBranchDeployError(f'No approval job_id found for pipeline_id {pipeline_id} '
+                                          f'and workflow_id {workflow_id}')
+        return commit_subject, commit_sha, workflow_id, job_id
+
     def get_pipeline_id_by_branch_name(self) -> Tuple[str, str, str]:
         # https://circleci.com/docs/api/v2/#operation/listPipelinesForProject
-        response = requests.get(BASE_CIRCLE_CI_API_URL + PIPELINE_URL_SUFFIX + self.branch_name,
-                                headers=self.circle_headers)
+        response = http_get(BASE_CIRCLE_CI_API_URL + PIPELINE_URL_SUFFIX + self.branch_name,
+                            endpoint='circleci.pipelines', headers=self.circle_headers)
         pipelines = get_request_items(response=response, key=self.branch_name,
                                       from_type='branch name', to_type='pipeline')
         pipeline, *_ = pipelines
         LOG.info(f'Branch {self.branch_name} has most recent pipeline: {pipeline}')
-        return pipeline.get('id'), pipeline['vcs']['commit']['subject'], pipeline['vcs']['revision']
+        commit_subject, commit_sha = pipeline['vcs']['commit']['subject'], pipeline['vcs']['revision']
+        get_circleci_cache().put_branch_pipeline(self.branch_name, pipeline.get('id'), commit_subject, commit_sha)
+        return pipeline.get('id'), commit_subject, commit_sha
 
     def get_workflow_id_by_pipeline_id(self, pipeline_id: str) -> str:
+        """ Get the pipeline's workflow holding an approval. A pipeline with several workflows has all of
+        them searched concurrently, and the search stops at the first approval found on hold.
+        """
+        circleci_cache = get_circleci_cache()
+        workflow_id = circleci_cache.get_pipeline_workflow(pipeline_id)
+        if workflow_id:
+            LOG.info(f'Pipeline {pipeline_id} has cached workflow {workflow_id}')
+            return workflow_id
+
         # https://circleci.com/docs/api/v2/#operation/listWorkflowsByPipelineId
-        response = requests.get(BASE_CIRCLE_CI_API_URL + 'pipeline/' + pipeline_id + '/workflow',
-                                headers=self.circle_headers)
-        workflows = get_request_items(response=response, key=pipeline_id,
-                                      from_type='pipeline', to_type='workflow')
-        workflow, *_ = workflows
-        LOG.info(f'Pipeline {pipeline_id} has most recent workflow: {workflow}')
-        return workflow.get('id')
+        workflows_url = BASE_CIRCLE_CI_API_URL + 'pipeline/' + pipeline_id + '/workflow'
+        response = http_get(workflows_url, endpoint='circleci.workflows', headers=self.circle_headers)
+        workflows = get_request_items(response=response, key=pipeline_id, from_type='pipeline', to_type='workflow')
+        next_page_token = response.json().get('next_page_token')
+        if len(workflows) == 1 and not next_page_token:
+            # The common case, where the caller's approval lookup is the only search needed
+            workflow_id = workflows[0].get('id')
+        else:
+            later_workflow_pages = iter_request_pages(workflows_url, endpoint='circleci.workflows',
+                                                      circle_headers=self.circle_headers, key=pipeline_id,
+                                                      from_type='pipeline', to_type='workflow',
+                                                      page_token=next_page_token) if next_page_token else iter(())
+            workflow_id, job_id = find_pending_approval(workflows, later_workflow_pages,
+                                                        circle_headers=self.circle_headers)
+            if not workflow_id:
+                # Nothing is on hold yet, so leave it uncached and let the caller report on the newest workflow
+                LOG.info(f'Pipeline {pipeline_id} has no approval on hold in any of its workflows')
+                return workflows[0].get('id')
+            self._approval_jobs[workflow_id] = job_id
+        LOG.info(f'Pipeline {pipeline_id} has approval workflow {workflow_id}')
+        circleci_cache.put_pipeline_workflow(pipeline_id, workflow_id)
+        return workflow_id
 
     def get_approval_job_id_by_workflow_id(self, workflow_id: str) -> Optional[str]:
-        # https://circleci.com/docs/api/v2/#operation/listWorkflowJobs
-        response = requests.get(BASE_CIRCLE_CI_API_URL + 'workflow/' + workflow_id + '/job',
-                                headers=self.circle_headers)
-        jobs = get_request_items(response=response, key=workflow_id,
-                                 from_type='workflow', to_type='job')
-        approvals = [job for job in jobs if job['type'] == APPROVAL_JOB]
-        if not approvals:
+        if workflow_id in self._approval_jobs:
+            return self._approval_jobs[workflow_id]
+
+        final_approval = get_final_approval_job(workflow_id=workflow_id, circle_headers=self.circle_headers)
+        if not final_approval:
             return None
 
-        *_, final_approval = approvals
-        LOG.info(f'Workflow {workflow_id} found approval job {final_approval}')
+        if final_approval.get('status') != APPROVAL_PENDING_STATUS:
+            raise PromptBranchDeployError(f'Approval job {final_approval.get("id")} of workflow {workflow_id} '
+                                          f'is already {final_approval.get("status")}')
         return final_approval.get('id')
 
+    def prompt_bulk_deploy(self):
+        """ Post one prompt for every branch matching a glob pattern, each branch with its own approve button
+        """
+        branch_pipelines = self.get_pipelines_by_branch_pattern()
+        if not branch_pipelines.pipelines:
+            raise PromptBranchDeployError(f'No recent pipelines found for branches matching {self.branch_name}')
+
+        branch_approvals, skipped_branches = self.get_branch_approvals(branch_pipelines.pipelines)
+        if not branch_approvals:
+            reasons = '\n'.join(f'{branch_name}: {reason}' for branch_name, reason in sorted(skipped_branches.items()))
+            raise PromptBranchDeployError(f'No approval on hold for branches matching {self.branch_name}:\n{reasons}')
+
+        blocks = json.dumps(generate_bulk_deploy_prompt_blocks(
+            branch_pattern=self.branch_name, recipient=self.tag_recipient, branch_approvals=branch_approvals,
+            skipped_branches=skipped_branches, matching_branch_count=branch_pipelines.matching_branch_count,
+            is_search_complete=branch_pipelines.is_search_complete
+        ))
+        self.web_client.chat_postMessage(channel=self.command['channel_id'], blocks=blocks)
+
+    def get_pipelines_by_branch_pattern(self) -> BranchPipelines:
+        """ Get the newest pipeline of each branch matching the pattern from the project's recent pipelines,
+        along with how many matching branches were found and whether any pipelines were left unsearched
+        """
+        url = BASE_CIRCLE_CI_API_URL + PROJECT_PIPELINES_URL_SUFFIX
+        branch_pipelines: Dict[str, Dict] = {}
+        page_token = None
+        for _ in range(CIRCLE_CI_BULK_PIPELINE_PAGES):
+            # https://circleci.com/docs/api/v2/#operation/listPipelinesForProject
+            page_params = {'params': {'page-token': page_token}} if page_token else {}
+            response = http_get(url, endpoint='circleci.pipelines', headers=self.circle_headers, **page_params)
+            pipelines = get_request_items(response=response, key=self.branch_name, from_type='branch pattern',
+                                          to_type='pipeline')
+            # Pipelines are listed newest first
+            for pipeline in pipelines:
+                branch_name = pipeline.get('vcs', {}).get('branch')
+                if branch_name and branch_name not in branch_pipelines and fnmatchcase(branch_name, self.branch_name):
+                    branch_pipelines[branch_name] = pipeline
+
+            page_token = response.json().get('next_page_token')
+            if not page_token or len(branch_pipelines) > CIRCLE_CI_BULK_MAX_BRANCHES:
+                break
+
+        LOG.info(f'Branches matching {self.branch_name} have recent pipelines: {list(branch_pipelines)}'
+                 + (', more pipelines left unsearched' if page_token else ''))
+        return BranchPipelines(pipelines=dict(sorted(branch_pipelines.items())[:CIRCLE_CI_BULK_MAX_BRANCHES]),
+                               matching_branch_count=len(branch_pipelines), is_search_complete=not page_token)
+
+    def get_branch_approvals(self, pipelines: Dict[str, Dict]) -> Tuple[List[BranchApproval], Dict[str, str]]:
+        """ Look up the approval on hold for each branch's pipeline concurrently, returning the approvals found
+        and, for every other branch, why it can't be approved
+        """
+        with ThreadPoolExecutor(max_workers=CIRCLE_CI_MAX_WORKERS) as executor:
+            lookups = {branch_name: executor.submit(with_request_priority(self.get_branch_approval), branch_name,
+                                                    pipeline)
+                       for branch_name, pipeline in pipelines.items()}
+
+        branch_approvals, skipped_branches = [], {}
+        for branch_name, lookup in lookups.items():
+            try:
+                branch_approvals.append(lookup.result())
+            except PromptBranchDeployError as e:
+                LOG.info(f'Skipping branch {branch_name}: {e}')
+                skipped_branches[branch_name] = str(e)
+        return branch_approvals, skipped_branches
+
+    def get_branch_approval(self, branch_name: str, pipeline: Dict) -> BranchApproval:
+        pipeline_id = pipeline['id']
+        commit_sha, commit_subject = pipeline['vcs']['revision'], pipeline['vcs']['commit']['subject']
+        get_circleci_cache().put_branch_pipeline(branch_name, pipeline_id, commit_subject, commit_sha)
+
+        pending_approval = get_pending_approval_store().get(branch_name)
+        if pending_approval and pending_approval.pipeline_id == pipeline_id and pending_approval.job_id:
+            return BranchApproval(branch_name=branch_name, commit_sha=commit_sha, commit_subject=commit_subject,
+                                  workflow_id=pending_approval.workflow_id, job_id=pending_approval.job_id)
+
+        workflow_id = self.get_workflow_id_by_pipeline_id(pipeline_id)
+        job_id = self.get_approval_job_id_by_workflow_id(workflow_id)
+        if not job_id:
+            raise PromptBranchDeployError(f'No approval job found for workflow {workflow_id}')
+        return BranchApproval(branch_name=branch_name, commit_sha=commit_sha, commit_subject=commit_subject,
+                              workflow_id=workflow_id, job_id=job_id)
+
     def generate_deploy_prompt_message(self, commit_subject: str, commit_sha: str, workflow_id: str, job_id: str):
-        section_block = generate_deploy_preamble_block(recipient=self.tag_recipient, branch_name=self.branch_name)
-        commit_block = generate_deploy_commit_block(commit_sha=commit_sha, commit_subject=commit_subject)
-        divider_block = generate_divider_block()
-
-        action_block_context = dict()
-        action_block_context[DeployPromptContext.BRANCH_NAME.value] = self.branch_name
-        action_block_context[DeployPromptContext.COMMIT_SHA.value] = commit_sha
-        action_block_context[DeployPromptContext.COMMIT_SUBJECT.value] = commit_subject
-        action_block_context[DeployPromptContext.JOB_ID.value] = job_id
-        action_block_context[DeployPromptContext.WORKFLOW_ID.value] = workflow_id
-        actions_block = generate_deploy_actions_block(action_block_context)
-
-        all_blocks = [
-            section_block,
-            commit_block,
-            divider_block,
-            actions_block
+        return generate_deploy_prompt_blocks(branch_name=self.branch_name, recipient=self.tag_recipient,
+                                             commit_subject=commit_subject, commit_sha=commit_sha,
+                                             workflow_id=workflow_id, job_id=job_id)
+
+
+def get_final_approval_job(workflow_id: str, circle_headers: Dict[str, str],
+                           stop_event: Optional[Event] = None) -> Optional[Dict]:
+    """ Get a workflow's `approval` job on hold or, failing that, its last approval job whatever its status.
+    Pages of jobs are fetched until an approval on hold turns up, or stop_event is set by a concurrent search.
+    """
+    final_approval = None
+    # https://circleci.com/docs/api/v2/#operation/listWorkflowJobs
+    for jobs in iter_request_pages(BASE_CIRCLE_CI_API_URL + 'workflow/' + workflow_id + '/job',
+                                   endpoint='circleci.jobs', circle_headers=circle_headers,
+                                   key=workflow_id, from_type='workflow', to_type='job'):
+        approvals = [job for job in jobs if job['type'] == APPROVAL_JOB]
+        pending_approval = next((job for job in approvals if job.get('status') == APPROVAL_PENDING_STATUS), None)
+        if pending_approval:
+            LOG.info(f'Workflow {workflow_id} found approval job {pending_approval}')
+            return pending_approval
+        if approvals:
+            *_, final_approval = approvals
+        if stop_event and stop_event.is_set():
+            break
+
+    LOG.info(f'Workflow {workflow_id} has no approval on hold, last approval job {final_approval}')
+    return final_approval
+
+
+def find_pending_approval(workflows: List[Dict], workflow_pages: Iterator[List[Dict]],
+                          circle_headers: Dict[str, str]) -> Tuple[Optional[str], Optional[str]]:
+    """ Search every workflow of a pipeline for an approval on hold concurrently, returning the workflow_id and
+    job_id of the first one found. Later pages of workflows are only listed while nothing has been found.
+    """
+    found = Event()
+    with ThreadPoolExecutor(max_workers=CIRCLE_CI_MAX_WORKERS) as executor:
+        def submit(workflow_page: List[Dict]) -> List:
+            return [(workflow.get('id'), executor.submit(with_request_priority(get_final_approval_job),
+                                                         workflow_id=workflow.get('id'),
+                                                         circle_headers=circle_headers, stop_event=found))
+                    for workflow in workflow_page]
+
+        searches = submit(workflows)
+        for workflow_page in workflow_pages:
+            if any(future.done() and is_pending(future) for _, future in searches):
+                break
+            searches += submit(workflow_page)
+
+        futures = {future: workflow_id for workflow_id, future in searches}
+        for future in as_completed(futures):
+            if is_pending(future):
+                found.set()
+                for other_future in futures:
+                    other_future.cancel()
+                return futures[future], future.result()['id']
+    return None, None
+
+
+def is_pending(future: Future) -> bool:
+    return not future.cancelled() and not future.exception() and \
+        (future.result() or {}).get('status') == APPROVAL_PENDING_STATUS
+
+
+def is_branch_pattern(branch_name: str) -> bool:
+    return any(character in branch_name for character in BRANCH_PATTERN_CHARACTERS)
+
+
+def generate_deploy_prompt_context(branch_name: str, commit_sha: str, commit_subject: str, workflow_id: str,
+                                   job_id: str) -> Dict:
+    action_block_context = dict()
+    action_block_context[DeployPromptContext.BRANCH_NAME.value] = branch_name
+    action_block_context[DeployPromptContext.COMMIT_SHA.value] = commit_sha
+    action_block_context[DeployPromptContext.COMMIT_SUBJECT.value] = commit_subject
+    action_block_context[DeployPromptContext.JOB_ID.value] = job_id
+    action_block_context[DeployPromptContext.WORKFLOW_ID.value] = workflow_id
+    return action_block_context
+
+
+def generate_deploy_prompt_blocks(branch_name: str, recipient: Optional[str], commit_subject: str, commit_sha: str,
+                                  workflow_id: str, job_id: str) -> List[Dict]:
+    section_block = generate_deploy_preamble_block(recipient=recipient, branch_name=branch_name)
+    commit_block = generate_deploy_commit_block(commit_sha=commit_sha, commit_subject=commit_subject)
+    divider_block = generate_divider_block()
+
+    action_block_context = generate_deploy_prompt_context(branch_name=branch_name, commit_sha=commit_sha,
+                                                         commit_subject=commit_subject, workflow_id=workflow_id,
+                                                         job_id=job_id)
+    actions_block = generate_deploy_actions_block(action_block_context)
+
+    all_blocks = [
+        section_block,
+        commit_block,
+        divider_block,
+        actions_block
+    ]
+    return all_blocks
+
+
+def generate_bulk_deploy_prompt_blocks(branch_pattern: str, recipient: Optional[str],
+                                       branch_approvals: List[BranchApproval],
+                                       skipped_branches: Dict[str, str],
+                                       matching_branch_count: Optional[int] = None,
+                                       is_search_complete: bool = True) -> List[Dict]:
+    all_blocks = [
+        generate_bulk_deploy_preamble_block(branch_pattern=branch_pattern, branch_count=len(branch_approvals),
+                                            recipient=recipient),
+        generate_divider_block(),
+    ]
+    for branch_approval in sorted(branch_approvals):
+        action_block_context = generate_deploy_prompt_context(**branch_approval._asdict())
+        all_blocks += [
+            generate_branch_deploy_commit_block(branch_name=branch_approval.branch_name,
+                                                commit_sha=branch_approval.commit_sha,
+                                                commit_subject=branch_approval.commit_subject),
+            generate_deploy_actions_block(action_block_context,
+                                          block_id=BRANCH_DEPLOY_BLOCK_ID_PREFIX + branch_approval.branch_name,
+                                          cancellable=False),
         ]
-        return all_blocks
+    if skipped_branches:
+        all_blocks.append(generate_skipped_branches_block(skipped_branches))
+    shown_branch_count = len(branch_approvals) + len(skipped_branches)
+    if (matching_branch_count or 0) > shown_branch_count or not is_search_complete:
+        all_blocks.append(generate_truncated_branches_block(
+            branch_pattern=branch_pattern, shown_branch_count=shown_branch_count,
+            matching_branch_count=max(matching_branch_count or 0, shown_branch_count),
+            is_search_complete=is_search_complete
+        ))
+
+    approve_all_block_context = {DeployPromptContext.BRANCH_NAME.value: branch_pattern}
+    all_blocks += [
+        generate_divider_block(),
+        generate_approve_all_deploys_block(branch_pattern=branch_pattern, branch_count=len(branch_approvals),
+                                           action_id=APPROVE_ALL_DEPLOYS_ACTION,
+                                           approve_all_block_context=approve_all_block_context),
+    ]
+    return all_blocks
 
 
 def get_deploy_by_branch_help_message(command: Dict, exception: Exception):
     return f"Unable to deploy with parameters: `{command['text']}`, example usages:\n"\
            f"`/deploy-by-branch release/fee_collab`\n"\
            f"`/deploy-by-branch release/fee_collab @task-automation-devs`\n"\
+           f"`/deploy-by-branch release/devex/*` to approve every matching branch at once\n"\
            f"Error: {exception}"
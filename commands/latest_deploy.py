@@ -1,31 +1,156 @@
-from github import Github
-from helpers.command_helpers import parse_argument, get_heroku_git_hash, GITHUB_TOKEN, get_commit_pull_pr_by_hash, \
-    ResponseType
-from helpers.blocks import generate_pr_summary_block
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from dateutil.parser import parse
+from helpers.block_stream import BlockStream, SLACK_MAX_RESPONSES
+from helpers.command_helpers import parse_argument, parse_app_names, parse_flag_value, get_commit_pull_pr_by_hash, \
+    has_flag, ResponseType, SlackHerokuDeployError, GITHUB_REPOSITORY, GITHUB_BACKEND, GitHubBackend, REFRESH_FLAG, \
+    AT_FLAG, CONTAINS_FLAG, COMMIT_LIST_MAX_WORKERS
+from helpers.blocks import generate_app_section_block, generate_commit_containment_block, \
+    generate_no_deployed_prs_block, generate_pr_summary_block
+from helpers.commit_index import get_commit_index
+from helpers.deployed_hash_cache import get_cached_heroku_git_hash
+from helpers.github_client import get_github_repository, get_graphql_source
+from helpers.pr_cache import CachedPullRequest, get_or_fetch_commit_pulls
+from helpers.release_store import get_release_store
 from slack_bolt import Respond
-from typing import Dict
+from typing import Dict, List, Optional
 import logging
 
 LOG = logging.getLogger(__name__)
 
 
+class LatestDeployError(SlackHerokuDeployError):
+    pass
+
+
 class LatestDeploy:
-    def __init__(self, respond: Respond, command: Dict):
+    """ Usage: /latest-deploy stp-instant-cd,stp-resware-api-plus [--at yesterday 14:00] [--contains <sha>]
+
+    Apps may be listed comma-separated or by a group name configured in DEPLOY_APP_GROUPS
+    """
+    def __init__(self,
+                 respond: Respond,
+                 command: Dict,
+                 max_workers: int = COMMIT_LIST_MAX_WORKERS,
+                 backend: GitHubBackend = GITHUB_BACKEND):
         self.command = command
         self.respond = respond
+        self.max_workers = max_workers
+        self.backend = backend
         self.app_name = parse_argument(command_text=self.command['text'], arg_index=0)
+        self.app_names = parse_app_names(self.app_name)
+        self.force_refresh = has_flag(command_text=self.command['text'], flag=REFRESH_FLAG)
+        deployed_at = parse_flag_value(command_text=self.command['text'], flag=AT_FLAG)
+        self.deployed_at = parse_deployed_at(deployed_at) if deployed_at else None
+        self.contains_sha = parse_flag_value(command_text=self.command['text'], flag=CONTAINS_FLAG)
+
+    def get_latest_deployed_commit(self) -> List[Dict]:
+        """ Reply with one section per app listing the PRs of its deployed commit, in a single message
+        unless there are more blocks than Slack allows in one
+        """
+        if not self.app_names:
+            raise LatestDeployError(f'Missing app_name in command text')
+        if self.contains_sha:
+            return self.get_apps_containing_commit()
+
+        # Every app's lookups run at once, so the reply takes about as long as the slowest app
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            git_hashes = list(executor.map(self.get_deployed_hash, self.app_names))
+            unique_git_hashes = [git_hash for git_hash in dict.fromkeys(git_hashes) if git_hash]
+            prs_by_git_hash = dict(zip(unique_git_hashes, executor.map(self.try_get_commit_prs, unique_git_hashes)))
+
+        block_stream = BlockStream(respond=self.respond, max_messages=SLACK_MAX_RESPONSES - 1,
+                                   first_batch_seconds=float('inf'))
+        for app_name, git_hash in zip(self.app_names, git_hashes):
+            block_stream.add(generate_app_section_block(app_names=[app_name], git_hash=git_hash,
+                                                        as_of=self.deployed_at))
+            commit_prs = prs_by_git_hash.get(git_hash)
+            if not commit_prs:
+                block_stream.add(generate_no_deployed_prs_block(git_hash=git_hash, is_error=commit_prs is None))
+            for pr in commit_prs or []:
+                block_stream.add(generate_pr_summary_block(pr))
+        block_stream.flush()
+        return block_stream.sent_blocks
+
+    def get_apps_containing_commit(self) -> List[Dict]:
+        """ Reply with whether each app's current release includes contains_sha, answered from the
+        release store and, for commits further back on `stable`, the stable commit index
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(self.sync_releases, self.app_names))
+
+        containing = get_release_store().get_apps_containing(sha=self.contains_sha, app_names=self.app_names,
+                                                             commit_index=get_commit_index())
+        block_stream = BlockStream(respond=self.respond, max_messages=SLACK_MAX_RESPONSES - 1,
+                                   first_batch_seconds=float('inf'))
+        for app_name in self.app_names:
+            block_stream.add(generate_commit_containment_block(app_name=app_name, sha=self.contains_sha,
+                                                               contains=containing[app_name]))
+        block_stream.flush()
+        return block_stream.sent_blocks
 
-    def get_latest_deployed_commit(self):
-        latest_git_hash = self.get_latest_deployed_hash()
-        repo = Github(GITHUB_TOKEN).get_repo('StatesTitle/underwriter')
-        commit_prs = get_commit_pull_pr_by_hash(repo, latest_git_hash)
+    def sync_releases(self, app_name: str) -> None:
+        """ Fetch any releases the webhook missed, unless the app was synced recently. Container releases don't
+        name their commit, so the current release takes its SHA from the deployed hash when it's unknown.
+        """
+        release_store = get_release_store()
+        if release_store.needs_sync(app_name):
+            try:
+                release_store.sync(app_name)
+            except Exception as e:
+                LOG.error(f'Unable to sync releases for {app_name}, using stored releases: {e}')
 
-        self.respond(f'Latest Deployed on {self.app_name}:', response_type=ResponseType.IN_CHANNEL)
-        for pr in commit_prs:
-            self.respond(blocks=[generate_pr_summary_block(pr)], response_type=ResponseType.IN_CHANNEL)
+        current_release = release_store.get_current_release(app_name, with_earlier_sha=False)
+        if current_release and not current_release.sha:
+            # Straight from Heroku: the stored SHA is never overwritten, so a stale cached hash would stick
+            git_hash = get_cached_heroku_git_hash(app_name, force_refresh=True)
+            if git_hash:
+                release_store.set_release_sha(app_name, current_release.version, git_hash)
 
-    def get_latest_deployed_hash(self):
-        LOG.info(f'Getting latest deployed hash for {self.app_name}')
-        latest_git_hash = get_heroku_git_hash(self.app_name)
-        LOG.info(f'Latest git hash found: {latest_git_hash}')
+    def get_deployed_hash(self, app_name: str) -> Optional[str]:
+        if self.deployed_at:
+            return self.get_deployed_hash_at(app_name)
+        return self.get_latest_deployed_hash(app_name)
+
+    def get_deployed_hash_at(self, app_name: str) -> Optional[str]:
+        self.sync_releases(app_name)
+        release = get_release_store().get_release_at(app_name, self.deployed_at)
+        LOG.info(f'Release live on {app_name} at {self.deployed_at}: {release}')
+        return release.sha if release else None
+
+    def try_get_commit_prs(self, git_hash: str) -> Optional[List[CachedPullRequest]]:
+        try:
+            return self.get_commit_prs(git_hash)
+        except Exception as e:
+            LOG.error(f'Unable to get PRs for {git_hash}: {e}')
+            return None
+
+    def get_commit_prs(self, git_hash: str) -> List[CachedPullRequest]:
+        if self.backend is GitHubBackend.GRAPHQL:
+            graphql_source = get_graphql_source(GITHUB_REPOSITORY)
+            return get_or_fetch_commit_pulls(git_hash, lambda: graphql_source.get_commit_pulls(git_hash))
+
+        repo = get_github_repository(GITHUB_REPOSITORY)
+        return get_commit_pull_pr_by_hash(repo, git_hash)
+
+    def get_latest_deployed_hash(self, app_name: str) -> Optional[str]:
+        LOG.info(f'Getting latest deployed hash for {app_name}')
+        latest_git_hash = get_cached_heroku_git_hash(app_name, force_refresh=self.force_refresh)
+        LOG.info(f'Latest git hash found for {app_name}: {latest_git_hash}')
         return latest_git_hash
+
+
+def parse_deployed_at(value: str) -> datetime:
+    """ Parse a time like `14:00`, `yesterday 14:00` or `2021-11-01 14:00`, in the server's timezone unless one is given
+    """
+    default = datetime.now().astimezone().replace(second=0, microsecond=0)
+    words = value.split(' ')
+    if words[0].lower() == 'yesterday':
+        default -= timedelta(days=1)
+        value = ' '.join(words[1:])
+
+    try:
+        deployed_at = parse(value, default=default) if value else default
+    except (ValueError, OverflowError):
+        raise LatestDeployError(f'Unable to parse time `{value}`, try e.g. `--at yesterday 14:00`')
+    return deployed_at if deployed_at.tzinfo else deployed_at.astimezone()
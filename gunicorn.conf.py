@@ -0,0 +1,37 @@
+""" Gunicorn settings for serving server:flask_app in production, see the Procfile.
+
+The bot keeps its caches, rate limit budgets, work queue, approval tracking and pending approvals in process, so
+it runs a single worker process and serves requests concurrently on its threads. Heroku's WEB_CONCURRENCY is
+deliberately ignored: more workers would each keep their own copy of that state, e.g. each spending the whole
+GitHub budget and missing the others' cache invalidations. Only raise GUNICORN_WORKERS once that state is shared.
+"""
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 3000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+# Slack expects an acknowledgement within 3 seconds, and listeners hand their work to the work queue
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Heroku's router already logs every request
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+BACKGROUND_WORKERS_LOCK_PATH = os.environ.get(
+    'BACKGROUND_WORKERS_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'slack-deploy-bot-background.lock')
+)
+
+
+def post_worker_init(worker):
+    # Background threads don't survive the fork, so they're started in a worker: the one holding the lock, so that
+    # with several workers only one indexes commits. A worker replacing it takes the lock over once it exits.
+    import fcntl
+    from listeners import start_background_workers
+
+    worker.background_workers_lock = open(BACKGROUND_WORKERS_LOCK_PATH, 'w')
+    try:
+        fcntl.flock(worker.background_workers_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        worker.log.info('Background workers run in another worker')
+        return
+    start_background_workers()
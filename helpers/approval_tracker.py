@@ -0,0 +1,81 @@
+from concurrent.futures import Future
+from helpers.command_helpers import SlackHerokuDeployError
+from threading import Lock
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+APPROVAL_OUTCOME_TTL_SECONDS = int(os.environ.get('APPROVAL_OUTCOME_TTL_SECONDS', 600))
+
+
+class ApprovalOutcome(NamedTuple):
+    job_id: str
+    error: Optional[str]
+    # Whether the outcome is that of an approval already made or in flight for the same job
+    is_duplicate: bool
+
+
+class ApprovalTracker:
+    """ Single-flight approvals per CircleCI job: a second approval of a job while one is in flight waits for its
+    outcome, and one made within ttl_seconds of a successful approval gets that outcome without a request.
+    Failed approvals aren't kept, so they can be retried.
+    """
+    def __init__(self, ttl_seconds: int = APPROVAL_OUTCOME_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.duplicates = 0
+        self._lock = Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._approved_at: Dict[str, float] = {}
+
+    def approve(self, job_id: str, send_approval: Callable[[], None]) -> ApprovalOutcome:
+        with self._lock:
+            self._expire(time.monotonic())
+            if job_id in self._approved_at:
+                self.duplicates += 1
+                LOG.info(f'Job {job_id} was already approved, skipping duplicate approval')
+                return ApprovalOutcome(job_id=job_id, error=None, is_duplicate=True)
+
+            in_flight = self._in_flight.get(job_id)
+            if in_flight is None:
+                self._in_flight[job_id] = Future()
+            else:
+                self.duplicates += 1
+
+        if in_flight is not None:
+            LOG.info(f'Job {job_id} is already being approved, waiting for its outcome')
+            return ApprovalOutcome(job_id=job_id, error=in_flight.result(), is_duplicate=True)
+
+        error = None
+        try:
+            send_approval()
+        except SlackHerokuDeployError as e:
+            error = str(e)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            with self._lock:
+                if error is None:
+                    self._approved_at[job_id] = time.monotonic()
+                self._in_flight.pop(job_id).set_result(error)
+        return ApprovalOutcome(job_id=job_id, error=error, is_duplicate=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'in_flight': len(self._in_flight), 'approved': len(self._approved_at),
+                    'duplicates': self.duplicates}
+
+    def _expire(self, now: float) -> None:
+        expired = [job_id for job_id, approved_at in self._approved_at.items() if now - approved_at >= self.ttl_seconds]
+        for job_id in expired:
+            del self._approved_at[job_id]
+
+
+_approval_tracker = ApprovalTracker()
+
+
+def get_approval_tracker() -> ApprovalTracker:
+    return _approval_tracker
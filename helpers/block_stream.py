@@ -0,0 +1,60 @@
+from helpers.command_helpers import ResponseType
+from slack_bolt import Respond
+from typing import Dict, List
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+SLACK_MAX_BLOCKS = 50  # Slack rejects messages with more blocks than this
+SLACK_MAX_RESPONSES = 5  # A response_url accepts at most this many responses
+STREAM_FIRST_BATCH_SECONDS = float(os.environ.get('STREAM_FIRST_BATCH_SECONDS', 2))
+
+
+class BlockStream:
+    """ Sends blocks through `respond` as they're produced instead of all at once: the first batch goes out
+    once first_batch_seconds have passed, and later batches each time max_blocks are ready.
+
+    At most max_messages are sent. Blocks beyond what fits are counted in dropped_count rather than sent.
+    """
+    def __init__(self,
+                 respond: Respond,
+                 max_messages: int,
+                 max_blocks: int = SLACK_MAX_BLOCKS,
+                 first_batch_seconds: float = STREAM_FIRST_BATCH_SECONDS,
+                 response_type: ResponseType = ResponseType.IN_CHANNEL):
+        self.respond = respond
+        self.max_messages = max_messages
+        self.max_blocks = max_blocks
+        self.first_batch_seconds = first_batch_seconds
+        self.response_type = response_type
+        self.started_at = time.monotonic()
+        self.sent_blocks: List[Dict] = []
+        self.pending_blocks: List[Dict] = []
+        self.sent_messages = 0
+        self.block_count = 0
+        self.dropped_count = 0
+
+    def add(self, block: Dict) -> None:
+        self.block_count += 1
+        if len(self.pending_blocks) >= self.max_blocks:
+            if self.sent_messages + 1 >= self.max_messages:
+                self.dropped_count += 1
+                return
+            self.flush()
+
+        self.pending_blocks.append(block)
+        first_batch_due = time.monotonic() - self.started_at >= self.first_batch_seconds
+        if not self.sent_messages and first_batch_due and self.max_messages > 1:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending_blocks:
+            return
+
+        LOG.info(f'Sending {len(self.pending_blocks)} blocks after {time.monotonic() - self.started_at:.2f}s')
+        self.respond(blocks=self.pending_blocks, response_type=self.response_type)
+        self.sent_blocks.extend(self.pending_blocks)
+        self.pending_blocks = []
+        self.sent_messages += 1
@@ -1,12 +1,21 @@
+from datetime import datetime
 from enum import Enum
-from github.PullRequest import PullRequest
 from helpers.command_helpers import PR_DATE_FORMAT
-from typing import Optional, Dict
+from helpers.pr_cache import CachedPullRequest
+from typing import TYPE_CHECKING, Optional, Dict, List, Union
 import json
 
+if TYPE_CHECKING:
+    from github.PullRequest import PullRequest
+
+GIT_HASH_DISPLAY_LENGTH = 7
+DEPLOYED_AS_OF_FORMAT = '%Y-%m-%d %H:%M %Z'
+SKIPPED_REASON_DISPLAY_LENGTH = 150
+
 
 class BlockKeys(str, Enum):
     ACTION_ID = 'action_id'
+    BLOCK_ID = 'block_id'
     CONFIRM = 'confirm'
     DENY = 'deny'
     ELEMENTS = 'elements'
@@ -62,7 +71,8 @@ def generate_divider_block() -> Dict:
     }
 
 
-def generate_deploy_actions_block(deploy_prompt_block_context: Dict) -> Dict:
+def generate_deploy_actions_block(deploy_prompt_block_context: Dict, block_id: Optional[str] = None,
+                                  cancellable: bool = True) -> Dict:
     approve_action = {
         BlockKeys.TYPE: BlockTypeStyles.BUTTON,
         BlockKeys.TEXT: {
@@ -105,12 +115,113 @@ def generate_deploy_actions_block(deploy_prompt_block_context: Dict) -> Dict:
         BlockKeys.ACTION_ID: 'cancel_deploy_prompt'
     }
 
-    return {
+    actions_block = {
         BlockKeys.TYPE: BlockTypeStyles.ACTIONS,
         BlockKeys.ELEMENTS: [
             approve_action,
             cancel_action
-        ]
+        ] if cancellable else [approve_action]
+    }
+    if block_id:
+        actions_block[BlockKeys.BLOCK_ID] = block_id
+    return actions_block
+
+
+def generate_bulk_deploy_preamble_block(branch_pattern: str, branch_count: int,
+                                        recipient: Optional[str] = None) -> Dict:
+    prompt = f'Approval requested for {branch_count} branches matching `{branch_pattern}`'
+    if recipient:
+        prompt += f', {recipient}'
+
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: prompt
+        }
+    }
+
+
+def generate_branch_deploy_commit_block(branch_name: str, commit_sha: str, commit_subject: str) -> Dict:
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: f'*{branch_name}*: {commit_sha[:GIT_HASH_DISPLAY_LENGTH]} {commit_subject}'
+        }
+    }
+
+
+def generate_skipped_branches_block(skipped_branches: Dict[str, str]) -> Dict:
+    """ List the branches matching a bulk deploy prompt that can't be approved, with the reason for each
+    """
+    skipped_lines = '\n'.join(f'• `{branch_name}`: {reason[:SKIPPED_REASON_DISPLAY_LENGTH]}'
+                              for branch_name, reason in sorted(skipped_branches.items()))
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: f'Skipped {len(skipped_branches)} branches with no approval on hold:\n{skipped_lines}'
+        }
+    }
+
+
+def generate_truncated_branches_block(branch_pattern: str, shown_branch_count: int, matching_branch_count: int,
+                                      is_search_complete: bool) -> Dict:
+    """ Warn that a bulk deploy prompt leaves out branches matching its pattern, so approve all won't approve them
+    """
+    if matching_branch_count > shown_branch_count:
+        at_least = '' if is_search_complete else 'at least '
+        warning = f':warning: Showing {shown_branch_count} of {at_least}{matching_branch_count} branches matching ' \
+                  f'`{branch_pattern}`, approve all leaves out the rest. Narrow the pattern to approve them.'
+    else:
+        warning = f':warning: Only the most recent pipelines were searched, so branches matching `{branch_pattern}` ' \
+                  'with older pipelines may be missing. Narrow the pattern to find them.'
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: warning
+        }
+    }
+
+
+def generate_approve_all_deploys_block(branch_pattern: str, branch_count: int, action_id: str,
+                                       approve_all_block_context: Dict) -> Dict:
+    approve_all_action = {
+        BlockKeys.TYPE: BlockTypeStyles.BUTTON,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.PLAIN_TEXT,
+            BlockKeys.TEXT: f':white_check_mark: Approve and Deploy all {branch_count}',
+            BlockKeys.EMOJI: True
+        },
+        BlockKeys.CONFIRM: {
+            BlockKeys.TITLE: {
+                BlockKeys.TYPE: BlockTypeStyles.PLAIN_TEXT,
+                BlockKeys.TEXT: 'Are you sure?',
+            },
+            BlockKeys.TEXT: {
+                BlockKeys.TYPE: BlockTypeStyles.PLAIN_TEXT,
+                BlockKeys.TEXT: f'Deploy every branch matching `{branch_pattern}` that is still waiting?',
+            },
+            BlockKeys.CONFIRM: {
+                BlockKeys.TYPE: BlockTypeStyles.PLAIN_TEXT,
+                BlockKeys.TEXT: 'Deploy all',
+            },
+            BlockKeys.DENY: {
+                BlockKeys.TYPE: BlockTypeStyles.PLAIN_TEXT,
+                BlockKeys.TEXT: 'Stop, I changed my mind!',
+            },
+        },
+        BlockKeys.STYLE: BlockTypeStyles.PRIMARY,
+        BlockKeys.VALUE: json.dumps(approve_all_block_context),
+        BlockKeys.ACTION_ID: action_id
+    }
+
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.ACTIONS,
+        BlockKeys.BLOCK_ID: action_id,
+        BlockKeys.ELEMENTS: [approve_all_action]
     }
 
 
@@ -138,6 +249,25 @@ def generate_deploy_cancelled_at_timestamp_block(timestamp: str, user_id: str) -
     }
 
 
+def generate_branch_deploy_result_block(branch_name: str, timestamp: str, user_id: str,
+                                        error: Optional[str] = None, block_id: Optional[str] = None) -> Dict:
+    if error:
+        result_message = f'*{branch_name}*: approval failed, {error}'
+    else:
+        result_message = f'*{branch_name}*: DEPLOY APPROVED ' \
+                         + generate_user_interaction_timestamp(timestamp=timestamp, user_id=user_id)
+    result_block = {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: result_message
+        }
+    }
+    if block_id:
+        result_block[BlockKeys.BLOCK_ID] = block_id
+    return result_block
+
+
 def generate_user_interaction_timestamp(timestamp: str, user_id: str) -> str:
     clean_timestamp = timestamp.split('.')[0]
     return f'by <@{user_id}> at <!date^{clean_timestamp}^' \
@@ -156,7 +286,72 @@ def generate_no_commits_block(app_name: str, item_filter: str) -> Dict:
     }
 
 
-def generate_pr_summary_block(pr: PullRequest) -> Dict:
+def generate_compare_error_block(error_message: str) -> Dict:
+    """ Generate a Slack-friendly human-readable block for apps whose undeployed commits couldn't be compared
+    """
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: f':warning: {error_message}'
+        }
+    }
+
+
+def generate_no_deployed_prs_block(git_hash: Optional[str], is_error: bool = False) -> Dict:
+    """ Generate a Slack-friendly human-readable block for a deployed commit whose PRs can't be listed
+    """
+    if not git_hash:
+        text = 'Unable to find the deployed git hash'
+    elif is_error:
+        text = f'Unable to retrieve PRs for `{git_hash[:GIT_HASH_DISPLAY_LENGTH]}`. See logs for details'
+    else:
+        text = f'No PRs found for `{git_hash[:GIT_HASH_DISPLAY_LENGTH]}`'
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: text
+        }
+    }
+
+
+def generate_app_section_block(app_names: List[str], git_hash: Optional[str], as_of: Optional[datetime] = None) -> Dict:
+    """ Generate a Slack-friendly human-readable header for the apps sharing a deployed git hash
+    """
+    apps = ', '.join(f'`{app_name}`' for app_name in app_names)
+    deployed = f'deployed at `{git_hash[:GIT_HASH_DISPLAY_LENGTH]}`' if git_hash else 'deployed git hash unknown'
+    if as_of:
+        deployed += f' as of {as_of.strftime(DEPLOYED_AS_OF_FORMAT)}'
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: f'*{apps}* ({deployed})'
+        }
+    }
+
+
+def generate_commit_containment_block(app_name: str, sha: str, contains: Optional[bool]) -> Dict:
+    """ Generate a Slack-friendly human-readable block saying whether an app's current release includes a commit
+    """
+    short_sha = sha[:GIT_HASH_DISPLAY_LENGTH]
+    if contains is None:
+        text = f'`{app_name}`: unable to tell whether `{short_sha}` is deployed'
+    elif contains:
+        text = f'`{app_name}`: `{short_sha}` is deployed'
+    else:
+        text = f'`{app_name}`: `{short_sha}` is not deployed yet'
+    return {
+        BlockKeys.TYPE: BlockTypeStyles.SECTION,
+        BlockKeys.TEXT: {
+            BlockKeys.TYPE: BlockTypeStyles.MARKDOWN,
+            BlockKeys.TEXT: text
+        }
+    }
+
+
+def generate_pr_summary_block(pr: Union['PullRequest', CachedPullRequest]) -> Dict:
     """ Generate a Slack-friendly human-readable block to submit back via `respond`
     """
     pr_merged_date = pr.merged_at.date().strftime(PR_DATE_FORMAT)
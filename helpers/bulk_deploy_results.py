@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+BULK_DEPLOY_RESULTS_TTL_SECONDS = int(os.environ.get('BULK_DEPLOY_RESULTS_TTL_SECONDS', 86400))
+
+
+class BranchDeployResult(NamedTuple):
+    user_id: str
+    # None once the branch's approval went through
+    error: Optional[str]
+
+
+class BulkDeployResultStore:
+    """ The result of each approval made from a bulk deploy prompt, by the prompt's channel and ts. Each update of
+    a prompt is rendered from all of its results so far rather than from the message as it was when the button was
+    clicked, so approvals finishing together don't overwrite each other's results. Results are kept for ttl_seconds.
+    """
+    def __init__(self, ttl_seconds: int = BULK_DEPLOY_RESULTS_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        # Held while a prompt is updated, so updates land in the order their results were recorded
+        self._lock = Lock()
+        self._results: Dict[Tuple[str, str], Tuple[Dict[str, BranchDeployResult], float]] = {}
+
+    @contextmanager
+    def record_results(self, channel_id: str, ts: str,
+                       results: Dict[str, BranchDeployResult]) -> Iterator[Dict[str, BranchDeployResult]]:
+        """ Record results for the prompt at channel_id and ts, then yield every result of that prompt while the
+        caller updates it. Bulk approvals are rare enough for all prompts to share one lock.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._results = {key: (prompt_results, recorded_at)
+                             for key, (prompt_results, recorded_at) in self._results.items()
+                             if now - recorded_at < self.ttl_seconds}
+            prompt_results, _ = self._results.get((channel_id, ts), ({}, now))
+            prompt_results = {**prompt_results, **results}
+            self._results[(channel_id, ts)] = (prompt_results, now)
+            LOG.info(f'Prompt {ts} in {channel_id} has results for {len(prompt_results)} branches')
+            yield dict(prompt_results)
+
+
+_bulk_deploy_result_store = BulkDeployResultStore()
+
+
+def get_bulk_deploy_result_store() -> BulkDeployResultStore:
+    return _bulk_deploy_result_store
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, NamedTuple, Optional
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+CIRCLE_CI_CACHE_MAX_ENTRIES = int(os.environ.get('CIRCLE_CI_CACHE_MAX_ENTRIES', 1000))
+# How long a branch's latest pipeline is trusted without asking CircleCI again
+CIRCLE_CI_BRANCH_PIPELINE_TTL_SECONDS = int(os.environ.get('CIRCLE_CI_BRANCH_PIPELINE_TTL_SECONDS', 60))
+
+
+class BranchPipeline(NamedTuple):
+    pipeline_id: str
+    commit_subject: str
+    commit_sha: str
+    fetched_at: float
+
+
+class LruMapping:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Any]' = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class CircleCICache:
+    """ In-memory cache of the CircleCI lookups behind /deploy-by-branch. A pipeline's workflow never
+    changes once created, so it's cached for good. A branch's latest pipeline does change: for
+    branch_pipeline_ttl_seconds it's trusted as is, and after that it's only kept as a guess, so a re-prompt
+    can recheck that pipeline's approval while the guess is verified.
+    """
+    def __init__(self, max_entries: int = CIRCLE_CI_CACHE_MAX_ENTRIES,
+                 branch_pipeline_ttl_seconds: int = CIRCLE_CI_BRANCH_PIPELINE_TTL_SECONDS):
+        self.branch_pipeline_ttl_seconds = branch_pipeline_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._branch_pipelines = LruMapping(max_entries)
+        self._pipeline_workflows = LruMapping(max_entries)
+
+    def get_branch_pipeline(self, branch_name: str) -> Optional[BranchPipeline]:
+        with self._lock:
+            return self._branch_pipelines.get(branch_name)
+
+    def is_fresh(self, branch_pipeline: BranchPipeline) -> bool:
+        return time.monotonic() - branch_pipeline.fetched_at < self.branch_pipeline_ttl_seconds
+
+    def put_branch_pipeline(self, branch_name: str, pipeline_id: str, commit_subject: str, commit_sha: str) -> None:
+        with self._lock:
+            self._branch_pipelines.put(branch_name, BranchPipeline(pipeline_id=pipeline_id,
+                                                                   commit_subject=commit_subject,
+                                                                   commit_sha=commit_sha,
+                                                                   fetched_at=time.monotonic()))
+
+    def get_pipeline_workflow(self, pipeline_id: Optional[str]) -> Optional[str]:
+        with self._lock:
+            workflow_id = self._pipeline_workflows.get(pipeline_id) if pipeline_id else None
+            if workflow_id:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return workflow_id
+
+    def put_pipeline_workflow(self, pipeline_id: str, workflow_id: str) -> None:
+        with self._lock:
+            self._pipeline_workflows.put(pipeline_id, workflow_id)
+
+
+_circleci_cache = CircleCICache()
+
+
+def get_circleci_cache() -> CircleCICache:
+    return _circleci_cache
@@ -1,11 +1,13 @@
 from enum import Enum
 from http import HTTPStatus
-from github.Repository import Repository
-from requests import HTTPError
-from typing import Optional
+from helpers.pr_cache import CachedPullRequest, get_or_fetch_commit_pulls
+from typing import TYPE_CHECKING, Dict, List, Optional
+import json
 import logging
 import os
-import requests
+
+if TYPE_CHECKING:
+    from github.Repository import Repository
 
 LOG = logging.getLogger(__name__)
 
@@ -13,8 +15,19 @@ PR_DATE_FORMAT = '%m/%d'
 HUMAN_TIMESTAMP_FORMAT = '%H:%M'
 CIRCLE_CI_TOKEN = os.environ.get('CIRCLE_CI_TOKEN')
 GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
+GITHUB_REPOSITORY = 'StatesTitle/underwriter'
+STABLE_BRANCH = 'stable'
 HEROKU_TOKEN = os.environ.get('HEROKU_TOKEN')  # populate using heroku login; heroku auth:token
+HEROKU_WEBHOOK_SECRET = os.environ.get('HEROKU_WEBHOOK_SECRET')
+REFRESH_FLAG = '--refresh'
+AT_FLAG = '--at'
+CONTAINS_FLAG = '--contains'
 BASE_CIRCLE_CI_API_URL = 'https://circleci.com/api/v2/'
+CIRCLE_CI_WEBHOOK_SECRET = os.environ.get('CIRCLE_CI_WEBHOOK_SECRET')
+CIRCLE_CI_APPROVAL_CHANNEL = os.environ.get('CIRCLE_CI_APPROVAL_CHANNEL')  # Slack channel for proactive prompts
+COMMIT_LIST_MAX_WORKERS = int(os.environ.get('COMMIT_LIST_MAX_WORKERS', 8))
+# Named groups of apps, e.g. {"underwriter": ["stp-instant-cd", "stp-resware-api-plus"]}
+DEPLOY_APP_GROUPS = json.loads(os.environ.get('DEPLOY_APP_GROUPS', '{}'))
 
 
 # Generic exception for SlackHerokuDeployerBot
@@ -27,6 +40,14 @@ class ResponseType(str, Enum):
     EPHEMERAL = 'ephemeral'
 
 
+class GitHubBackend(str, Enum):
+    REST = 'rest'
+    GRAPHQL = 'graphql'
+
+
+GITHUB_BACKEND = GitHubBackend(os.environ.get('GITHUB_BACKEND', GitHubBackend.REST.value))
+
+
 def parse_argument(command_text: str, arg_index: int) -> Optional[str]:
     """ Split a command's text by spaces and grab the arg_index element if possible, else None
     """
@@ -39,14 +60,58 @@ def parse_argument(command_text: str, arg_index: int) -> Optional[str]:
     return arguments[arg_index]
 
 
+def has_flag(command_text: str, flag: str) -> bool:
+    """ Check whether a command's text includes a flag like `--refresh` anywhere
+    """
+    return bool(command_text) and flag in command_text.split(' ')
+
+
+def parse_flag_value(command_text: str, flag: str) -> Optional[str]:
+    """ Get the text following a flag like `--at` up to the next flag, e.g. `yesterday 14:00` in
+    `app --at yesterday 14:00 --refresh`, else None
+    """
+    arguments = command_text.split(' ') if command_text else []
+    if flag not in arguments:
+        return None
+
+    values = []
+    for argument in arguments[arguments.index(flag) + 1:]:
+        if argument.startswith('--'):
+            break
+        values.append(argument)
+    return ' '.join(values) or None
+
+
+def parse_list_argument(argument: Optional[str]) -> List[str]:
+    """ Split a comma-separated argument like `app1,app2` into its non-empty, unique items, keeping their order
+    """
+    if not argument:
+        return []
+    return list(dict.fromkeys(item.strip() for item in argument.split(',') if item.strip()))
+
+
+def parse_app_names(argument: Optional[str], app_groups: Optional[Dict[str, List[str]]] = None) -> List[str]:
+    """ Split a comma-separated list of apps, expanding any configured group names into their apps
+    """
+    app_groups = DEPLOY_APP_GROUPS if app_groups is None else app_groups
+    app_names = []
+    for item in parse_list_argument(argument):
+        app_names.extend(app_groups.get(item, [item]))
+    return list(dict.fromkeys(app_names))
+
+
 def get_heroku_git_hash(app_name: Optional[str]):
     """ Get the latest commit deployed to Heroku by inspecting the config variables
     GIT_HASH (docker apps) or the HEROKU_SLUG_COMMIT (legacy apps) set by CircleCI
     """
+    # requests is imported on first use, keeping it out of the modules loaded before the first ack
+    from helpers.http_cache import conditional_get
+    from requests import HTTPError, RequestException
+
     url = f'https://api.heroku.com/apps/{app_name}/config-vars'
     headers = {'Accept': 'application/vnd.heroku+json; version=3', 'Authorization': f'Bearer {HEROKU_TOKEN}'}
     try:
-        response = requests.get(url, headers=headers)
+        response = conditional_get(url=url, headers=headers, endpoint='heroku.config-vars')
         if response.status_code != HTTPStatus.OK:
             raise HTTPError(response.status_code)
 
@@ -56,10 +121,10 @@ def get_heroku_git_hash(app_name: Optional[str]):
         if not git_hash:
             git_hash = heroku_config_vars.get('HEROKU_SLUG_COMMIT')
         return git_hash
-    except HTTPError as e:
+    except RequestException as e:
         LOG.error(f'Unable to get latest git hash from Heroku: {e}')
         return None
 
 
-def get_commit_pull_pr_by_hash(repo: Repository, commit_hash: str):
-    return repo.get_commit(commit_hash).get_pulls()
+def get_commit_pull_pr_by_hash(repo: 'Repository', commit_hash: str) -> List[CachedPullRequest]:
+    return get_or_fetch_commit_pulls(commit_hash, lambda: repo.get_commit(commit_hash).get_pulls())
@@ -0,0 +1,194 @@
+from concurrent.futures import ThreadPoolExecutor
+from helpers.compare_cache import CachedCommit, to_cached_commit
+from helpers.rate_limiter import Priority, request_priority, with_request_priority
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Tuple
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+
+if TYPE_CHECKING:
+    from github.Repository import Repository
+
+LOG = logging.getLogger(__name__)
+
+COMMIT_INDEX_PATH = os.environ.get('COMMIT_INDEX_PATH',
+                                   os.path.join(tempfile.gettempdir(), 'slack_deploy_bot_commit_index.sqlite3'))
+COMMIT_INDEX_INTERVAL_SECONDS = int(os.environ.get('COMMIT_INDEX_INTERVAL_SECONDS', 60))
+COMMIT_INDEX_MAX_WORKERS = int(os.environ.get('COMMIT_INDEX_MAX_WORKERS', 4))
+
+
+class CompareStatus:
+    AHEAD = 'ahead'
+    BEHIND = 'behind'
+    DIVERGED = 'diverged'
+    IDENTICAL = 'identical'
+
+
+class StableCommitIndex:
+    """ Local, incrementally updated index of the commits on a branch, storing each commit's
+    changed paths in the order they landed. A commit range between two indexed SHAs can then be answered
+    without GitHub, and PRs are only looked up for the commits a query matches.
+
+    The repository is duck-typed (`get_branch`, `get_commit`, `compare`), so a fake GitHub can be used in tests.
+    """
+    def __init__(self,
+                 get_repo: Callable[[], 'Repository'],
+                 branch: str,
+                 path: str = COMMIT_INDEX_PATH,
+                 max_workers: int = COMMIT_INDEX_MAX_WORKERS):
+        self.get_repo = get_repo
+        self.branch = branch
+        self.max_workers = max_workers
+        self._lock = Lock()
+        self._refresh_lock = Lock()
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS commits ('
+                                 'position INTEGER PRIMARY KEY, branch TEXT NOT NULL, sha TEXT NOT NULL, '
+                                 'filenames TEXT NOT NULL, pr_numbers TEXT NOT NULL, UNIQUE (branch, sha))')
+        self._connection.commit()
+
+    def refresh(self) -> int:
+        """ Index any commits pushed to the branch since the last indexed SHA, returning how many were added.
+        A force-push is handled by dropping everything after the common ancestor and reindexing from there.
+        """
+        with self._refresh_lock:
+            repo = self.get_repo()
+            head_sha = repo.get_branch(self.branch).commit.sha
+            last_sha = self.get_last_indexed_sha()
+            if last_sha is None:
+                LOG.info(f'Seeding {self.branch} commit index at {head_sha}')
+                self.append_commits([repo.get_commit(head_sha)])
+                return 1
+            if last_sha == head_sha:
+                return 0
+
+            comparison = repo.compare(base=last_sha, head=head_sha)
+            if comparison.status == CompareStatus.AHEAD:
+                return self.append_commits(comparison.commits)
+            if comparison.status == CompareStatus.BEHIND:
+                LOG.warning(f'{self.branch} moved back from {last_sha} to {head_sha}, truncating index')
+                self.truncate_after(head_sha)
+                return 0
+
+            merge_base_sha = comparison.merge_base_commit.sha
+            LOG.warning(f'{self.branch} was force-pushed from {last_sha} to {head_sha}, '
+                        f'reindexing from {merge_base_sha}')
+            if self.get_position(merge_base_sha) is None:
+                self.clear()
+                self.append_commits([repo.get_commit(head_sha)])
+                return 1
+
+            self.truncate_after(merge_base_sha)
+            return self.append_commits(repo.compare(base=merge_base_sha, head=head_sha).commits)
+
+    def append_commits(self, commits: Iterable) -> int:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            cached_commits = list(executor.map(with_request_priority(to_cached_commit), commits))
+
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO commits (branch, sha, filenames, pr_numbers) VALUES (?, ?, ?, ?)',
+                [(self.branch, commit.sha, json.dumps(commit.filenames), json.dumps(commit.pr_numbers))
+                 for commit in cached_commits]
+            )
+            self._connection.commit()
+        LOG.info(f'Indexed {len(cached_commits)} new commits on {self.branch}')
+        return len(cached_commits)
+
+    def get_commits_between(self, base: str, head: str) -> Optional[List[CachedCommit]]:
+        """ Get the indexed commits after base up to and including head, in order,
+        or None if either SHA is not indexed
+        """
+        base_position = self.get_position(base)
+        head_position = self.get_position(head)
+        if base_position is None or head_position is None or base_position > head_position:
+            return None
+
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT sha, filenames, pr_numbers FROM commits '
+                'WHERE branch = ? AND position > ? AND position <= ? ORDER BY position',
+                (self.branch, base_position, head_position)
+            ).fetchall()
+        return [CachedCommit(sha=sha, filenames=tuple(json.loads(filenames)), pr_numbers=to_pr_numbers(pr_numbers))
+                for sha, filenames, pr_numbers in rows]
+
+    def get_position(self, sha: str) -> Optional[int]:
+        with self._lock:
+            row = self._connection.execute('SELECT position FROM commits WHERE branch = ? AND sha = ?',
+                                           (self.branch, sha)).fetchone()
+        return row[0] if row else None
+
+    def resolve_sha(self, prefix: str) -> Optional[str]:
+        """ Expand an abbreviated SHA, e.g. from a Heroku release description, if it's indexed and unambiguous
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT sha FROM commits WHERE branch = ? AND sha LIKE ? || '%' LIMIT 2",
+                                            (self.branch, prefix)).fetchall()
+        return rows[0][0] if len(rows) == 1 else None
+
+    def get_last_indexed_sha(self) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute('SELECT sha FROM commits WHERE branch = ? ORDER BY position DESC LIMIT 1',
+                                           (self.branch,)).fetchone()
+        return row[0] if row else None
+
+    def truncate_after(self, sha: str) -> None:
+        position = self.get_position(sha)
+        with self._lock:
+            self._connection.execute('DELETE FROM commits WHERE branch = ? AND position > ?', (self.branch, position))
+            self._connection.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute('DELETE FROM commits WHERE branch = ?', (self.branch,))
+            self._connection.commit()
+
+    def start(self, interval_seconds: int = COMMIT_INDEX_INTERVAL_SECONDS) -> None:
+        """ Refresh the index every interval_seconds on a background daemon thread
+        """
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, args=(interval_seconds,), name=f'{self.branch}-commit-index',
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self, interval_seconds: int) -> None:
+        while not self._stop_event.is_set():
+            try:
+                # Indexing yields GitHub's rate limit budget to commands, catching up on the next run
+                with request_priority(Priority.BACKGROUND):
+                    self.refresh()
+            except Exception as e:
+                LOG.error(f'Unable to refresh {self.branch} commit index: {e}')
+            self._stop_event.wait(interval_seconds)
+
+
+def to_pr_numbers(pr_numbers: str) -> Optional[Tuple[int, ...]]:
+    """ Parse a stored pr_numbers column, `null` for commits indexed without looking up their PRs
+    """
+    numbers = json.loads(pr_numbers)
+    return None if numbers is None else tuple(numbers)
+
+
+_commit_index: Optional[StableCommitIndex] = None
+
+
+def get_commit_index() -> Optional[StableCommitIndex]:
+    return _commit_index
+
+
+def start_commit_index(get_repo: Callable[[], 'Repository'], branch: str) -> StableCommitIndex:
+    global _commit_index
+    _commit_index = StableCommitIndex(get_repo=get_repo, branch=branch)
+    _commit_index.start()
+    return _commit_index
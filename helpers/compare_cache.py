@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Tuple
+import logging
+import os
+import sys
+
+if TYPE_CHECKING:
+    from github.Commit import Commit
+
+LOG = logging.getLogger(__name__)
+
+COMPARE_CACHE_MAX_BYTES = int(os.environ.get('COMPARE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+
+class CachedCommit(NamedTuple):
+    """ The parts of a compared commit needed to answer any item_filter query without GitHub
+    """
+    sha: str
+    filenames: Tuple[str, ...]
+    # None until looked up: the REST backend only fetches PRs for commits matching an item_filter
+    pr_numbers: Optional[Tuple[int, ...]]
+
+
+def to_cached_commit(commit: 'Commit') -> CachedCommit:
+    LOG.info(f'Found commit in comparison: {commit}')
+    return CachedCommit(sha=commit.sha, filenames=tuple(file.filename for file in commit.files), pr_numbers=None)
+
+
+def get_cached_commit_size(commit: CachedCommit) -> int:
+    """ Approximate the memory held by a CachedCommit, counting its strings and tuples
+    """
+    return (sys.getsizeof(commit)
+            + sys.getsizeof(commit.sha)
+            + sys.getsizeof(commit.filenames) + sum(sys.getsizeof(filename) for filename in commit.filenames)
+            + sys.getsizeof(commit.pr_numbers) + sum(sys.getsizeof(number) for number in commit.pr_numbers or ()))
+
+
+class CompareCache:
+    """ In-memory cache of (base, head) SHAs -> compared commits, evicting the least recently used
+    comparisons once their approximate size exceeds max_bytes. Comparing two SHAs always gives the
+    same answer, so entries never expire.
+    """
+    def __init__(self, max_bytes: int = COMPARE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._comparisons: 'OrderedDict[Tuple[str, str], Tuple[List[CachedCommit], int]]' = OrderedDict()
+
+    def get(self, base: str, head: str) -> Optional[List[CachedCommit]]:
+        with self._lock:
+            entry = self._comparisons.get((base, head))
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._comparisons.move_to_end((base, head))
+            commits, _ = entry
+            return commits
+
+    def put(self, base: str, head: str, commits: List[CachedCommit]) -> None:
+        size_bytes = sum(get_cached_commit_size(commit) for commit in commits)
+        if size_bytes > self.max_bytes:
+            LOG.warning(f'Not caching comparison {base}...{head}: {size_bytes} bytes exceeds {self.max_bytes}')
+            return
+
+        with self._lock:
+            previous_entry = self._comparisons.pop((base, head), None)
+            if previous_entry:
+                self.size_bytes -= previous_entry[1]
+
+            self._comparisons[(base, head)] = (commits, size_bytes)
+            self.size_bytes += size_bytes
+            while self.size_bytes > self.max_bytes:
+                (evicted_base, evicted_head), (_, evicted_size) = self._comparisons.popitem(last=False)
+                self.size_bytes -= evicted_size
+                LOG.debug(f'Evicted comparison {evicted_base}...{evicted_head} ({evicted_size} bytes)')
+
+    def __len__(self) -> int:
+        return len(self._comparisons)
+
+
+_compare_cache = CompareCache()
+
+
+def get_compare_cache() -> CompareCache:
+    return _compare_cache
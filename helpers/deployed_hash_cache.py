@@ -0,0 +1,69 @@
+from helpers.command_helpers import get_heroku_git_hash
+from threading import Lock
+from typing import Dict, Optional, Tuple
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+DEPLOYED_HASH_TTL_SECONDS = int(os.environ.get('DEPLOYED_HASH_TTL_SECONDS', 600))
+
+
+class DeployedHashCache:
+    """ In-process cache of app name -> deployed git hash. The hash only changes on a release, so entries
+    live for ttl_seconds and are otherwise invalidated or updated by Heroku release webhooks.
+    """
+    def __init__(self, ttl_seconds: int = DEPLOYED_HASH_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._git_hashes: Dict[str, Tuple[str, float]] = {}
+
+    def get(self, app_name: str, allow_stale: bool = False) -> Optional[str]:
+        with self._lock:
+            git_hash, cached_at = self._git_hashes.get(app_name, (None, 0))
+            if git_hash and (allow_stale or time.monotonic() - cached_at < self.ttl_seconds):
+                self.hits += 1
+                return git_hash
+
+            self.misses += 1
+            return None
+
+    def put(self, app_name: str, git_hash: str) -> None:
+        with self._lock:
+            self._git_hashes[app_name] = (git_hash, time.monotonic())
+
+    def invalidate(self, app_name: str) -> None:
+        with self._lock:
+            self._git_hashes.pop(app_name, None)
+
+
+_deployed_hash_cache = DeployedHashCache()
+
+
+def get_deployed_hash_cache() -> DeployedHashCache:
+    return _deployed_hash_cache
+
+
+def get_cached_heroku_git_hash(app_name: Optional[str], force_refresh: bool = False) -> Optional[str]:
+    """ Get the git hash deployed to a Heroku app, only asking Heroku when it isn't cached or force_refresh is set
+    """
+    deployed_hash_cache = get_deployed_hash_cache()
+    if not force_refresh:
+        git_hash = deployed_hash_cache.get(app_name)
+        if git_hash:
+            LOG.info(f'Using cached deployed git hash {git_hash} for {app_name}')
+            return git_hash
+
+    git_hash = get_heroku_git_hash(app_name)
+    if git_hash:
+        deployed_hash_cache.put(app_name, git_hash)
+        return git_hash
+
+    # Heroku is unreachable or out of rate limit budget, so fall back to what was last deployed
+    stale_git_hash = deployed_hash_cache.get(app_name, allow_stale=True)
+    if stale_git_hash:
+        LOG.warning(f'Using expired deployed git hash {stale_git_hash} for {app_name}')
+    return stale_git_hash
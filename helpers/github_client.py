@@ -0,0 +1,197 @@
+from github import Github
+from github.Requester import HTTPSRequestsConnectionClass, RequestsResponse
+from github.Repository import Repository
+from helpers.command_helpers import GITHUB_TOKEN, SlackHerokuDeployError
+from helpers.github_graphql import GraphQLCommitSource
+from helpers.http_cache import conditional_get
+from helpers.metrics import record_latency
+from helpers.rate_limiter import Provider, get_rate_limiter
+from helpers.http_client import HTTP_MAX_RETRIES, HTTP_READ_TIMEOUT_SECONDS, HTTP_RETRY_BACKOFF_SECONDS, RETRY_STATUSES
+from http import HTTPStatus
+from threading import Lock, local
+from typing import Dict, Optional, Tuple
+from urllib3.util.retry import Retry
+import logging
+import os
+import re
+import time
+
+LOG = logging.getLogger(__name__)
+
+# Sized for the concurrent per-commit lookups in /commit-list
+GITHUB_API_URL = 'https://api.github.com'
+GITHUB_POOL_SIZE = int(os.environ.get('GITHUB_POOL_SIZE', 16))
+GITHUB_REPOSITORY_TTL_SECONDS = int(os.environ.get('GITHUB_REPOSITORY_TTL_SECONDS', 300))
+
+# Names PyGitHub's requests are timed under by URL path, keeping the metrics' endpoint label to a handful of values
+GITHUB_REST_ENDPOINTS = [
+    (re.compile(r'^/repos/[^/]+/[^/]+/compare/'), 'github.compare'),
+    (re.compile(r'^/repos/[^/]+/[^/]+/commits/[^/]+/pulls$'), 'github.commit-pulls'),
+    (re.compile(r'^/repos/[^/]+/[^/]+/commits/[^/]+$'), 'github.commit'),
+    (re.compile(r'^/repos/[^/]+/[^/]+/commits$'), 'github.commits'),
+    (re.compile(r'^/repos/[^/]+/[^/]+/pulls(/\d+)?$'), 'github.pulls'),
+    (re.compile(r'^/repos/[^/]+/[^/]+$'), 'github.repo'),
+]
+
+
+class GitHubRequestError(SlackHerokuDeployError):
+    pass
+
+
+class RateLimitedGitHubConnection(HTTPSRequestsConnectionClass):
+    """ PyGitHub's connection, scheduled against the GitHub budget in helpers.rate_limiter like the bot's other requests.
+    PyGitHub shares one connection between threads and stores each request on it until getresponse(), so the
+    request is stored per thread while the session's pool of keep-alive connections is shared.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = local()
+
+    def request(self, verb: str, url: str, input, headers: Dict[str, str]) -> None:
+        # Wait for the budget before storing the request, so it's sent as soon as it's stored
+        get_rate_limiter().acquire(Provider.GITHUB)
+        self._pending.request = (verb, url, input, headers)
+
+    def getresponse(self) -> RequestsResponse:
+        verb, url, input, headers = self._pending.request
+        del self._pending.request
+        started_at = time.monotonic()
+        response = self.session.request(verb, f'{self.protocol}://{self.host}:{self.port}{url}', headers=headers,
+                                        data=input, timeout=self.timeout, verify=self.verify, allow_redirects=False)
+        record_latency(get_github_rest_endpoint(url), time.monotonic() - started_at, response.status_code)
+        get_rate_limiter().update(Provider.GITHUB, response.headers)
+        return RequestsResponse(response)
+
+
+class GitHubClientPool:
+    """ Process-wide GitHub clients sharing keep-alive connections across commands and threads,
+    plus repository handles cached for ttl_seconds so `get_repo` isn't a round-trip on every command
+    """
+    def __init__(self,
+                 token: Optional[str] = GITHUB_TOKEN,
+                 pool_size: int = GITHUB_POOL_SIZE,
+                 repository_ttl_seconds: int = GITHUB_REPOSITORY_TTL_SECONDS):
+        self.token = token
+        self.pool_size = pool_size
+        self.repository_ttl_seconds = repository_ttl_seconds
+        self.client_requests = 0
+        self.client_reuses = 0
+        self.repository_requests = 0
+        self.repository_reuses = 0
+        self._lock = Lock()
+        self._client: Optional[Github] = None
+        self._graphql_sources: Dict[str, GraphQLCommitSource] = {}
+        self._repositories: Dict[str, Tuple[Repository, float]] = {}
+
+    def get_client(self) -> Github:
+        with self._lock:
+            self.client_requests += 1
+            if self._client is None:
+                LOG.info(f'Creating GitHub client with a pool of {self.pool_size} connections')
+                # PyGitHub only accepts whole seconds for its timeout
+                self._client = Github(self.token, pool_size=self.pool_size, timeout=int(HTTP_READ_TIMEOUT_SECONDS),
+                                      retry=get_github_retry())
+                # PyGitHub's only public hook for this, injectConnectionClasses, also turns off connection reuse.
+                # This private attribute is why requirements.txt pins PyGitHub's exact version.
+                requester = self._client._Github__requester
+                if not hasattr(requester, '_Requester__connectionClass'):
+                    LOG.error('PyGitHub no longer has Requester.__connectionClass, so GitHub requests bypass the '
+                              'rate limiter and latency metrics')
+                requester._Requester__connectionClass = RateLimitedGitHubConnection
+            else:
+                self.client_reuses += 1
+            return self._client
+
+    def get_repository(self, name: str) -> Repository:
+        client = self.get_client()
+        with self._lock:
+            self.repository_requests += 1
+            repository, fetched_at = self._repositories.get(name, (None, 0))
+            if repository and time.monotonic() - fetched_at < self.repository_ttl_seconds:
+                self.repository_reuses += 1
+                LOG.debug(f'Reusing {name} handle, reuse rate {self.repository_reuse_rate:.2f}')
+                return repository
+
+        repository = client.get_repo(name)
+        with self._lock:
+            self._repositories[name] = (repository, time.monotonic())
+        return repository
+
+    def get_graphql_source(self, repository: str) -> GraphQLCommitSource:
+        with self._lock:
+            self.client_requests += 1
+            graphql_source = self._graphql_sources.get(repository)
+            if graphql_source is None:
+                graphql_source = GraphQLCommitSource(token=self.token, repository=repository)
+                self._graphql_sources[repository] = graphql_source
+            else:
+                self.client_reuses += 1
+            return graphql_source
+
+    @property
+    def client_reuse_rate(self) -> float:
+        return self.client_reuses / self.client_requests if self.client_requests else 0.0
+
+    @property
+    def repository_reuse_rate(self) -> float:
+        return self.repository_reuses / self.repository_requests if self.repository_requests else 0.0
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            'client_requests': self.client_requests,
+            'client_reuses': self.client_reuses,
+            'client_reuse_rate': self.client_reuse_rate,
+            'repository_requests': self.repository_requests,
+            'repository_reuses': self.repository_reuses,
+            'repository_reuse_rate': self.repository_reuse_rate,
+        }
+
+
+def get_github_rest_endpoint(url: str) -> str:
+    """ Name a PyGitHub request for the metrics, e.g. `github.compare`, or `github.rest` for any other path
+    """
+    path = url.split('?', 1)[0]
+    return next((name for pattern, name in GITHUB_REST_ENDPOINTS if pattern.match(path)), 'github.rest')
+
+
+def get_github_retry() -> Retry:
+    """ PyGitHub manages its own session, so give it the same timeouts and retry policy as helpers.http_client
+    """
+    return Retry(total=HTTP_MAX_RETRIES, backoff_factor=HTTP_RETRY_BACKOFF_SECONDS,
+                 status_forcelist=sorted(RETRY_STATUSES), allowed_methods=['GET'],
+                 respect_retry_after_header=True, raise_on_status=False)
+
+
+_client_pool = GitHubClientPool()
+
+
+def get_github_client_pool() -> GitHubClientPool:
+    return _client_pool
+
+
+def get_github_repository(name: str) -> Repository:
+    return _client_pool.get_repository(name)
+
+
+def get_graphql_source(repository: str) -> GraphQLCommitSource:
+    return _client_pool.get_graphql_source(repository)
+
+
+def reset_github_client_pool() -> None:
+    """ Drop the shared client and cached repositories, e.g. between tests
+    """
+    global _client_pool
+    _client_pool = GitHubClientPool()
+
+
+def get_branch_head_sha(repository: str, branch: str) -> str:
+    """ Get the SHA at the tip of a branch, revalidating a cached answer with a conditional request
+    so that an unchanged branch costs no rate limit
+    """
+    # https://docs.github.com/en/rest/branches/branches#get-a-branch
+    url = f'{GITHUB_API_URL}/repos/{repository}/branches/{branch}'
+    headers = {'Accept': 'application/vnd.github+json', 'Authorization': f'token {GITHUB_TOKEN}'}
+    response = conditional_get(url=url, headers=headers, endpoint='github.branch')
+    if response.status_code != HTTPStatus.OK:
+        raise GitHubRequestError(f'Bad status received from GitHub: {response.status_code} for branch {branch}')
+    return response.json()['commit']['sha']
@@ -0,0 +1,178 @@
+from datetime import datetime
+from helpers.command_helpers import SlackHerokuDeployError
+from helpers.compare_cache import CachedCommit
+from helpers.http_client import http_post
+from helpers.pr_cache import CachedPullRequest, cache_commit_pulls
+from http import HTTPStatus
+from typing import Dict, List, Optional
+import logging
+import os
+
+LOG = logging.getLogger(__name__)
+
+GITHUB_GRAPHQL_URL = os.environ.get('GITHUB_GRAPHQL_URL', 'https://api.github.com/graphql')
+GRAPHQL_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+GRAPHQL_HISTORY_PAGE_SIZE = 50
+GRAPHQL_MAX_HISTORY_PAGES = 20
+GRAPHQL_MAX_PULLS_PER_COMMIT = 5
+GRAPHQL_FILES_PAGE_SIZE = 100
+
+PULL_REQUEST_FIELDS = '''
+    number
+    title
+    url
+    mergedAt
+'''
+
+HISTORY_QUERY = f'''
+query($owner: String!, $name: String!, $head: GitObjectID!, $after: String) {{
+  repository(owner: $owner, name: $name) {{
+    object(oid: $head) {{
+      ... on Commit {{
+        history(first: {GRAPHQL_HISTORY_PAGE_SIZE}, after: $after) {{
+          pageInfo {{ hasNextPage endCursor }}
+          nodes {{
+            oid
+            associatedPullRequests(first: {GRAPHQL_MAX_PULLS_PER_COMMIT}) {{
+              nodes {{
+                {PULL_REQUEST_FIELDS}
+                files(first: {GRAPHQL_FILES_PAGE_SIZE}) {{
+                  pageInfo {{ hasNextPage endCursor }}
+                  nodes {{ path }}
+                }}
+              }}
+            }}
+          }}
+        }}
+      }}
+    }}
+  }}
+}}
+'''
+
+PULL_REQUEST_FILES_QUERY = f'''
+query($owner: String!, $name: String!, $number: Int!, $after: String) {{
+  repository(owner: $owner, name: $name) {{
+    pullRequest(number: $number) {{
+      files(first: {GRAPHQL_FILES_PAGE_SIZE}, after: $after) {{
+        pageInfo {{ hasNextPage endCursor }}
+        nodes {{ path }}
+      }}
+    }}
+  }}
+}}
+'''
+
+COMMIT_PULLS_QUERY = f'''
+query($owner: String!, $name: String!, $sha: GitObjectID!) {{
+  repository(owner: $owner, name: $name) {{
+    object(oid: $sha) {{
+      ... on Commit {{
+        associatedPullRequests(first: {GRAPHQL_MAX_PULLS_PER_COMMIT}) {{
+          nodes {{
+            {PULL_REQUEST_FIELDS}
+          }}
+        }}
+      }}
+    }}
+  }}
+}}
+'''
+
+
+class GitHubGraphQLError(SlackHerokuDeployError):
+    pass
+
+
+class GraphQLCommitSource:
+    """ Fetches a commit range with each commit's pull requests and their changed files in batched
+    GraphQL queries, instead of one REST call per commit for files and another for pulls.
+
+    GraphQL doesn't expose a commit's own changed files, so a commit's files are those of its pull
+    requests, which are the same for the squash merges that land on `stable`.
+    """
+    def __init__(self, token: str, repository: str, url: Optional[str] = None):
+        self.url = url or GITHUB_GRAPHQL_URL
+        self.owner, self.name = repository.split('/')
+        self.headers = {'Authorization': f'bearer {token}'}
+
+    def query(self, query: str, **variables) -> Dict:
+        # Only queries are sent, so they're safe to retry like a GET
+        response = http_post(self.url, endpoint='github.graphql', idempotent=True, headers=self.headers,
+                             json={'query': query, 'variables': variables})
+        if response.status_code != HTTPStatus.OK:
+            raise GitHubGraphQLError(f'Bad status received from GitHub GraphQL: {response.status_code}')
+
+        body = response.json()
+        if body.get('errors'):
+            raise GitHubGraphQLError(f'GitHub GraphQL errors: {body["errors"]}')
+        return body['data']
+
+    def get_compared_commits(self, base: str, head: str) -> List[CachedCommit]:
+        """ Walk head's history back to base, returning the commits after base oldest first
+        and caching each commit's pull requests along the way
+        """
+        compared_commits = []
+        after = None
+        for _ in range(GRAPHQL_MAX_HISTORY_PAGES):
+            data = self.query(HISTORY_QUERY, owner=self.owner, name=self.name, head=head, after=after)
+            commit_object = data['repository']['object']
+            if not commit_object:
+                raise GitHubGraphQLError(f'No commit found for {head}')
+
+            history = commit_object['history']
+            for node in history['nodes']:
+                if node['oid'] == base:
+                    compared_commits.reverse()
+                    return compared_commits
+                compared_commits.append(self.to_cached_commit(node))
+
+            if not history['pageInfo']['hasNextPage']:
+                break
+            after = history['pageInfo']['endCursor']
+
+        raise GitHubGraphQLError(f'Unable to find {base} within {len(compared_commits)} commits of {head}')
+
+    def to_cached_commit(self, node: Dict) -> CachedCommit:
+        pull_nodes = node['associatedPullRequests']['nodes']
+        pulls = [to_cached_pull_request(pull_node) for pull_node in pull_nodes]
+        cache_commit_pulls(node['oid'], pulls)
+
+        filenames = []
+        for pull_node in pull_nodes:
+            filenames.extend(self.get_pull_request_filenames(pull_node))
+        return CachedCommit(
+            sha=node['oid'],
+            filenames=tuple(dict.fromkeys(filenames)),
+            pr_numbers=tuple(pull.number for pull in pulls),
+        )
+
+    def get_pull_request_filenames(self, pull_node: Dict) -> List[str]:
+        files = pull_node['files']
+        filenames = [file_node['path'] for file_node in files['nodes']]
+        while files['pageInfo']['hasNextPage']:
+            data = self.query(PULL_REQUEST_FILES_QUERY, owner=self.owner, name=self.name,
+                              number=pull_node['number'], after=files['pageInfo']['endCursor'])
+            files = data['repository']['pullRequest']['files']
+            filenames.extend(file_node['path'] for file_node in files['nodes'])
+        return filenames
+
+    def get_commit_pulls(self, sha: str) -> List[CachedPullRequest]:
+        data = self.query(COMMIT_PULLS_QUERY, owner=self.owner, name=self.name, sha=sha)
+        commit_object = data['repository']['object']
+        if not commit_object:
+            raise GitHubGraphQLError(f'No commit found for {sha}')
+        return [to_cached_pull_request(pull_node) for pull_node in commit_object['associatedPullRequests']['nodes']]
+
+
+def to_cached_pull_request(pull_node: Dict) -> CachedPullRequest:
+    return CachedPullRequest(
+        number=pull_node['number'],
+        title=pull_node['title'],
+        html_url=pull_node['url'],
+        merged_at=parse_graphql_datetime(pull_node['mergedAt']),
+    )
+
+
+def parse_graphql_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.strptime(value, GRAPHQL_DATE_FORMAT) if value else None
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from helpers.http_client import HttpClient, get_http_client
+from helpers.rate_limiter import RateLimitExceeded
+from http import HTTPStatus
+from threading import Lock
+from typing import Dict, Optional, Tuple
+import logging
+import os
+import requests
+
+LOG = logging.getLogger(__name__)
+
+HTTP_CACHE_MAX_ENTRIES = int(os.environ.get('HTTP_CACHE_MAX_ENTRIES', 1000))
+
+
+class EndpointStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        requests_made = self.hits + self.misses
+        return self.hits / requests_made if requests_made else 0.0
+
+
+class ConditionalRequestCache:
+    """ Remembers the last 200 response per URL and headers along with its ETag/Last-Modified validators,
+    revalidating with If-None-Match/If-Modified-Since so that an unchanged resource comes back as a 304
+    and is served from the cache. GitHub doesn't count 304s against the rate limit.
+
+    When the provider's rate limit budget is exhausted, the last cached response is served as is.
+    """
+    def __init__(self, client: Optional[HttpClient] = None, max_entries: int = HTTP_CACHE_MAX_ENTRIES):
+        self.client = client or get_http_client()
+        self.max_entries = max_entries
+        self.endpoint_stats: Dict[str, EndpointStats] = {}
+        self._lock = Lock()
+        self._responses: 'OrderedDict[Tuple, requests.Response]' = OrderedDict()
+
+    def get(self, url: str, headers: Dict[str, str], endpoint: str) -> requests.Response:
+        key = (url, tuple(sorted(headers.items())))
+        with self._lock:
+            cached_response = self._responses.get(key)
+
+        request_headers = dict(headers)
+        if cached_response is not None:
+            if cached_response.headers.get('ETag'):
+                request_headers['If-None-Match'] = cached_response.headers['ETag']
+            if cached_response.headers.get('Last-Modified'):
+                request_headers['If-Modified-Since'] = cached_response.headers['Last-Modified']
+
+        try:
+            response = self.client.get(url, endpoint=endpoint, headers=request_headers)
+        except RateLimitExceeded as e:
+            if cached_response is None:
+                raise
+            LOG.warning(f'{endpoint}: serving the last cached response, {e}')
+            return cached_response
+        is_not_modified = cached_response is not None and response.status_code == HTTPStatus.NOT_MODIFIED
+        with self._lock:
+            stats = self.endpoint_stats.setdefault(endpoint, EndpointStats())
+            # Another thread may have evicted the entry while this request was revalidating it
+            is_hit = is_not_modified and key in self._responses
+            if is_hit:
+                stats.hits += 1
+                self._responses.move_to_end(key)
+            else:
+                stats.misses += 1
+                if is_not_modified:
+                    # The 304 has no body, but it confirms the evicted response is still current
+                    self._store(key, cached_response)
+                elif response.status_code == HTTPStatus.OK and is_cacheable(response):
+                    self._store(key, response)
+
+        LOG.info(f'{endpoint}: {"304, served from cache" if is_not_modified else response.status_code}, '
+                 f'hit ratio {stats.hit_ratio:.2f} over {stats.hits + stats.misses} requests')
+        return cached_response if is_not_modified else response
+
+    def _store(self, key: Tuple, response: requests.Response) -> None:
+        """ Cache a response, evicting the least recently used beyond max_entries, called with the lock held
+        """
+        self._responses[key] = response
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {endpoint: {'hits': stats.hits, 'misses': stats.misses, 'hit_ratio': stats.hit_ratio}
+                    for endpoint, stats in self.endpoint_stats.items()}
+
+
+def is_cacheable(response: requests.Response) -> bool:
+    return bool(response.headers.get('ETag') or response.headers.get('Last-Modified'))
+
+
+_conditional_request_cache = ConditionalRequestCache()
+
+
+def get_conditional_request_cache() -> ConditionalRequestCache:
+    return _conditional_request_cache
+
+
+def conditional_get(url: str, headers: Dict[str, str], endpoint: str) -> requests.Response:
+    return _conditional_request_cache.get(url=url, headers=headers, endpoint=endpoint)
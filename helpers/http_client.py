@@ -0,0 +1,169 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from helpers.metrics import record_latency
+from helpers.rate_limiter import get_provider, get_rate_limiter
+from http import HTTPStatus
+from requests.adapters import HTTPAdapter
+from threading import Lock
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+import logging
+import os
+import random
+import requests
+import time
+
+LOG = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('HTTP_CONNECT_TIMEOUT_SECONDS', 3.05))
+HTTP_READ_TIMEOUT_SECONDS = float(os.environ.get('HTTP_READ_TIMEOUT_SECONDS', 10))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+HTTP_RETRY_BACKOFF_SECONDS = float(os.environ.get('HTTP_RETRY_BACKOFF_SECONDS', 0.5))
+HTTP_RETRY_MAX_SECONDS = float(os.environ.get('HTTP_RETRY_MAX_SECONDS', 30))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+
+RETRY_STATUSES = {
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class HttpClient:
+    """ Keep-alive sessions per host with connect/read timeouts on every request. Retries 429s and 5xxs
+    with jittered exponential backoff, honoring Retry-After, and records each endpoint's latency.
+    Requests to GitHub, Heroku and CircleCI are scheduled against their budgets in helpers.rate_limiter.
+
+    Non-idempotent requests (e.g. approving a CircleCI job) are only retried when the upstream
+    rate limited them or the connection was never made, since otherwise they may have taken effect.
+    """
+    def __init__(self,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT_SECONDS,
+                 read_timeout: float = HTTP_READ_TIMEOUT_SECONDS,
+                 max_retries: int = HTTP_MAX_RETRIES,
+                 backoff_seconds: float = HTTP_RETRY_BACKOFF_SECONDS,
+                 max_backoff_seconds: float = HTTP_RETRY_MAX_SECONDS,
+                 pool_size: int = HTTP_POOL_SIZE):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.pool_size = pool_size
+        self._lock = Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+
+    def get_session(self, url: str) -> requests.Session:
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                LOG.info(f'Creating session for {host} with a pool of {self.pool_size} connections')
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[host] = session
+            return session
+
+    def request(self, method: str, url: str, endpoint: str, idempotent: Optional[bool] = None,
+                **kwargs) -> requests.Response:
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.get_session(url)
+        provider = get_provider(url)
+
+        for attempt in range(self.max_retries + 1):
+            if provider:
+                get_rate_limiter().acquire(provider)
+            started_at = time.monotonic()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                record_latency(endpoint, time.monotonic() - started_at, None)
+                if attempt >= self.max_retries or (was_request_sent(e) and not idempotent):
+                    raise
+                delay = self.get_backoff_seconds(attempt)
+                LOG.warning(f'{endpoint}: {e.__class__.__name__}, retrying in {delay:.2f}s')
+                time.sleep(delay)
+                continue
+
+            record_latency(endpoint, time.monotonic() - started_at, response.status_code)
+            if provider:
+                get_rate_limiter().update(provider, response.headers)
+            if attempt >= self.max_retries or not self.should_retry(response, idempotent):
+                return response
+
+            delay = self.get_backoff_seconds(attempt, response)
+            LOG.warning(f'{endpoint}: {response.status_code}, retrying in {delay:.2f}s')
+            time.sleep(delay)
+        return response
+
+    def get(self, url: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, endpoint=endpoint, **kwargs)
+
+    @staticmethod
+    def should_retry(response: requests.Response, idempotent: bool) -> bool:
+        if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            return True
+        return idempotent and response.status_code in RETRY_STATUSES
+
+    def get_backoff_seconds(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff_seconds)
+        # Full jitter so that concurrent commands retrying the same upstream don't stampede it together
+        return random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+
+
+def was_request_sent(error: requests.RequestException) -> bool:
+    """ Whether a failed request may have reached the upstream. Only failures to connect, e.g. a connect timeout,
+    a DNS failure or a refused connection, are known not to have; anything later, e.g. a read timeout or a
+    dropped connection, may have come after the upstream acted on the request.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return False
+    if isinstance(error, requests.ConnectionError):
+        cause = error.args[0] if error.args else None
+        if isinstance(cause, MaxRetryError):
+            cause = cause.reason
+        return not isinstance(cause, NewConnectionError)
+    return True
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """ Retry-After is either a number of seconds or an HTTP date
+    """
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+_http_client = HttpClient()
+
+
+def get_http_client() -> HttpClient:
+    return _http_client
+
+
+def http_get(url: str, endpoint: str, **kwargs) -> requests.Response:
+    return _http_client.get(url, endpoint=endpoint, **kwargs)
+
+
+def http_post(url: str, endpoint: str, **kwargs) -> requests.Response:
+    return _http_client.post(url, endpoint=endpoint, **kwargs)
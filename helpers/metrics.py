@@ -0,0 +1,211 @@
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+import functools
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+METRICS_SAMPLE_SIZE = int(os.environ.get('METRICS_SAMPLE_SIZE', 500))
+# Upper bounds in seconds of the histogram buckets exported at /metrics
+METRICS_HISTOGRAM_BUCKETS = [float(bound) for bound in os.environ.get(
+    'METRICS_HISTOGRAM_BUCKETS', '0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30').split(',')]
+
+
+class Histogram(NamedTuple):
+    # (upper bound, requests taking at most that long), for each bucket
+    buckets: List[Tuple[float, int]]
+    count: int
+    errors: int
+    total_seconds: float
+
+
+class LatencyStats:
+    """ Request count, errors and a bounded window of recent latencies for one endpoint
+    """
+    def __init__(self, sample_size: int = METRICS_SAMPLE_SIZE, buckets: List[float] = METRICS_HISTOGRAM_BUCKETS):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples: Deque[float] = deque(maxlen=sample_size)
+        self.buckets = sorted(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+
+    def record(self, seconds: float, is_error: bool) -> None:
+        self.count += 1
+        self.errors += int(is_error)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.samples.append(seconds)
+        bucket = bisect_left(self.buckets, seconds)
+        if bucket < len(self.buckets):
+            self.bucket_counts[bucket] += 1
+
+    def percentile(self, fraction: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_seconds': self.total_seconds / self.count if self.count else 0.0,
+            'p50_seconds': self.percentile(0.5),
+            'p95_seconds': self.percentile(0.95),
+            'max_seconds': self.max_seconds,
+        }
+
+    def to_histogram(self) -> Histogram:
+        cumulative_counts, count = [], 0
+        for bucket_count in self.bucket_counts:
+            count += bucket_count
+            cumulative_counts.append(count)
+        return Histogram(buckets=list(zip(self.buckets, cumulative_counts)), count=self.count, errors=self.errors,
+                         total_seconds=self.total_seconds)
+
+
+class MetricsRegistry:
+    """ Per-endpoint latency of the bot's outbound requests, e.g. `heroku.config-vars` or `circleci.approve`,
+    durations of its own work, e.g. `work_queue.run.commit-list`, and gauges such as `work_queue.depth`
+    """
+    def __init__(self, sample_size: int = METRICS_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._lock = Lock()
+        self._latencies: Dict[str, LatencyStats] = {}
+        self._gauges: Dict[str, float] = {}
+
+    def record_latency(self, endpoint: str, seconds: float, status_code: Optional[int]) -> None:
+        is_error = status_code is None or status_code >= 400
+        self.record_duration(endpoint, seconds, is_error)
+        LOG.debug(f'{endpoint}: {status_code} in {seconds:.3f}s')
+
+    def record_duration(self, name: str, seconds: float, is_error: bool = False) -> None:
+        with self._lock:
+            stats = self._latencies.setdefault(name, LatencyStats(self.sample_size))
+            stats.record(seconds, is_error)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {endpoint: stats.to_dict() for endpoint, stats in self._latencies.items()}
+
+    def get_histograms(self) -> Dict[str, Histogram]:
+        with self._lock:
+            return {name: stats.to_histogram() for name, stats in self._latencies.items()}
+
+    def get_gauges(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._gauges)
+
+
+class ListenerTimer:
+    """ Times one Slack request from its listener being called: to its ack, recorded as `ack.<name>`, and to the
+    end of its work, recorded as `listener.<name>` once the listener and any work it queued have all finished
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.monotonic()
+        self.is_acked = False
+        self.is_error = False
+        self._lock = Lock()
+        self._unfinished = 1
+
+    def record_ack(self) -> None:
+        if not self.is_acked:
+            self.is_acked = True
+            record_duration(f'ack.{self.name}', time.monotonic() - self.started_at)
+
+    def time_work(self, function: Callable[[], None]) -> Callable[[], None]:
+        """ Count function, to be run later e.g. on the work queue, as part of the listener's work
+        """
+        with self._lock:
+            self._unfinished += 1
+
+        def timed_function() -> None:
+            token = _listener_timer.set(self)
+            is_error = True
+            try:
+                function()
+                is_error = False
+            finally:
+                _listener_timer.reset(token)
+                self.finish_work(is_error)
+        return timed_function
+
+    def finish_work(self, is_error: bool = False) -> None:
+        with self._lock:
+            self._unfinished -= 1
+            self.is_error = self.is_error or is_error
+            if self._unfinished:
+                return
+        record_duration(f'listener.{self.name}', time.monotonic() - self.started_at, self.is_error)
+
+
+_metrics_registry = MetricsRegistry()
+_listener_timer: ContextVar[Optional[ListenerTimer]] = ContextVar('listener_timer', default=None)
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _metrics_registry
+
+
+def record_latency(endpoint: str, seconds: float, status_code: Optional[int]) -> None:
+    _metrics_registry.record_latency(endpoint, seconds, status_code)
+
+
+def record_duration(name: str, seconds: float, is_error: bool = False) -> None:
+    _metrics_registry.record_duration(name, seconds, is_error)
+
+
+def set_gauge(name: str, value: float) -> None:
+    _metrics_registry.set_gauge(name, value)
+
+
+def get_listener_timer() -> Optional[ListenerTimer]:
+    return _listener_timer.get()
+
+
+def mark_listener_failed() -> None:
+    """ Count the Slack request being handled as an error, e.g. when a command replies with its help message
+    """
+    listener_timer = _listener_timer.get()
+    if listener_timer:
+        listener_timer.is_error = True
+
+
+def instrument_listener(name: str, listener: Callable, time_ack: bool = True) -> Callable:
+    """ Time a Slack listener's ack and work under name, its slash command, action ID or message keyword.
+    Leave time_ack off for a listener whose ack was already sent by its caller. The wrapper keeps the listener's
+    signature, so Bolt passes it the same arguments.
+    """
+    @functools.wraps(listener)
+    def instrumented_listener(**kwargs):
+        listener_timer = ListenerTimer(name)
+        if time_ack and 'ack' in kwargs:
+            ack = kwargs['ack']
+
+            def timed_ack(*args, **ack_kwargs):
+                response = ack(*args, **ack_kwargs)
+                listener_timer.record_ack()
+                return response
+            kwargs['ack'] = timed_ack
+
+        token = _listener_timer.set(listener_timer)
+        is_error = True
+        try:
+            listener(**kwargs)
+            is_error = False
+        finally:
+            _listener_timer.reset(token)
+            listener_timer.finish_work(is_error)
+    return instrumented_listener
@@ -0,0 +1,101 @@
+from typing import Dict, List, Optional, Pattern
+import re
+
+GLOB_CHARACTERS = '*?['
+PATH_SEPARATOR = '/'
+PATTERN_SEPARATOR = ','
+# Marks a trie node where a literal pattern ends
+PATTERN_END = ''
+
+
+def translate_glob(glob: str) -> str:
+    """ Translate a path glob to a regex, where `**` spans any number of directories
+    and `*` and `?` stay within a single path segment
+    """
+    regex = ''
+    index = 0
+    while index < len(glob):
+        if glob.startswith('**/', index):
+            regex += f'(?:[^{PATH_SEPARATOR}]+{PATH_SEPARATOR})*'
+            index += 3
+        elif glob.startswith('**', index):
+            regex += '.*'
+            index += 2
+        elif glob[index] == '*':
+            regex += f'[^{PATH_SEPARATOR}]*'
+            index += 1
+        elif glob[index] == '?':
+            regex += f'[^{PATH_SEPARATOR}]'
+            index += 1
+        elif glob[index] == '[' and ']' in glob[index + 1:]:
+            closing_index = glob.index(']', index + 1)
+            character_class = glob[index + 1:closing_index]
+            if character_class.startswith('!'):
+                character_class = '^' + character_class[1:]
+            regex += f'[{character_class}]'
+            index = closing_index + 1
+        else:
+            regex += re.escape(glob[index])
+            index += 1
+    return regex
+
+
+class PathFilter:
+    """ Compiled form of an item_filter like `fee_collab,shared/**/*.py`, built once per command.
+
+    Literal patterns must match whole path segments, so `fee` matches `fee/models.py` and
+    `apps/fee/models.py` but not `coffee/models.py`. They're stored in a trie of path segments,
+    so matching a file costs the same no matter how many patterns there are.
+    Glob patterns are combined into a single regex, also anchored to path segments.
+    """
+    def __init__(self, item_filter: str):
+        self.item_filter = item_filter
+        self.literal_trie: Dict = {}
+        self.glob_regex: Optional[Pattern] = None
+        self._matches: Dict[str, bool] = {}
+
+        glob_regexes = []
+        for pattern in parse_patterns(item_filter):
+            if any(character in pattern for character in GLOB_CHARACTERS):
+                glob_regexes.append(translate_glob(pattern))
+            else:
+                self.add_literal(pattern)
+
+        if glob_regexes:
+            self.glob_regex = re.compile(f'(?:^|{PATH_SEPARATOR})(?:{"|".join(glob_regexes)})(?:{PATH_SEPARATOR}|$)')
+
+    def add_literal(self, pattern: str) -> None:
+        node = self.literal_trie
+        for segment in pattern.split(PATH_SEPARATOR):
+            if segment:
+                node = node.setdefault(segment, {})
+        node[PATTERN_END] = {}
+
+    def matches(self, filename: str) -> bool:
+        # Commits in a range touch many of the same files, so remember each answer
+        matches = self._matches.get(filename)
+        if matches is None:
+            matches = self.matches_literal(filename) or bool(self.glob_regex and self.glob_regex.search(filename))
+            self._matches[filename] = matches
+        return matches
+
+    def matches_any(self, filenames) -> bool:
+        return any(self.matches(filename) for filename in filenames)
+
+    def matches_literal(self, filename: str) -> bool:
+        segments = filename.split(PATH_SEPARATOR)
+        for start_index in range(len(segments)):
+            node = self.literal_trie
+            for segment in segments[start_index:]:
+                node = node.get(segment)
+                if node is None:
+                    break
+                if PATTERN_END in node:
+                    return True
+        return False
+
+
+def parse_patterns(item_filter: str) -> List[str]:
+    return [pattern.strip().strip(PATH_SEPARATOR)
+            for pattern in item_filter.split(PATTERN_SEPARATOR)
+            if pattern.strip().strip(PATH_SEPARATOR)]
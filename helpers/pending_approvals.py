@@ -0,0 +1,108 @@
+from threading import Lock
+from typing import Dict, NamedTuple, Optional
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+LOG = logging.getLogger(__name__)
+
+PENDING_APPROVALS_PATH = os.environ.get(
+    'PENDING_APPROVALS_PATH', os.path.join(tempfile.gettempdir(), 'slack_deploy_bot_pending_approvals.sqlite3')
+)
+
+
+class BranchWorkflow(NamedTuple):
+    """ The newest pipeline CircleCI reported for a branch, with the workflow holding its approval job once one is on
+    hold, or else the pipeline's latest reported workflow
+    """
+    branch_name: str
+    pipeline_id: str
+    pipeline_number: int
+    workflow_id: str
+    commit_sha: str
+    commit_subject: str
+    job_id: Optional[str]
+    updated_at: float
+
+
+class PendingApprovalStore:
+    """ Table of branch -> newest pipeline, workflow and pending `approval` job, fed by CircleCI webhooks.
+    Reads are served from memory; every change is written through to SQLite so the table survives restarts.
+    """
+    def __init__(self, path: str = PENDING_APPROVALS_PATH):
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS branch_workflows ('
+                                 'branch_name TEXT PRIMARY KEY, pipeline_id TEXT NOT NULL, '
+                                 'pipeline_number INTEGER NOT NULL, workflow_id TEXT NOT NULL, '
+                                 'commit_sha TEXT NOT NULL, commit_subject TEXT NOT NULL, job_id TEXT, '
+                                 'updated_at REAL NOT NULL)')
+        self._connection.commit()
+        self._workflows: Dict[str, BranchWorkflow] = {
+            row[0]: BranchWorkflow(*row) for row in self._connection.execute('SELECT * FROM branch_workflows')
+        }
+
+    def get(self, branch_name: str) -> Optional[BranchWorkflow]:
+        with self._lock:
+            return self._workflows.get(branch_name)
+
+    def record_workflow(self, branch_name: str, pipeline_id: str, pipeline_number: int, workflow_id: str,
+                        commit_sha: str, commit_subject: str) -> bool:
+        """ Track a branch's workflow unless a newer pipeline is already tracked, returning whether it's tracked.
+        Workflows of the tracked pipeline keep an approval job already found on hold in any of its workflows,
+        which is only reset once a newer pipeline arrives.
+        """
+        with self._lock:
+            current = self._workflows.get(branch_name)
+            if current and current.pipeline_number > pipeline_number:
+                return False
+            if current and current.pipeline_id == pipeline_id:
+                if not current.job_id and current.workflow_id != workflow_id:
+                    self._save(current._replace(workflow_id=workflow_id, updated_at=time.time()))
+                return True
+
+            self._save(BranchWorkflow(branch_name=branch_name, pipeline_id=pipeline_id,
+                                      pipeline_number=pipeline_number, workflow_id=workflow_id,
+                                      commit_sha=commit_sha, commit_subject=commit_subject, job_id=None,
+                                      updated_at=time.time()))
+            return True
+
+    def set_approval_job(self, branch_name: str, pipeline_id: str, workflow_id: str, job_id: str) -> bool:
+        """ Record the approval job on hold in one of the workflows of a branch's tracked pipeline, unless one is
+        already recorded. Returns whether it was recorded, so it's only announced once.
+        """
+        with self._lock:
+            current = self._workflows.get(branch_name)
+            if not current or current.pipeline_id != pipeline_id or current.job_id:
+                return False
+            self._save(current._replace(workflow_id=workflow_id, job_id=job_id, updated_at=time.time()))
+            return True
+
+    def clear_approval_job(self, branch_name: str, workflow_id: str) -> None:
+        """ Clear the approval job of a branch once the workflow holding it is over or it's been approved
+        """
+        with self._lock:
+            current = self._workflows.get(branch_name)
+            if not current or current.workflow_id != workflow_id or not current.job_id:
+                return
+            self._save(current._replace(job_id=None, updated_at=time.time()))
+
+    def _save(self, branch_workflow: BranchWorkflow) -> None:
+        self._workflows[branch_workflow.branch_name] = branch_workflow
+        self._connection.execute('INSERT OR REPLACE INTO branch_workflows VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 branch_workflow)
+        self._connection.commit()
+
+
+_pending_approval_store: Optional[PendingApprovalStore] = None
+_pending_approval_store_lock = Lock()
+
+
+def get_pending_approval_store() -> PendingApprovalStore:
+    global _pending_approval_store
+    with _pending_approval_store_lock:
+        if _pending_approval_store is None:
+            _pending_approval_store = PendingApprovalStore()
+        return _pending_approval_store
@@ -0,0 +1,127 @@
+from datetime import datetime
+from threading import Lock
+from typing import Callable, Iterable, List, NamedTuple, Optional
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+LOG = logging.getLogger(__name__)
+
+PR_CACHE_PATH = os.environ.get('PR_CACHE_PATH',
+                               os.path.join(tempfile.gettempdir(), 'slack_deploy_bot_pr_cache.sqlite3'))
+PR_CACHE_MAX_ENTRIES = int(os.environ.get('PR_CACHE_MAX_ENTRIES', 10000))
+
+
+class CachedPullRequest(NamedTuple):
+    """ The subset of a PullRequest that `generate_pr_summary_block` needs
+    """
+    number: int
+    title: str
+    html_url: str
+    merged_at: Optional[datetime]
+
+
+class PullRequestCache:
+    """ SQLite-backed cache of commit SHA -> pull requests, evicting the least recently used SHAs
+    once more than max_entries are stored. A merged commit's PRs never change, so entries never expire.
+    """
+    def __init__(self, path: str = PR_CACHE_PATH, max_entries: int = PR_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS commit_pulls ('
+                                 'sha TEXT PRIMARY KEY, pulls TEXT NOT NULL, last_used REAL NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS commit_pulls_last_used ON commit_pulls (last_used)')
+        self._connection.commit()
+
+    def get(self, sha: str) -> Optional[List[CachedPullRequest]]:
+        with self._lock:
+            row = self._connection.execute('SELECT pulls FROM commit_pulls WHERE sha = ?', (sha,)).fetchone()
+            if not row:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._connection.execute('UPDATE commit_pulls SET last_used = ? WHERE sha = ?', (time.time(), sha))
+            self._connection.commit()
+        return [deserialize_pull_request(pull) for pull in json.loads(row[0])]
+
+    def put(self, sha: str, pulls: Iterable[CachedPullRequest]) -> None:
+        serialized_pulls = json.dumps([serialize_pull_request(pull) for pull in pulls])
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO commit_pulls (sha, pulls, last_used) VALUES (?, ?, ?)',
+                                     (sha, serialized_pulls, time.time()))
+            self._connection.execute('DELETE FROM commit_pulls WHERE sha IN ('
+                                     'SELECT sha FROM commit_pulls ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                                     (self.max_entries,))
+            self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM commit_pulls').fetchone()[0]
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+_pr_cache: Optional[PullRequestCache] = None
+_pr_cache_lock = Lock()
+
+
+def get_pr_cache() -> PullRequestCache:
+    global _pr_cache
+    with _pr_cache_lock:
+        if _pr_cache is None:
+            _pr_cache = PullRequestCache()
+        return _pr_cache
+
+
+def get_or_fetch_commit_pulls(sha: str, fetch_pulls: Callable[[], Iterable]) -> List[CachedPullRequest]:
+    """ Get the PRs for a commit from the cache, else fetch them from GitHub via fetch_pulls and store them
+    """
+    pr_cache = get_pr_cache()
+    pulls = pr_cache.get(sha)
+    if pulls is not None:
+        LOG.debug(f'PR cache hit for {sha} (hit ratio {pr_cache.hit_ratio:.2f})')
+        return pulls
+
+    pulls = [to_cached_pull_request(pull) for pull in fetch_pulls()]
+    # GitHub associates PRs with commits asynchronously, so don't remember a commit as having none
+    if pulls:
+        pr_cache.put(sha, pulls)
+    return pulls
+
+
+def cache_commit_pulls(sha: str, pulls: List[CachedPullRequest]) -> None:
+    """ Store PRs fetched alongside a commit by other means, e.g. in a batched GraphQL query
+    """
+    if pulls:
+        get_pr_cache().put(sha, pulls)
+
+
+def to_cached_pull_request(pull) -> CachedPullRequest:
+    return CachedPullRequest(number=pull.number, title=pull.title, html_url=pull.html_url, merged_at=pull.merged_at)
+
+
+def serialize_pull_request(pull: CachedPullRequest) -> dict:
+    serialized = pull._asdict()
+    serialized['merged_at'] = pull.merged_at.isoformat() if pull.merged_at else None
+    return serialized
+
+
+def deserialize_pull_request(serialized: dict) -> CachedPullRequest:
+    merged_at = serialized.get('merged_at')
+    return CachedPullRequest(
+        number=serialized['number'],
+        title=serialized['title'],
+        html_url=serialized['html_url'],
+        merged_at=datetime.fromisoformat(merged_at) if merged_at else None,
+    )
@@ -0,0 +1,163 @@
+from helpers.metrics import Histogram, get_metrics_registry
+from typing import Dict, List, Optional, Tuple
+import logging
+import re
+
+LOG = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRIC_PREFIX = 'slack_deploy_bot'
+# Histogram families by metric name prefix, as (prefix, family, label). Names matching none of them are
+# outbound requests, e.g. `heroku.config-vars`, `circleci.jobs`, `github.compare` or `slack.chat.update`
+HISTOGRAM_FAMILIES = [
+    ('ack.', 'ack_seconds', 'listener'),
+    ('listener.', 'listener_seconds', 'listener'),
+    ('work_queue.wait.', 'work_queue_wait_seconds', 'queue'),
+    ('work_queue.run.', 'work_queue_run_seconds', 'queue'),
+    ('', 'upstream_request_seconds', 'endpoint'),
+]
+HELP = {
+    'ack_seconds': 'Time from a listener being called to its ack',
+    'listener_seconds': 'Time from a listener being called to the end of its work, including time queued',
+    'work_queue_wait_seconds': 'Time jobs waited on the work queue',
+    'work_queue_run_seconds': 'Time jobs ran on the work queue',
+    'upstream_request_seconds': 'Latency of requests to Heroku, GitHub, CircleCI and Slack',
+}
+
+
+class PrometheusWriter:
+    """ Builds a page in the Prometheus text exposition format, one metric family at a time
+    """
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def add_family(self, name: str, metric_type: str, help_text: str) -> None:
+        self.lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+        self.lines.append(f'# TYPE {METRIC_PREFIX}_{name} {metric_type}')
+
+    def add_sample(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        label_text = ','.join(f'{key}="{escape_label_value(str(label))}"' for key, label in (labels or {}).items())
+        self.lines.append(f'{METRIC_PREFIX}_{name}{{{label_text}}} {format_value(value)}' if label_text
+                          else f'{METRIC_PREFIX}_{name} {format_value(value)}')
+
+    def add_histogram(self, name: str, labels: Dict[str, str], histogram: Histogram) -> None:
+        for upper_bound, count in histogram.buckets:
+            self.add_sample(f'{name}_bucket', count, {**labels, 'le': format_value(upper_bound)})
+        self.add_sample(f'{name}_bucket', histogram.count, {**labels, 'le': '+Inf'})
+        self.add_sample(f'{name}_sum', histogram.total_seconds, labels)
+        self.add_sample(f'{name}_count', histogram.count, labels)
+
+    def render(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def get_metric_name(name: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def get_histogram_family(name: str) -> Tuple[str, str, str]:
+    return next(family for family in HISTOGRAM_FAMILIES if name.startswith(family[0]))
+
+
+def write_histograms(writer: PrometheusWriter) -> None:
+    histograms_by_family: Dict[str, Dict[str, Histogram]] = {}
+    for name, histogram in sorted(get_metrics_registry().get_histograms().items()):
+        prefix, family, _ = get_histogram_family(name)
+        histograms_by_family.setdefault(family, {})[name[len(prefix):]] = histogram
+
+    for prefix, family, label in HISTOGRAM_FAMILIES:
+        histograms = histograms_by_family.get(family)
+        if not histograms:
+            continue
+        writer.add_family(family, 'histogram', HELP[family])
+        for label_value, histogram in histograms.items():
+            writer.add_histogram(family, {label: label_value}, histogram)
+
+        errors_family = f'{family[:-len("_seconds")]}_errors_total'
+        writer.add_family(errors_family, 'counter', f'Errors among those counted in {METRIC_PREFIX}_{family}')
+        for label_value, histogram in histograms.items():
+            writer.add_sample(errors_family, histogram.errors, {label: label_value})
+
+
+def write_gauges(writer: PrometheusWriter) -> None:
+    for name, value in sorted(get_metrics_registry().get_gauges().items()):
+        writer.add_family(get_metric_name(name), 'gauge', f'Current {name}')
+        writer.add_sample(get_metric_name(name), value)
+
+
+def write_cache_stats(writer: PrometheusWriter) -> None:
+    # Imported here rather than at the top, so the HTTP stack isn't loaded before the first ack
+    from helpers.circleci_cache import get_circleci_cache
+    from helpers.compare_cache import get_compare_cache
+    from helpers.deployed_hash_cache import get_deployed_hash_cache
+    from helpers.http_cache import get_conditional_request_cache
+    from helpers.pr_cache import get_pr_cache
+
+    caches = {
+        'circleci': get_circleci_cache(),
+        'compare': get_compare_cache(),
+        'deployed_hash': get_deployed_hash_cache(),
+        'pull_requests': get_pr_cache(),
+    }
+    conditional_request_stats = get_conditional_request_cache().get_stats()
+    for outcome in ('hits', 'misses'):
+        writer.add_family(f'cache_{outcome}_total', 'counter', f'Cache {outcome} by cache')
+        for cache_name, cache in caches.items():
+            writer.add_sample(f'cache_{outcome}_total', getattr(cache, outcome), {'cache': cache_name})
+
+        writer.add_family(f'conditional_request_{outcome}_total', 'counter',
+                          f'Conditional request cache {outcome} by endpoint, a hit being a 304 Not Modified')
+        for endpoint, stats in sorted(conditional_request_stats.items()):
+            writer.add_sample(f'conditional_request_{outcome}_total', stats[outcome], {'endpoint': endpoint})
+
+
+def write_rate_limit_stats(writer: PrometheusWriter) -> None:
+    from helpers.rate_limiter import get_rate_limiter
+
+    rate_limit_stats = get_rate_limiter().get_stats()
+    for key, metric_type, help_text in [
+        ('remaining', 'gauge', 'Requests left in the window, as last reported by the provider'),
+        ('limit', 'gauge', 'Requests allowed per window, as last reported by the provider'),
+        ('tokens', 'gauge', 'Requests left in the bucket used until the provider reports its remaining budget'),
+        ('granted', 'counter', 'Requests let through by the rate limiter'),
+        ('throttled', 'counter', 'Requests made to wait by the rate limiter'),
+    ]:
+        name = f'rate_limit_{key}_total' if metric_type == 'counter' else f'rate_limit_{key}'
+        samples = {provider: stats[key] for provider, stats in sorted(rate_limit_stats.items())
+                   if stats[key] is not None}
+        if not samples:
+            continue
+        writer.add_family(name, metric_type, help_text)
+        for provider, value in samples.items():
+            writer.add_sample(name, value, {'provider': provider})
+
+
+def write_work_stats(writer: PrometheusWriter) -> None:
+    from helpers.approval_tracker import get_approval_tracker
+    from helpers.work_queue import get_work_queue
+
+    writer.add_family('work_queue_refused_total', 'counter', 'Requests turned away with the work queue full')
+    writer.add_sample('work_queue_refused_total', get_work_queue().get_stats()['refused'])
+    writer.add_family('approval_duplicates_total', 'counter',
+                      'Approvals of a CircleCI job answered by one already made or in flight')
+    writer.add_sample('approval_duplicates_total', get_approval_tracker().get_stats()['duplicates'])
+
+
+def render_metrics() -> str:
+    """ Every metric the bot keeps, in the Prometheus text format served at /metrics
+    """
+    writer = PrometheusWriter()
+    write_histograms(writer)
+    write_gauges(writer)
+    write_cache_stats(writer)
+    write_rate_limit_stats(writer)
+    write_work_stats(writer)
+    return writer.render()
@@ -0,0 +1,230 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from requests import RequestException
+from threading import Condition
+from typing import Callable, Dict, Iterator, Mapping, Optional
+from urllib.parse import urlsplit
+import functools
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('RATE_LIMIT_MAX_WAIT_SECONDS', 5))
+RATE_LIMIT_BACKGROUND_MAX_WAIT_SECONDS = float(os.environ.get('RATE_LIMIT_BACKGROUND_MAX_WAIT_SECONDS', 60))
+# Background work stops short of the last share of a provider's budget, leaving it to commands
+RATE_LIMIT_BACKGROUND_RESERVE = float(os.environ.get('RATE_LIMIT_BACKGROUND_RESERVE', 0.25))
+
+
+class Provider(str, Enum):
+    GITHUB = 'github'
+    GITHUB_GRAPHQL = 'github-graphql'
+    HEROKU = 'heroku'
+    CIRCLE_CI = 'circleci'
+
+
+class Priority(str, Enum):
+    INTERACTIVE = 'interactive'
+    BACKGROUND = 'background'
+
+
+# Hourly request budgets documented by each provider, and how many of them may be spent in a burst
+PROVIDER_LIMITS_PER_HOUR = {
+    Provider.GITHUB: int(os.environ.get('GITHUB_RATE_LIMIT_PER_HOUR', 5000)),
+    Provider.GITHUB_GRAPHQL: int(os.environ.get('GITHUB_GRAPHQL_RATE_LIMIT_PER_HOUR', 5000)),
+    Provider.HEROKU: int(os.environ.get('HEROKU_RATE_LIMIT_PER_HOUR', 4500)),
+    Provider.CIRCLE_CI: int(os.environ.get('CIRCLE_CI_RATE_LIMIT_PER_HOUR', 3600)),
+}
+PROVIDER_BURSTS = {
+    Provider.GITHUB: int(os.environ.get('GITHUB_RATE_LIMIT_BURST', 500)),
+    Provider.GITHUB_GRAPHQL: int(os.environ.get('GITHUB_GRAPHQL_RATE_LIMIT_BURST', 100)),
+    Provider.HEROKU: int(os.environ.get('HEROKU_RATE_LIMIT_BURST', 100)),
+    Provider.CIRCLE_CI: int(os.environ.get('CIRCLE_CI_RATE_LIMIT_BURST', 50)),
+}
+PROVIDER_HOSTS = {
+    'api.github.com': Provider.GITHUB,
+    'api.heroku.com': Provider.HEROKU,
+    'circleci.com': Provider.CIRCLE_CI,
+}
+
+_request_priority: ContextVar[Priority] = ContextVar('request_priority', default=Priority.INTERACTIVE)
+
+
+class RateLimitExceeded(RequestException):
+    """ Raised instead of making a request once a provider's budget can't cover it in time,
+    so callers that already handle failed requests can fall back to cached data
+    """
+    pass
+
+
+class ProviderBudget:
+    """ The remaining budget the provider last reported in its rate limit headers, spent as requests are sent.
+    Until the provider has reported one, a token bucket refilled at its documented hourly rate stands in for it.
+    """
+    def __init__(self, provider: Provider, limit_per_hour: int, burst: int):
+        self.provider = provider
+        self.limit = limit_per_hour
+        self.capacity = burst
+        self.refill_per_second = limit_per_hour / 3600
+        self.tokens = float(burst)
+        self.remaining: Optional[float] = None
+        self.reset_at: Optional[float] = None
+        self.updated_at = time.monotonic()
+        self.granted = 0
+        self.throttled = 0
+
+    def refill(self, now: float) -> None:
+        refilled = (now - self.updated_at) * self.refill_per_second
+        self.tokens = min(self.capacity, self.tokens + refilled)
+        self.updated_at = now
+        if self.reset_at is None:
+            # Heroku refills its budget gradually rather than resetting it
+            if self.remaining is not None:
+                self.remaining = min(self.limit, self.remaining + refilled)
+        elif time.time() >= self.reset_at:
+            self.remaining = float(self.limit)
+            self.reset_at = None
+
+    def available(self, priority: Priority) -> float:
+        """ Requests that may be sent at a priority, less the share held back from background work
+        """
+        if self.remaining is None:
+            tokens, reserve = self.tokens, self.capacity * RATE_LIMIT_BACKGROUND_RESERVE
+        else:
+            tokens, reserve = self.remaining, self.limit * RATE_LIMIT_BACKGROUND_RESERVE
+        return tokens - reserve if priority is Priority.BACKGROUND else tokens
+
+    def seconds_until_available(self, priority: Priority) -> float:
+        missing = 1 - self.available(priority)
+        if missing <= 0:
+            return 0.0
+        if self.reset_at is not None:
+            return max(0.0, self.reset_at - time.time())
+        return missing / self.refill_per_second
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        # GitHub sends X-RateLimit-*, Heroku RateLimit-Remaining and CircleCI either, depending on the endpoint
+        remaining = headers.get('X-RateLimit-Remaining') or headers.get('RateLimit-Remaining')
+        if remaining is None:
+            return
+        self.remaining = int(remaining)
+        if headers.get('X-RateLimit-Limit'):
+            self.limit = int(headers['X-RateLimit-Limit'])
+        if headers.get('X-RateLimit-Reset'):
+            self.reset_at = float(headers['X-RateLimit-Reset'])
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            'tokens': self.tokens,
+            'remaining': self.remaining,
+            'limit': self.limit,
+            'granted': self.granted,
+            'throttled': self.throttled,
+        }
+
+
+class RateLimiter:
+    """ Schedules outbound calls against each provider's budget. Interactive requests are served first:
+    background requests wait while any interactive request is waiting, and never spend the reserved share.
+    """
+    def __init__(self,
+                 limits_per_hour: Mapping[Provider, int] = PROVIDER_LIMITS_PER_HOUR,
+                 bursts: Mapping[Provider, int] = PROVIDER_BURSTS):
+        self._condition = Condition()
+        self._interactive_waiting = {provider: 0 for provider in Provider}
+        self._budgets = {provider: ProviderBudget(provider, limits_per_hour[provider], bursts[provider])
+                         for provider in Provider}
+
+    def acquire(self, provider: Provider, priority: Optional[Priority] = None,
+                max_wait_seconds: Optional[float] = None) -> None:
+        priority = priority or get_request_priority()
+        if max_wait_seconds is None:
+            max_wait_seconds = RATE_LIMIT_MAX_WAIT_SECONDS if priority is Priority.INTERACTIVE \
+                else RATE_LIMIT_BACKGROUND_MAX_WAIT_SECONDS
+        deadline = time.monotonic() + max_wait_seconds
+
+        with self._condition:
+            budget = self._budgets[provider]
+            is_waiting = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    budget.refill(now)
+                    yields_to_interactive = priority is Priority.BACKGROUND and self._interactive_waiting[provider]
+                    if not yields_to_interactive and budget.available(priority) >= 1:
+                        budget.tokens -= 1
+                        if budget.remaining is not None:
+                            budget.remaining -= 1
+                        budget.granted += 1
+                        return
+
+                    wait_seconds = budget.seconds_until_available(priority)
+                    if now + wait_seconds > deadline and not yields_to_interactive:
+                        budget.throttled += 1
+                        raise RateLimitExceeded(f'{provider.value} rate limit budget exhausted for {priority.value} '
+                                                f'requests, available again in {wait_seconds:.1f}s')
+                    if now >= deadline:
+                        budget.throttled += 1
+                        raise RateLimitExceeded(f'{provider.value} rate limit budget is in use by interactive requests')
+
+                    if priority is Priority.INTERACTIVE and not is_waiting:
+                        self._interactive_waiting[provider] += 1
+                        is_waiting = True
+                    self._condition.wait(min(max(wait_seconds, 0.01), deadline - now))
+            finally:
+                if is_waiting:
+                    self._interactive_waiting[provider] -= 1
+                    self._condition.notify_all()
+
+    def update(self, provider: Provider, headers: Mapping[str, str]) -> None:
+        with self._condition:
+            self._budgets[provider].update_from_headers(headers)
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with self._condition:
+            return {provider.value: budget.to_dict() for provider, budget in self._budgets.items()}
+
+
+def get_provider(url: str) -> Optional[Provider]:
+    parts = urlsplit(url)
+    provider = PROVIDER_HOSTS.get(parts.hostname)
+    if provider is Provider.GITHUB and parts.path.startswith('/graphql'):
+        return Provider.GITHUB_GRAPHQL
+    return provider
+
+
+def get_request_priority() -> Priority:
+    return _request_priority.get()
+
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """ Run the requests made within the block, on this thread, at the given priority
+    """
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def with_request_priority(function: Callable) -> Callable:
+    """ Carry the current priority over to a function run on another thread, e.g. through an executor
+    """
+    priority = get_request_priority()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with request_priority(priority):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+_rate_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    return _rate_limiter
@@ -0,0 +1,245 @@
+from datetime import datetime, timezone
+from helpers.command_helpers import HEROKU_TOKEN, SlackHerokuDeployError
+from helpers.commit_index import StableCommitIndex
+from helpers.http_client import http_get
+from http import HTTPStatus
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+LOG = logging.getLogger(__name__)
+
+RELEASE_STORE_PATH = os.environ.get('RELEASE_STORE_PATH',
+                                    os.path.join(tempfile.gettempdir(), 'slack_deploy_bot_releases.sqlite3'))
+RELEASE_STORE_PAGE_SIZE = 200  # Heroku's maximum page size for the Releases API
+RELEASE_STORE_MAX_PAGES = int(os.environ.get('RELEASE_STORE_MAX_PAGES', 10))
+# Between syncs, releases come from the release webhook
+RELEASE_STORE_SYNC_TTL_SECONDS = int(os.environ.get('RELEASE_STORE_SYNC_TTL_SECONDS', 300))
+HEROKU_API_URL = 'https://api.heroku.com'
+HEROKU_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+RELEASE_SUCCEEDED = 'succeeded'
+
+# Descriptions Heroku gives git and build API deploys, e.g. `Deploy 1a2b3c4d`, and rollbacks, e.g. `Rollback to v41`
+DEPLOY_DESCRIPTION = re.compile(r'^Deploy ([0-9a-f]{7,40})$')
+ROLLBACK_DESCRIPTION = re.compile(r'^Rollback to v(\d+)$')
+# Releases such as config var or add-on changes don't name a commit, so they take the SHA of the latest earlier
+# release that has one
+SELECT_RELEASES_WITH_EARLIER_SHA = (
+    'SELECT app_name, version, status, created_at, description, COALESCE(sha, ('
+    'SELECT earlier.sha FROM releases AS earlier WHERE earlier.app_name = releases.app_name '
+    f"AND earlier.version < releases.version AND earlier.status = '{RELEASE_SUCCEEDED}' "
+    'AND earlier.sha IS NOT NULL ORDER BY earlier.version DESC LIMIT 1)) FROM releases'
+)
+
+
+class ReleaseStoreError(SlackHerokuDeployError):
+    pass
+
+
+class Release(NamedTuple):
+    app_name: str
+    version: int
+    status: str
+    created_at: datetime
+    description: str
+    sha: Optional[str]
+
+
+class ReleaseStore:
+    """ SQLite-backed history of Heroku releases per app, indexed by time and by git SHA, so that
+    "what was deployed to X at T" and "which apps contain S" don't need a trip to Heroku.
+
+    Filled incrementally by `sync` from the Releases API and by the release webhook as releases happen.
+    """
+    def __init__(self, path: str = RELEASE_STORE_PATH, sync_ttl_seconds: int = RELEASE_STORE_SYNC_TTL_SECONDS):
+        self.sync_ttl_seconds = sync_ttl_seconds
+        self._lock = Lock()
+        self._synced_at: Dict[str, float] = {}
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS releases ('
+                                 'app_name TEXT NOT NULL, version INTEGER NOT NULL, status TEXT NOT NULL, '
+                                 'created_at TEXT NOT NULL, description TEXT NOT NULL, sha TEXT, '
+                                 'PRIMARY KEY (app_name, version))')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS releases_created_at ON releases (app_name, created_at)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS releases_sha ON releases (sha)')
+        self._connection.commit()
+
+    def record_release(self, release: Release) -> None:
+        sha = release.sha or self.get_rollback_sha(release)
+        with self._lock:
+            # A SHA learned from the config vars after the release succeeded is kept when the release is updated
+            self._connection.execute(
+                'INSERT INTO releases (app_name, version, status, created_at, description, sha) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (app_name, version) DO UPDATE SET '
+                'status = excluded.status, description = excluded.description, sha = COALESCE(excluded.sha, sha)',
+                (release.app_name, release.version, release.status, format_release_time(release.created_at),
+                 release.description, sha)
+            )
+            self._connection.commit()
+
+    def set_release_sha(self, app_name: str, version: int, sha: str) -> None:
+        with self._lock:
+            self._connection.execute('UPDATE releases SET sha = ? WHERE app_name = ? AND version = ? AND sha IS NULL',
+                                     (sha, app_name, version))
+            self._connection.commit()
+
+    def get_rollback_sha(self, release: Release) -> Optional[str]:
+        match = ROLLBACK_DESCRIPTION.match(release.description)
+        if not match:
+            return None
+        rolled_back_release = self.get_release(release.app_name, int(match.group(1)))
+        return rolled_back_release.sha if rolled_back_release else None
+
+    def get_release(self, app_name: str, version: int) -> Optional[Release]:
+        return self._get_one('SELECT * FROM releases WHERE app_name = ? AND version = ?', (app_name, version))
+
+    def get_latest_version(self, app_name: str) -> Optional[int]:
+        with self._lock:
+            row = self._connection.execute('SELECT MAX(version) FROM releases WHERE app_name = ?',
+                                           (app_name,)).fetchone()
+        return row[0]
+
+    def get_release_at(self, app_name: str, at: datetime) -> Optional[Release]:
+        """ Get the release that was live on app_name at the given time, i.e. the last successful one before it
+        """
+        return self._get_one(f'{SELECT_RELEASES_WITH_EARLIER_SHA} WHERE app_name = ? AND status = ? '
+                             'AND created_at <= ? ORDER BY created_at DESC, version DESC LIMIT 1',
+                             (app_name, RELEASE_SUCCEEDED, format_release_time(at)))
+
+    def get_current_release(self, app_name: str, with_earlier_sha: bool = True) -> Optional[Release]:
+        """ Get app_name's latest successful release, with the SHA of an earlier release when it doesn't name one
+        unless with_earlier_sha is False
+        """
+        select = SELECT_RELEASES_WITH_EARLIER_SHA if with_earlier_sha else 'SELECT * FROM releases'
+        return self._get_one(f'{select} WHERE app_name = ? AND status = ? ORDER BY version DESC LIMIT 1',
+                             (app_name, RELEASE_SUCCEEDED))
+
+    def get_releases_by_sha(self, sha: str) -> List[Release]:
+        """ Get the releases of a SHA across every app, accepting an abbreviated SHA either way round
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM releases WHERE sha = ? OR sha LIKE ? || '%' OR ? LIKE sha || '%' "
+                'ORDER BY created_at', (sha, sha, sha)
+            ).fetchall()
+        return [to_release(row) for row in rows]
+
+    def get_apps_containing(self, sha: str, app_names: List[str],
+                            commit_index: Optional[StableCommitIndex] = None) -> Dict[str, Optional[bool]]:
+        """ Check whether each app's current release includes sha: either it was released as is or, with the
+        stable commit index, the released commit landed after it. None where that can't be told locally.
+        """
+        sha_position = commit_index.get_position(commit_index.resolve_sha(sha) or sha) if commit_index else None
+        containing = {}
+        for app_name in app_names:
+            release = self.get_current_release(app_name)
+            if not release or not release.sha:
+                containing[app_name] = None
+            elif release.sha.startswith(sha) or sha.startswith(release.sha):
+                containing[app_name] = True
+            elif sha_position is None:
+                containing[app_name] = None
+            else:
+                release_position = commit_index.get_position(commit_index.resolve_sha(release.sha) or release.sha)
+                containing[app_name] = None if release_position is None else sha_position <= release_position
+        return containing
+
+    def needs_sync(self, app_name: str) -> bool:
+        """ Whether app_name has no stored releases or wasn't synced in the last sync_ttl_seconds
+        """
+        with self._lock:
+            synced_at = self._synced_at.get(app_name)
+        if synced_at is not None and time.monotonic() - synced_at < self.sync_ttl_seconds:
+            return False
+        return True
+
+    def sync(self, app_name: str) -> int:
+        """ Fetch releases newer than the latest stored one from the Heroku Releases API, returning
+        how many were stored. The first sync only fetches the most recent page.
+        """
+        latest_version = self.get_latest_version(app_name)
+        if latest_version is None:
+            next_range = f'version ..; order=desc, max={RELEASE_STORE_PAGE_SIZE}'
+        else:
+            next_range = f'version ]{latest_version}..; order=asc, max={RELEASE_STORE_PAGE_SIZE}'
+
+        release_count = 0
+        for _ in range(RELEASE_STORE_MAX_PAGES):
+            # https://devcenter.heroku.com/articles/platform-api-reference#release-list
+            response = http_get(f'{HEROKU_API_URL}/apps/{app_name}/releases', endpoint='heroku.releases',
+                                headers={**get_heroku_headers(), 'Range': next_range})
+            if response.status_code not in (HTTPStatus.OK, HTTPStatus.PARTIAL_CONTENT):
+                raise ReleaseStoreError(f'Bad status received from Heroku: {response.status_code} '
+                                        f'for releases of {app_name}')
+
+            releases = sorted((parse_release(app_name, release) for release in response.json()),
+                              key=lambda release: release.version)
+            for release in releases:
+                self.record_release(release)
+            release_count += len(releases)
+
+            next_range = response.headers.get('Next-Range')
+            if latest_version is None or response.status_code != HTTPStatus.PARTIAL_CONTENT or not next_range:
+                break
+
+        with self._lock:
+            self._synced_at[app_name] = time.monotonic()
+        LOG.info(f'Synced {release_count} releases for {app_name}')
+        return release_count
+
+    def _get_one(self, query: str, parameters: tuple) -> Optional[Release]:
+        with self._lock:
+            row = self._connection.execute(query, parameters).fetchone()
+        return to_release(row) if row else None
+
+
+def get_heroku_headers() -> Dict[str, str]:
+    return {'Accept': 'application/vnd.heroku+json; version=3', 'Authorization': f'Bearer {HEROKU_TOKEN}'}
+
+
+def parse_release(app_name: str, release: Dict) -> Release:
+    """ Build a Release from the Releases API or release webhook representation
+    """
+    description = release.get('description') or ''
+    match = DEPLOY_DESCRIPTION.match(description)
+    return Release(
+        app_name=app_name,
+        version=release['version'],
+        status=release.get('status') or RELEASE_SUCCEEDED,
+        created_at=parse_release_time(release['created_at']),
+        description=description,
+        sha=match.group(1) if match else None,
+    )
+
+
+def to_release(row: tuple) -> Release:
+    app_name, version, status, created_at, description, sha = row
+    return Release(app_name=app_name, version=version, status=status, created_at=parse_release_time(created_at),
+                   description=description, sha=sha)
+
+
+def parse_release_time(value: str) -> datetime:
+    return datetime.strptime(value, HEROKU_DATE_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def format_release_time(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc).strftime(HEROKU_DATE_FORMAT)
+
+
+_release_store: Optional[ReleaseStore] = None
+_release_store_lock = Lock()
+
+
+def get_release_store() -> ReleaseStore:
+    global _release_store
+    with _release_store_lock:
+        if _release_store is None:
+            _release_store = ReleaseStore()
+        return _release_store
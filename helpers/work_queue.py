@@ -0,0 +1,120 @@
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from helpers.command_helpers import SlackHerokuDeployError
+from helpers.metrics import record_duration, set_gauge
+from threading import Lock
+from typing import Callable, Deque, Dict, Mapping, NamedTuple, Optional
+import contextvars
+import json
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+WORK_QUEUE_MAX_WORKERS = int(os.environ.get('WORK_QUEUE_MAX_WORKERS', 16))
+WORK_QUEUE_MAX_DEPTH = int(os.environ.get('WORK_QUEUE_MAX_DEPTH', 100))
+WORK_QUEUE_COMMAND_LIMIT = int(os.environ.get('WORK_QUEUE_COMMAND_LIMIT', 4))
+# Concurrency limits for particular commands, e.g. {"commit-list": 2, "approve-deploy": 8}
+WORK_QUEUE_COMMAND_LIMITS: Dict[str, int] = json.loads(os.environ.get('WORK_QUEUE_COMMAND_LIMITS', '{}'))
+
+
+class WorkQueueFullError(SlackHerokuDeployError):
+    pass
+
+
+class QueuedJob(NamedTuple):
+    name: str
+    function: Callable[[], None]
+    context: contextvars.Context
+    enqueued_at: float
+
+
+class WorkQueue:
+    """ Runs command handlers off the request threads: at most max_workers at once, and at most each
+    command's limit of any one command. Jobs waiting their turn start in order of arrival, except that a
+    command at its limit doesn't hold up the others. Beyond max_depth waiting jobs, new ones are refused.
+    """
+    def __init__(self,
+                 max_workers: int = WORK_QUEUE_MAX_WORKERS,
+                 max_depth: int = WORK_QUEUE_MAX_DEPTH,
+                 command_limit: int = WORK_QUEUE_COMMAND_LIMIT,
+                 command_limits: Optional[Mapping[str, int]] = None):
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.command_limit = command_limit
+        self.command_limits = WORK_QUEUE_COMMAND_LIMITS if command_limits is None else command_limits
+        self.refused = 0
+        self._lock = Lock()
+        self._pending: Deque[QueuedJob] = deque()
+        self._running: Dict[str, int] = defaultdict(int)
+        self._running_count = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='work-queue')
+
+    def submit(self, name: str, function: Callable[[], None]) -> int:
+        """ Queue a job, returning its position among the waiting jobs, or 0 when it started straight away
+        """
+        job = QueuedJob(name=name, function=function, context=contextvars.copy_context(),
+                        enqueued_at=time.monotonic())
+        with self._lock:
+            if len(self._pending) >= self.max_depth:
+                self.refused += 1
+                raise WorkQueueFullError(f'{len(self._pending)} requests are already waiting')
+
+            self._pending.append(job)
+            self._dispatch()
+            position = next((index + 1 for index, pending_job in enumerate(self._pending) if pending_job is job), 0)
+        if position:
+            LOG.info(f'Queued {name} at position {position}')
+        return position
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'depth': len(self._pending), 'running': self._running_count, 'refused': self.refused}
+
+    def _get_command_limit(self, name: str) -> int:
+        return self.command_limits.get(name, self.command_limit)
+
+    def _dispatch(self) -> None:
+        """ Start every waiting job there's room for, called with the lock held
+        """
+        for job in list(self._pending):
+            if self._running_count >= self.max_workers:
+                break
+            if self._running[job.name] >= self._get_command_limit(job.name):
+                continue
+
+            self._pending.remove(job)
+            self._running[job.name] += 1
+            self._running_count += 1
+            self._executor.submit(self._run, job)
+        set_gauge('work_queue.depth', len(self._pending))
+        set_gauge('work_queue.running', self._running_count)
+
+    def _run(self, job: QueuedJob) -> None:
+        started_at = time.monotonic()
+        record_duration(f'work_queue.wait.{job.name}', started_at - job.enqueued_at)
+        is_error = False
+        try:
+            job.context.run(job.function)
+        except Exception as e:
+            is_error = True
+            LOG.exception(f'Queued {job.name} failed: {e}')
+        finally:
+            record_duration(f'work_queue.run.{job.name}', time.monotonic() - started_at, is_error)
+            with self._lock:
+                self._running[job.name] -= 1
+                self._running_count -= 1
+                self._dispatch()
+
+
+_work_queue: Optional[WorkQueue] = None
+_work_queue_lock = Lock()
+
+
+def get_work_queue() -> WorkQueue:
+    global _work_queue
+    with _work_queue_lock:
+        if _work_queue is None:
+            _work_queue = WorkQueue()
+        return _work_queue
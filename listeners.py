@@ -0,0 +1,222 @@
+from helpers.command_helpers import CIRCLE_CI_TOKEN, GITHUB_REPOSITORY, STABLE_BRANCH
+from helpers.metrics import get_listener_timer, instrument_listener, mark_listener_failed, record_latency
+from helpers.work_queue import WorkQueueFullError, get_work_queue
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+# The Slack listeners, shared by the Bolt App in app.py and the AsyncApp in async_app.py. They acknowledge
+# the request and leave the work itself to the work queue. Commands are imported by the work itself, so
+# PyGitHub and dateutil are only loaded once a command needs them rather than before the first ack.
+
+
+class MeteredWebClient(WebClient):
+    """ Slack's WebClient, recording the latency of each Web API method, e.g. `slack.chat.update`
+    """
+    def api_call(self, api_method: str, **kwargs):
+        started_at = time.monotonic()
+        status_code = None
+        try:
+            response = super().api_call(api_method, **kwargs)
+            status_code = response.status_code
+            return response
+        except SlackApiError as e:
+            # Slack answers most errors with a 200 and "ok": false, which count as errors all the same
+            status_code = e.response.status_code if e.response.status_code >= 400 else None
+            raise
+        finally:
+            record_latency(f'slack.{api_method}', time.monotonic() - started_at, status_code)
+
+
+client = MeteredWebClient(token=os.environ.get("SLACK_BOT_TOKEN"))
+
+
+def message_hello(message, say):
+    # say() sends a message to the channel where the event was triggered
+    LOG.info(f'Say message for {say}')
+    say(f"Hey there <@{message['user']}>!")
+
+
+def commit_list(ack, command, respond):
+    ack()
+
+    def run():
+        from commands.commit_list import CommitList, get_commit_list_help_message
+
+        try:
+            CommitList(command=command, respond=respond).get_commit_list()
+        except Exception as e:
+            mark_listener_failed()
+            respond(get_commit_list_help_message(command=command, exception=e))
+            LOG.error(e)
+
+    run_queued('commit-list', command['channel_id'], command['user_id'], respond, run)
+
+
+def latest_deploy(ack, command, respond):
+    ack()
+
+    def run():
+        from commands.latest_deploy import LatestDeploy
+
+        try:
+            LatestDeploy(command=command, respond=respond).get_latest_deployed_commit()
+        except Exception as e:
+            mark_listener_failed()
+            respond(f'Unable to get commits: {e}')
+
+    run_queued('latest-deploy', command['channel_id'], command['user_id'], respond, run)
+
+
+def deploy_reminder(ack, command, say, respond):
+    ack()
+
+    def run():
+        from commands.deploy_reminder import DeployReminder, DeployReminderError, get_deploy_reminder_help_message
+
+        try:
+            DeployReminder(say=say, command=command, web_client=client).schedule_reminder()
+        except DeployReminderError as e:
+            mark_listener_failed()
+            say(get_deploy_reminder_help_message(command=command, exception=e))
+            LOG.error(e)
+
+    run_queued('deploy-reminder', command['channel_id'], command['user_id'], respond, run)
+
+
+def prompt_deploy_by_branch(ack, command, say, respond):
+    ack()
+
+    def run():
+        from commands.deploy_prompt import (
+            PromptBranchDeploy, PromptBranchDeployError, get_deploy_by_branch_help_message
+        )
+
+        try:
+            PromptBranchDeploy(
+                command=command,
+                web_client=client,
+                circle_ci_token=CIRCLE_CI_TOKEN
+            ).prompt_deploy()
+        except PromptBranchDeployError as e:
+            mark_listener_failed()
+            say(get_deploy_by_branch_help_message(command=command, exception=e))
+            LOG.error(e)
+
+    run_queued('deploy-by-branch', command['channel_id'], command['user_id'], respond, run)
+
+
+def deploy_by_branch(ack, body, say, respond):
+    ack()
+
+    def run():
+        from actions.deploy_branch import BranchDeployAction, BranchDeployError
+
+        try:
+            BranchDeployAction(
+                body=body,
+                web_client=client,
+                circle_ci_token=CIRCLE_CI_TOKEN
+            ).deploy()
+        except BranchDeployError as e:
+            mark_listener_failed()
+            say(f'Unable to deploy: {e}')
+            LOG.error(e)
+
+    run_queued('approve-deploy', body['channel']['id'], body['user']['id'], respond, run)
+
+
+def approve_all_deploys_by_branch(ack, body, say, respond):
+    ack()
+
+    def run():
+        from actions.deploy_branch import BranchDeployAction, BranchDeployError
+
+        try:
+            BranchDeployAction(
+                body=body,
+                web_client=client,
+                circle_ci_token=CIRCLE_CI_TOKEN
+            ).deploy_all()
+        except BranchDeployError as e:
+            mark_listener_failed()
+            say(f'Unable to deploy: {e}')
+            LOG.error(e)
+
+    run_queued('approve-deploy', body['channel']['id'], body['user']['id'], respond, run)
+
+
+def cancel_deploy_by_branch(ack, body, say):
+    from actions.deploy_branch import BranchDeployAction, BranchDeployError
+
+    ack()
+    try:
+        BranchDeployAction(
+            body=body,
+            web_client=client,
+            circle_ci_token=CIRCLE_CI_TOKEN
+        ).cancel_prompt()
+    except BranchDeployError as e:
+        mark_listener_failed()
+        say(f'Unable to remove approval button: {e}')
+        LOG.error(e)
+
+
+def run_queued(name: str, channel_id: str, user_id: str, respond, function) -> None:
+    """ Hand a listener's work to the work queue, telling the user when it has to wait or can't be taken
+    """
+    listener_timer = get_listener_timer()
+    try:
+        position = get_work_queue().submit(name, listener_timer.time_work(function) if listener_timer else function)
+    except WorkQueueFullError as e:
+        LOG.warning(f'Refused {name}: {e}')
+        if listener_timer:
+            # The work counted by time_work won't run
+            listener_timer.finish_work(is_error=True)
+        respond(text=':warning: The bot is too busy to take this right now, please try again in a minute.',
+                response_type='ephemeral', replace_original=False)
+        return
+    if position:
+        # Posted with the Web API rather than respond, as the work may use every response the response_url allows
+        try:
+            client.chat_postEphemeral(channel=channel_id, user=user_id, text=':hourglass_flowing_sand: The bot is '
+                                      f'busy, your request is queued at position {position}.')
+        except SlackApiError as e:
+            LOG.warning(f'Unable to tell {user_id} that {name} is queued at position {position}: {e}')
+
+
+def start_background_workers():
+    if os.environ.get("COMMIT_INDEX_ENABLED"):
+        from helpers.commit_index import start_commit_index
+        from helpers.github_client import get_github_repository
+
+        start_commit_index(get_repo=lambda: get_github_repository(GITHUB_REPOSITORY), branch=STABLE_BRANCH)
+
+
+def instrument_listeners(listeners):
+    """ Time every listener's ack and work under its keyword, slash command or action ID
+    """
+    return {name: instrument_listener(name, listener) for name, listener in listeners.items()}
+
+
+MESSAGE_LISTENERS = instrument_listeners({
+    "hello": message_hello,
+})
+COMMAND_LISTENERS = instrument_listeners({
+    "/commit-list": commit_list,
+    "/commit-list-test": commit_list,
+    "/latest-deploy": latest_deploy,
+    "/deploy-reminder": deploy_reminder,
+    "/deploy-reminder-test": deploy_reminder,
+    "/deploy-by-branch": prompt_deploy_by_branch,
+    "/deploy-by-branch-test": prompt_deploy_by_branch,
+})
+ACTION_LISTENERS = instrument_listeners({
+    "approve_deploy": deploy_by_branch,
+    "approve_all_deploys": approve_all_deploys_by_branch,
+    "cancel_deploy_prompt": cancel_deploy_by_branch,
+})
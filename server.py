@@ -0,0 +1,55 @@
+from flask import Flask, Response, request
+from slack_bolt.adapter.flask import SlackRequestHandler
+from http import HTTPStatus
+import logging
+import os
+
+from app import app, client, start_background_workers
+from helpers.prometheus import PROMETHEUS_CONTENT_TYPE, render_metrics
+
+LOG = logging.getLogger(__name__)
+
+# Serves the Slack app alongside the webhook endpoints that Bolt's built-in server can't host
+flask_app = Flask(__name__)
+slack_handler = SlackRequestHandler(app)
+
+
+@flask_app.route("/slack/events", methods=["POST"])
+def slack_events():
+    return slack_handler.handle(request)
+
+
+@flask_app.route("/webhooks/heroku/release", methods=["POST"])
+def heroku_release_webhook():
+    # Webhook handlers, like the listeners, are imported on first use to keep dyno boots short
+    from webhooks.heroku_release import HerokuReleaseWebhook, HerokuReleaseWebhookError
+
+    try:
+        app_name = HerokuReleaseWebhook(body=request.get_data(), headers=request.headers).handle()
+    except HerokuReleaseWebhookError as e:
+        LOG.error(e)
+        return {'error': str(e)}, HTTPStatus.UNAUTHORIZED
+    return {'app': app_name}, HTTPStatus.OK
+
+
+@flask_app.route("/webhooks/circleci", methods=["POST"])
+def circleci_webhook():
+    from webhooks.circleci import CircleCIWebhook, CircleCIWebhookError
+
+    try:
+        branch_name = CircleCIWebhook(body=request.get_data(), headers=request.headers, web_client=client).handle()
+    except CircleCIWebhookError as e:
+        LOG.error(e)
+        return {'error': str(e)}, HTTPStatus.UNAUTHORIZED
+    return {'branch': branch_name}, HTTPStatus.OK
+
+
+@flask_app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Start your app
+if __name__ == "__main__":
+    start_background_workers()
+    flask_app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 3000)))
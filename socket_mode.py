@@ -0,0 +1,15 @@
+from slack_bolt.adapter.socket_mode import SocketModeHandler
+import logging
+import os
+
+from app import app
+from listeners import start_background_workers
+
+LOG = logging.getLogger(__name__)
+
+# Receives Slack requests over a WebSocket opened by the bot, so no inbound HTTP is needed. The Heroku
+# and CircleCI webhooks still need server.py: without them cached deployed hashes only expire by TTL,
+# and pending approvals are looked up from CircleCI on each prompt.
+if __name__ == "__main__":
+    start_background_workers()
+    SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
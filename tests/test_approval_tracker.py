@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from helpers.approval_tracker import ApprovalTracker
+from helpers.command_helpers import SlackHerokuDeployError
+from threading import Event
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+
+class TestApprovalTracker(TestCase):
+    def test_concurrent_approvals_share_one_request(self):
+        tracker = ApprovalTracker()
+        release = Event()
+        send_approval = MagicMock(side_effect=lambda: release.wait(5))
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            leader = executor.submit(tracker.approve, 'job-1', send_approval)
+            while not tracker.get_stats()['in_flight']:
+                pass
+            followers = [executor.submit(tracker.approve, 'job-1', send_approval) for _ in range(2)]
+            while tracker.get_stats()['duplicates'] < 2:
+                pass
+            release.set()
+
+        send_approval.assert_called_once()
+        self.assertFalse(leader.result().is_duplicate)
+        self.assertTrue(all(follower.result().is_duplicate and follower.result().error is None
+                            for follower in followers))
+
+    def test_failed_approval_is_not_kept(self):
+        tracker = ApprovalTracker()
+        send_approval = MagicMock(side_effect=SlackHerokuDeployError('Bad status'))
+
+        outcome = tracker.approve('job-1', send_approval)
+        self.assertEqual('Bad status', outcome.error)
+        self.assertFalse(tracker.approve('job-1', send_approval).is_duplicate)
+        self.assertEqual(2, send_approval.call_count)
+
+    def test_approval_outcome_expires(self):
+        tracker = ApprovalTracker(ttl_seconds=60)
+        send_approval = MagicMock()
+        with patch('helpers.approval_tracker.time.monotonic', return_value=1000):
+            tracker.approve('job-1', send_approval)
+            self.assertTrue(tracker.approve('job-1', send_approval).is_duplicate)
+        with patch('helpers.approval_tracker.time.monotonic', return_value=1061):
+            self.assertFalse(tracker.approve('job-1', send_approval).is_duplicate)
+        self.assertEqual(2, send_approval.call_count)
@@ -0,0 +1,74 @@
+from threading import Barrier, current_thread
+from unittest import TestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+import asyncio
+import os
+
+with patch.dict(os.environ, {'SLACK_BOT_TOKEN': 'xoxb-test', 'SLACK_SIGNING_SECRET': 'secret'}):
+    from async_app import to_async_listener
+from helpers.metrics import MetricsRegistry, instrument_listener
+
+
+def generate_command_body(text: str) -> dict:
+    return {
+        'command': '/commit-list',
+        'text': text,
+        'channel_id': 'CBR2V3XEX',
+        'response_url': 'https://hooks.slack.com/commands/T000/1/abc',
+    }
+
+
+class TestAsyncApp(TestCase):
+    def test_listener_runs_off_the_event_loop_with_sync_utilities(self):
+        calls = {}
+
+        def commit_list(ack, command, respond, say):
+            ack()
+            calls.update(command=command, respond=respond, say=say, thread=current_thread().name)
+
+        ack = AsyncMock()
+        body = generate_command_body('my-app')
+        asyncio.run(to_async_listener(commit_list)(ack=ack, body=body, payload=body, request=MagicMock()))
+
+        ack.assert_awaited_once()
+        self.assertEqual('my-app', calls['command']['text'])
+        self.assertEqual(body['response_url'], calls['respond'].response_url)
+        self.assertEqual('CBR2V3XEX', calls['say'].channel)
+        self.assertTrue(calls['thread'].startswith('slack-listener'))
+
+    def test_blocking_listeners_run_concurrently(self):
+        # Each listener waits for the other, so this only finishes if neither blocks the event loop
+        barrier = Barrier(2, timeout=5)
+
+        def latest_deploy(ack, command, respond):
+            barrier.wait()
+
+        async def dispatch_both():
+            async_listener = to_async_listener(latest_deploy)
+            bodies = [generate_command_body(f'app-{index}') for index in range(2)]
+            await asyncio.gather(*(async_listener(ack=AsyncMock(), body=body, payload=body, request=MagicMock())
+                                   for body in bodies))
+
+        asyncio.run(dispatch_both())
+        self.assertFalse(barrier.broken)
+
+    def test_ack_timed_where_it_is_sent(self):
+        metrics_registry = MetricsRegistry()
+
+        def latest_deploy(ack, command):
+            ack()
+
+        async def slow_ack():
+            await asyncio.sleep(0.05)
+
+        body = generate_command_body('my-app')
+        async_listener = to_async_listener(instrument_listener('/latest-deploy', latest_deploy), name='/latest-deploy')
+        with patch('helpers.metrics._metrics_registry', metrics_registry):
+            asyncio.run(async_listener(ack=AsyncMock(side_effect=slow_ack), body=body, payload=body,
+                                       request=MagicMock()))
+
+        stats = metrics_registry.get_stats()
+        # Once, for the ack sent to Slack rather than the stand-in the listener calls
+        self.assertEqual(1, stats['ack./latest-deploy']['count'])
+        self.assertLessEqual(0.05, stats['ack./latest-deploy']['max_seconds'])
+        self.assertEqual(1, stats['listener./latest-deploy']['count'])
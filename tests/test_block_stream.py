@@ -0,0 +1,41 @@
+from slack_bolt import Respond
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from helpers.block_stream import BlockStream
+
+mock_respond = MagicMock(Respond)
+
+
+class TestBlockStream(TestCase):
+    def setUp(self):
+        mock_respond.reset_mock()
+
+    def test_batches_at_max_blocks(self):
+        block_stream = BlockStream(respond=mock_respond, max_messages=3, max_blocks=2, first_batch_seconds=60)
+        for number in range(5):
+            block_stream.add({'number': number})
+        self.assertEqual(2, mock_respond.call_count)
+
+        block_stream.flush()
+        self.assertEqual(3, mock_respond.call_count)
+        self.assertEqual(5, len(block_stream.sent_blocks))
+        self.assertEqual(0, block_stream.dropped_count)
+
+    def test_sends_first_batch_early(self):
+        block_stream = BlockStream(respond=mock_respond, max_messages=3, max_blocks=50, first_batch_seconds=0)
+        block_stream.add({'number': 0})
+        mock_respond.assert_called_once()
+
+        block_stream.add({'number': 1})
+        mock_respond.assert_called_once()
+
+    def test_drops_blocks_beyond_max_messages(self):
+        block_stream = BlockStream(respond=mock_respond, max_messages=2, max_blocks=2, first_batch_seconds=60)
+        for number in range(7):
+            block_stream.add({'number': number})
+        block_stream.flush()
+
+        self.assertEqual(2, mock_respond.call_count)
+        self.assertEqual(7, block_stream.block_count)
+        self.assertEqual(3, block_stream.dropped_count)
@@ -0,0 +1,191 @@
+from requests import Response
+from slack_sdk import WebClient
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+
+from helpers.circleci_cache import CircleCICache
+from helpers.pending_approvals import PendingApprovalStore
+from webhooks.circleci import CircleCIWebhook, CircleCIWebhookError, SIGNATURE_HEADER
+
+WEBHOOK_SECRET = 'FAKE_SECRET'
+
+
+def generate_event_body(event_type: str = 'job-completed',
+                        branch_name: str = 'release/devex/hello_docker',
+                        pipeline_number: int = 7,
+                        workflow_id: str = 'workflow-7',
+                        job_status: str = 'success') -> bytes:
+    return json.dumps({
+        'type': event_type,
+        'pipeline': {
+            'id': f'pipeline-{pipeline_number}',
+            'number': pipeline_number,
+            'vcs': {'branch': branch_name, 'revision': 'abc123', 'commit': {'subject': 'HDHDH-1: Initial commit'}},
+        },
+        'workflow': {'id': workflow_id, 'status': 'success'},
+        'job': {'id': 'job-1', 'name': 'build', 'status': job_status},
+    }).encode('utf-8')
+
+
+def generate_response(json_data: dict) -> Response:
+    response = Response()
+    response.status_code = 200
+    response._content = json.dumps(json_data).encode('utf-8')
+    return response
+
+
+def generate_pipelines_response(pipeline_id: str) -> Response:
+    return generate_response({'items': [
+        {'id': pipeline_id, 'vcs': {'revision': 'abc123', 'commit': {'subject': 'HDHDH-1: Initial commit'}}},
+    ]})
+
+
+def sign(body: bytes, secret: str = WEBHOOK_SECRET) -> dict:
+    return {SIGNATURE_HEADER: 'v1=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()}
+
+
+class TestCircleCIWebhook(TestCase):
+    def setUp(self):
+        self.web_client = MagicMock(WebClient)
+        self.pending_approval_store = PendingApprovalStore(path=':memory:')
+        for target in ('webhooks.circleci.get_pending_approval_store',
+                       'commands.deploy_prompt.get_pending_approval_store'):
+            patcher = patch(target, return_value=self.pending_approval_store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def handle(self, body: bytes) -> str:
+        return CircleCIWebhook(body=body, headers=sign(body), web_client=self.web_client, secret=WEBHOOK_SECRET,
+                               approval_channel='deploys').handle()
+
+    def test_invalid_signature(self):
+        body = generate_event_body()
+        with self.assertRaises(CircleCIWebhookError):
+            CircleCIWebhook(body=body, headers=sign(body, secret='wrong'), secret=WEBHOOK_SECRET).handle()
+        self.assertIsNone(self.pending_approval_store.get('release/devex/hello_docker'))
+
+    @patch('webhooks.circleci.Thread')
+    @patch('webhooks.circleci.get_final_approval_job', return_value={'id': 'job-2', 'status': 'on_hold'})
+    def test_job_completed_discovers_and_announces_approval(self, mock_get_final_approval_job, mock_thread):
+        self.assertEqual('release/devex/hello_docker', self.handle(generate_event_body()))
+
+        # Run the background lookup inline
+        _, kwargs = mock_thread.call_args
+        kwargs['target'](*kwargs['args'])
+
+        pending_approval = self.pending_approval_store.get('release/devex/hello_docker')
+        self.assertEqual(('workflow-7', 'job-2'), (pending_approval.workflow_id, pending_approval.job_id))
+        self.web_client.chat_postMessage.assert_called_once()
+        _, kwargs = self.web_client.chat_postMessage.call_args
+        self.assertEqual('deploys', kwargs['channel'])
+
+    @patch('webhooks.circleci.Thread')
+    def test_older_pipeline_and_completed_workflow(self, mock_thread):
+        self.handle(generate_event_body(pipeline_number=7, workflow_id='workflow-7'))
+        self.pending_approval_store.set_approval_job('release/devex/hello_docker', 'pipeline-7', 'workflow-7', 'job-2')
+
+        self.handle(generate_event_body(pipeline_number=6, workflow_id='workflow-6'))
+        self.assertEqual('job-2', self.pending_approval_store.get('release/devex/hello_docker').job_id)
+
+        self.handle(generate_event_body(event_type='workflow-completed', workflow_id='workflow-7'))
+        self.assertIsNone(self.pending_approval_store.get('release/devex/hello_docker').job_id)
+        # Jobs of the tracked workflow only trigger a lookup until its approval is known
+        self.assertEqual(1, mock_thread.call_count)
+
+    @patch('webhooks.circleci.Thread')
+    @patch('webhooks.circleci.get_final_approval_job')
+    def test_workflows_of_one_pipeline_share_its_approval(self, mock_get_final_approval_job, mock_thread):
+        mock_get_final_approval_job.side_effect = lambda workflow_id, circle_headers: {
+            'workflow-a': {'id': 'job-a', 'status': 'on_hold'},
+            'workflow-b': {'id': 'job-b', 'status': 'on_hold'},
+        }[workflow_id]
+
+        def run_lookups():
+            for _, kwargs in mock_thread.call_args_list:
+                kwargs['target'](*kwargs['args'])
+            mock_thread.reset_mock()
+
+        self.handle(generate_event_body(workflow_id='workflow-a'))
+        self.handle(generate_event_body(workflow_id='workflow-b'))
+        run_lookups()
+        # Events from either workflow once the approval is known neither reset it nor look it up again
+        self.handle(generate_event_body(workflow_id='workflow-b'))
+        self.handle(generate_event_body(workflow_id='workflow-a'))
+        self.handle(generate_event_body(event_type='workflow-completed', workflow_id='workflow-b'))
+        run_lookups()
+
+        pending_approval = self.pending_approval_store.get('release/devex/hello_docker')
+        self.assertEqual(('workflow-a', 'job-a'), (pending_approval.workflow_id, pending_approval.job_id))
+        self.web_client.chat_postMessage.assert_called_once()
+
+        # Reset once a newer pipeline arrives
+        self.handle(generate_event_body(pipeline_number=8, workflow_id='workflow-c'))
+        self.assertIsNone(self.pending_approval_store.get('release/devex/hello_docker').job_id)
+
+    @patch('webhooks.circleci.Thread')
+    def test_approval_branches_match_case_sensitively(self, mock_thread):
+        # Matched like /deploy-by-branch patterns, whatever the OS
+        self.handle(generate_event_body(branch_name='Release/devex/hello_docker'))
+        mock_thread.assert_not_called()
+
+    @patch('webhooks.circleci.Thread')
+    def test_approval_job_completed_clears_it(self, mock_thread):
+        self.handle(generate_event_body())
+        self.pending_approval_store.set_approval_job('release/devex/hello_docker', 'pipeline-7', 'workflow-7', 'job-1')
+
+        # Approved in CircleCI rather than through the bot
+        self.handle(generate_event_body())
+        self.assertIsNone(self.pending_approval_store.get('release/devex/hello_docker').job_id)
+
+    @patch('commands.deploy_prompt.get_circleci_cache', return_value=CircleCICache())
+    @patch('commands.deploy_prompt.http_get')
+    def test_prompt_reads_pending_approval_on_newest_pipeline(self, mock_http_get, mock_get_circleci_cache):
+        from commands.deploy_prompt import PromptBranchDeploy
+
+        mock_http_get.return_value = generate_pipelines_response('pipeline-7')
+        with patch('webhooks.circleci.Thread'):
+            self.handle(generate_event_body())
+        self.pending_approval_store.set_approval_job('release/devex/hello_docker', 'pipeline-7', 'workflow-7', 'job-2')
+
+        command = {'text': 'release/devex/hello_docker', 'user_id': None, 'channel_id': None}
+        PromptBranchDeploy(command=command, web_client=self.web_client, circle_ci_token='FAKE_TOKEN').prompt_deploy()
+
+        # Only the newest pipeline is checked, the approval itself isn't looked up again
+        self.assertEqual(['circleci.pipelines'], [kwargs['endpoint'] for _, kwargs in mock_http_get.call_args_list])
+        _, kwargs = self.web_client.chat_postMessage.call_args
+        self.assertIn('job-2', kwargs['blocks'])
+
+    @patch('commands.deploy_prompt.get_circleci_cache', return_value=CircleCICache())
+    @patch('commands.deploy_prompt.http_get')
+    def test_prompt_ignores_pending_approval_of_older_pipeline(self, mock_http_get, mock_get_circleci_cache):
+        from commands.deploy_prompt import PromptBranchDeploy
+
+        mock_http_get.side_effect = [
+            generate_pipelines_response('pipeline-8'),
+            generate_response({'items': [{'id': 'workflow-8'}]}),
+            generate_response({'items': [{'id': 'job-3', 'type': 'approval', 'status': 'on_hold'}]}),
+        ]
+        with patch('webhooks.circleci.Thread'):
+            self.handle(generate_event_body())
+        self.pending_approval_store.set_approval_job('release/devex/hello_docker', 'pipeline-7', 'workflow-7', 'job-2')
+
+        command = {'text': 'release/devex/hello_docker', 'user_id': None, 'channel_id': None}
+        PromptBranchDeploy(command=command, web_client=self.web_client, circle_ci_token='FAKE_TOKEN').prompt_deploy()
+
+        _, kwargs = self.web_client.chat_postMessage.call_args
+        self.assertIn('job-3', kwargs['blocks'])
+        self.assertNotIn('job-2', kwargs['blocks'])
+
+    def test_store_survives_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pending_approvals.sqlite3')
+            pending_approval_store = PendingApprovalStore(path=path)
+            pending_approval_store.record_workflow('release/a', 'pipeline-1', 1, 'workflow-1', 'abc123', 'subject')
+            pending_approval_store.set_approval_job('release/a', 'pipeline-1', 'workflow-1', 'job-1')
+
+            self.assertEqual('job-1', PendingApprovalStore(path=path).get('release/a').job_id)
@@ -0,0 +1,22 @@
+from unittest import TestCase
+import os
+
+from benchmarks.cold_start import measure_import
+
+# Importing the server took about 0.6s before the heavy dependencies were made lazy, and about 0.25s after
+COLD_START_BUDGET_SECONDS = float(os.environ.get('COLD_START_BUDGET_SECONDS', 1.0))
+
+
+class TestColdStart(TestCase):
+    def test_server_imports_without_heavy_dependencies(self):
+        report = measure_import('server')
+
+        self.assertEqual([], report.lazy_modules_loaded)
+        self.assertLess(0, report.seconds)
+        self.assertLess(report.seconds, COLD_START_BUDGET_SECONDS)
+
+    def test_async_app_imports_without_heavy_dependencies(self):
+        report = measure_import('async_app')
+
+        self.assertEqual([], report.lazy_modules_loaded)
+        self.assertLess(report.seconds, COLD_START_BUDGET_SECONDS)
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from helpers.commit_index import StableCommitIndex
+from helpers.pr_cache import CachedPullRequest, PullRequestCache
+
+
+class FakeCommit:
+    def __init__(self, sha: str, parent: 'FakeCommit' = None):
+        self.sha = sha
+        self.parent = parent
+        self.files = [SimpleNamespace(filename=f'devex/{sha}.py')]
+
+    def get_pulls(self):
+        return [CachedPullRequest(number=len(self.sha), title=self.sha, html_url='', merged_at=None)]
+
+    def get_history(self):
+        history = []
+        commit = self
+        while commit:
+            history.insert(0, commit)
+            commit = commit.parent
+        return history
+
+
+class FakeRepository:
+    """ A branch of linear histories, enough to exercise ahead, behind and diverged comparisons
+    """
+    def __init__(self, head: FakeCommit):
+        self.head = head
+        self.compare_count = 0
+
+    def get_branch(self, branch: str):
+        return SimpleNamespace(commit=self.head)
+
+    def get_commit(self, sha: str):
+        return next(commit for commit in self.head.get_history() if commit.sha == sha)
+
+    def compare(self, base: str, head: str):
+        self.compare_count += 1
+        head_history = self.head.get_history()
+        head_shas = [commit.sha for commit in head_history]
+        if base in head_shas:
+            return SimpleNamespace(status='ahead', commits=head_history[head_shas.index(base) + 1:])
+        raise AssertionError('Fake repository only compares from ancestors or divergent heads')
+
+
+def build_chain(shas, parent: FakeCommit = None) -> FakeCommit:
+    for sha in shas:
+        parent = FakeCommit(sha=sha, parent=parent)
+    return parent
+
+
+@patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:'))
+class TestStableCommitIndex(TestCase):
+    def setUp(self):
+        self.repo = FakeRepository(head=build_chain(['a']))
+        self.commit_index = StableCommitIndex(get_repo=lambda: self.repo, branch='stable', path=':memory:')
+
+    def test_incremental_refresh(self, mock_get_pr_cache):
+        self.assertEqual(1, self.commit_index.refresh())
+        self.repo.head = build_chain(['b', 'cc'], parent=self.repo.head)
+        self.assertEqual(2, self.commit_index.refresh())
+        self.assertEqual(0, self.commit_index.refresh())
+
+        commits = self.commit_index.get_commits_between(base='a', head='cc')
+        self.assertEqual(['b', 'cc'], [commit.sha for commit in commits])
+        self.assertEqual(('devex/cc.py',), commits[1].filenames)
+        # PRs are looked up by /commit-list for the commits matching its filter
+        self.assertIsNone(commits[1].pr_numbers)
+        self.assertIsNone(self.commit_index.get_commits_between(base='unknown', head='cc'))
+        self.assertEqual(1, self.repo.compare_count)
+
+    def test_force_push_reindexes_from_common_ancestor(self, mock_get_pr_cache):
+        self.commit_index.refresh()
+        base = self.repo.head
+        self.repo.head = build_chain(['b', 'c'], parent=base)
+        self.commit_index.refresh()
+
+        self.repo.head = build_chain(['d'], parent=base)
+        diverged = SimpleNamespace(status='diverged', merge_base_commit=base)
+        compare = self.repo.compare
+        with patch.object(self.repo, 'compare', side_effect=[diverged, compare('a', 'd')]):
+            self.assertEqual(1, self.commit_index.refresh())
+
+        self.assertEqual('d', self.commit_index.get_last_indexed_sha())
+        self.assertIsNone(self.commit_index.get_position('c'))
+        commits = self.commit_index.get_commits_between(base='a', head='d')
+        self.assertEqual(['d'], [commit.sha for commit in commits])
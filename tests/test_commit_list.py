@@ -1,9 +1,13 @@
 from commands.commit_list import CommitList, CommitListError
+from helpers.compare_cache import CompareCache
+from helpers.github_client import reset_github_client_pool
+from helpers.pr_cache import PullRequestCache
 from github import Github
 from github.Repository import Repository
 from slack_bolt import Respond
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
+import datetime
 
 mock_respond = MagicMock(Respond)
 
@@ -16,14 +20,32 @@ def generate_command_text(app_name: str, item_filter: str):
     }
 
 
+def generate_pr(number: int):
+    pr = MagicMock()
+    pr.number = number
+    pr.title = f'PR {number}'
+    pr.html_url = f'https://github.com/StatesTitle/underwriter/pull/{number}'
+    pr.merged_at = datetime.datetime(2021, 9, 1)
+    return pr
+
+
+def generate_commit(sha, filenames, prs):
+    commit = MagicMock()
+    commit.sha = sha
+    commit.files = [MagicMock(filename=filename) for filename in filenames]
+    commit.get_pulls.return_value = prs
+    return commit
+
+
 class TestCommitList(TestCase):
     def setUp(self):
         mock_respond.reset_mock()
+        reset_github_client_pool()
 
     @patch.object(CommitList, 'get_deployed_git_hash')
     @patch.object(Github, 'get_repo')
-    @patch.object(Repository, 'get_branch')
-    def test_get_commit_list(self, mock_get_branch, mock_get_repo, mock_get_git_hash):
+    @patch('commands.commit_list.get_branch_head_sha', return_value='head')
+    def test_get_commit_list(self, mock_get_branch_head_sha, mock_get_repo, mock_get_git_hash):
         command = generate_command_text(app_name='hello_docker', item_filter='devex')
         latest_deploy = CommitList(command=command, respond=mock_respond)
         latest_deploy.get_commit_list()
@@ -34,8 +56,8 @@ class TestCommitList(TestCase):
 
     @patch.object(CommitList, 'get_deployed_git_hash')
     @patch.object(Github, 'get_repo')
-    @patch.object(Repository, 'get_branch')
-    def test_get_commit_list_missing_app_name(self, mock_get_branch, mock_get_repo, mock_get_git_hash):
+    @patch('commands.commit_list.get_branch_head_sha', return_value='head')
+    def test_get_commit_list_missing_app_name(self, mock_get_branch_head_sha, mock_get_repo, mock_get_git_hash):
         command = generate_command_text(app_name='', item_filter='item_filter')
         latest_deploy = CommitList(command=command, respond=mock_respond)
         with self.assertRaises(CommitListError):
@@ -47,8 +69,8 @@ class TestCommitList(TestCase):
 
     @patch.object(CommitList, 'get_deployed_git_hash')
     @patch.object(Github, 'get_repo')
-    @patch.object(Repository, 'get_branch')
-    def test_get_commit_list_missing_item_filter(self, mock_get_branch, mock_get_repo, mock_get_git_hash):
+    @patch('commands.commit_list.get_branch_head_sha', return_value='head')
+    def test_get_commit_list_missing_item_filter(self, mock_get_branch_head_sha, mock_get_repo, mock_get_git_hash):
         command = generate_command_text(app_name='app_name', item_filter='')
         latest_deploy = CommitList(command=command, respond=mock_respond)
         with self.assertRaises(CommitListError):
@@ -57,3 +79,113 @@ class TestCommitList(TestCase):
         mock_get_git_hash.assert_not_called()
         mock_get_repo.assert_not_called()
         mock_respond.assert_not_called()
+
+    @patch('commands.commit_list.get_compare_cache', return_value=CompareCache())
+    @patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:'))
+    def test_get_commits_matching_filter_keeps_order_and_dedupes(self, mock_get_pr_cache, mock_get_compare_cache):
+        command = generate_command_text(app_name='hello_docker', item_filter='devex')
+        commit_list = CommitList(command=command, respond=mock_respond, max_workers=4)
+        repo = MagicMock(Repository)
+        repo.compare.return_value.commits = [
+            generate_commit('sha-0', ['devex/a.py'], [generate_pr(3)]),
+            generate_commit('sha-1', ['other/b.py'], [generate_pr(2)]),
+            generate_commit('sha-2', ['devex/c.py'], [generate_pr(1), generate_pr(3)]),
+            generate_commit('sha-3', ['devex/d.py'], [generate_pr(4)]),
+        ]
+
+        results = commit_list.get_commits_matching_filter(repo=repo, heroku_git_hash='base', latest_stable_commit='head')
+
+        self.assertEqual(3, len(results))
+        for result, number in zip(results, [3, 1, 4]):
+            self.assertIn(f'#{number}>', result['text']['text'])
+        # PRs are only looked up for commits matching the filter
+        repo.compare.return_value.commits[1].get_pulls.assert_not_called()
+        repo.get_commit.assert_not_called()
+
+    @patch('commands.commit_list.get_compare_cache', return_value=CompareCache())
+    @patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:'))
+    def test_get_commits_matching_filter_reuses_comparison(self, mock_get_pr_cache, mock_get_compare_cache):
+        repo = MagicMock(Repository)
+        repo.compare.return_value.commits = [
+            generate_commit('sha-0', ['devex/a.py'], [generate_pr(1)]),
+            generate_commit('sha-1', ['other/b.py'], [generate_pr(2)]),
+        ]
+        commits_by_sha = {commit.sha: commit for commit in repo.compare.return_value.commits}
+        repo.get_commit.side_effect = commits_by_sha.get
+
+        for item_filter, number in [('devex', 1), ('other', 2)]:
+            command = generate_command_text(app_name='hello_docker', item_filter=item_filter)
+            commit_list = CommitList(command=command, respond=mock_respond)
+            results = commit_list.get_commits_matching_filter(repo=repo, heroku_git_hash='base',
+                                                              latest_stable_commit='head')
+            self.assertEqual(1, len(results))
+            self.assertIn(f'#{number}>', results[0]['text']['text'])
+
+        repo.compare.assert_called_once()
+        # The cached comparison has no PRs for the commit only the second filter matches, so they're fetched then
+        repo.get_commit.assert_called_once_with('sha-1')
+
+    @patch('commands.commit_list.get_compare_cache', return_value=CompareCache())
+    @patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:'))
+    @patch.object(CommitList, 'get_deployed_git_hash', return_value='base')
+    @patch('commands.commit_list.get_branch_head_sha', return_value='head')
+    @patch.object(Github, 'get_repo')
+    def test_get_commit_list_streams_in_block_limited_batches(self, mock_get_repo, mock_get_branch_head_sha,
+                                                              mock_get_git_hash, mock_get_pr_cache,
+                                                              mock_get_compare_cache):
+        mock_get_repo.return_value.compare.return_value.commits = [
+            generate_commit(f'sha-{number}', ['devex/a.py'], [generate_pr(number)]) for number in range(200)
+        ]
+        command = generate_command_text(app_name='hello_docker', item_filter='devex')
+        results = CommitList(command=command, respond=mock_respond).get_commit_list()
+
+        self.assertEqual(150, len(results))
+        self.assertEqual(5, mock_respond.call_count)
+        batch_sizes = [len(call.kwargs['blocks']) for call in mock_respond.call_args_list if 'blocks' in call.kwargs]
+        self.assertEqual([50, 50, 50], batch_sizes)
+        summary, = mock_respond.call_args_list[-1].args
+        self.assertIn('found 200 undeployed PR(s)', summary)
+        self.assertIn('50 not shown', summary)
+
+    @patch('commands.commit_list.get_compare_cache', return_value=CompareCache())
+    @patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:'))
+    @patch('commands.commit_list.get_branch_head_sha', return_value='head')
+    @patch.object(Github, 'get_repo')
+    def test_get_commit_list_multiple_apps_share_comparisons(self, mock_get_repo, mock_get_branch_head_sha,
+                                                             mock_get_pr_cache, mock_get_compare_cache):
+        deployed_git_hashes = {'app1': 'base-1', 'app2': 'base-2', 'app3': 'base-1'}
+        mock_get_repo.return_value.compare.return_value.commits = [
+            generate_commit('sha-0', ['devex/a.py'], [generate_pr(1)]),
+        ]
+        command = generate_command_text(app_name='app1,app2,app3', item_filter='devex')
+        commit_list = CommitList(command=command, respond=mock_respond)
+        with patch.object(CommitList, 'get_deployed_git_hash', side_effect=deployed_git_hashes.get):
+            results = commit_list.get_commit_list()
+
+        self.assertEqual(2, mock_get_repo.return_value.compare.call_count)
+        self.assertEqual(4, len(results))
+        self.assertIn('`app1`, `app3`', results[0]['text']['text'])
+        self.assertIn('`app2`', results[2]['text']['text'])
+        self.assertEqual(3, mock_respond.call_count)
+
+    @patch('commands.commit_list.get_compare_cache', return_value=CompareCache())
+    @patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:'))
+    @patch('commands.commit_list.get_branch_head_sha', return_value='head')
+    @patch.object(Github, 'get_repo')
+    def test_get_commit_list_multiple_apps_reports_failed_comparison_in_section(self, mock_get_repo,
+                                                                              mock_get_branch_head_sha,
+                                                                              mock_get_pr_cache,
+                                                                              mock_get_compare_cache):
+        deployed_git_hashes = {'app1': 'base-1', 'app2': 'base-2'}
+        comparison = MagicMock(commits=[generate_commit('sha-0', ['devex/a.py'], [generate_pr(1)])])
+        mock_get_repo.return_value.compare.side_effect = lambda base, head: {'base-1': comparison}[base]
+        command = generate_command_text(app_name='app1,app2', item_filter='devex')
+        commit_list = CommitList(command=command, respond=mock_respond)
+        with patch.object(CommitList, 'get_deployed_git_hash', side_effect=deployed_git_hashes.get):
+            results = commit_list.get_commit_list()
+
+        self.assertEqual(4, len(results))
+        self.assertIn('`app2`', results[2]['text']['text'])
+        self.assertIn('Unable to retrieve commits', results[3]['text']['text'])
+        # Loading message, the streamed blocks and the summary
+        self.assertEqual(3, mock_respond.call_count)
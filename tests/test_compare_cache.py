@@ -0,0 +1,31 @@
+from unittest import TestCase
+
+from helpers.compare_cache import CachedCommit, CompareCache, get_cached_commit_size
+
+
+def generate_cached_commits(sha: str):
+    return [CachedCommit(sha=sha, filenames=('devex/a.py', 'devex/b.py'), pr_numbers=(1,))]
+
+
+class TestCompareCache(TestCase):
+    def test_round_trip(self):
+        compare_cache = CompareCache()
+        compare_cache.put('base', 'head', generate_cached_commits('sha-1'))
+
+        self.assertEqual(generate_cached_commits('sha-1'), compare_cache.get('base', 'head'))
+        self.assertIsNone(compare_cache.get('head', 'base'))
+        self.assertEqual(1, compare_cache.hits)
+        self.assertEqual(1, compare_cache.misses)
+
+    def test_evicts_least_recently_used_past_max_bytes(self):
+        entry_size = sum(get_cached_commit_size(commit) for commit in generate_cached_commits('sha-1'))
+        compare_cache = CompareCache(max_bytes=2 * entry_size)
+        compare_cache.put('base', 'head-1', generate_cached_commits('sha-1'))
+        compare_cache.put('base', 'head-2', generate_cached_commits('sha-2'))
+        compare_cache.get('base', 'head-1')
+        compare_cache.put('base', 'head-3', generate_cached_commits('sha-3'))
+
+        self.assertEqual(2, len(compare_cache))
+        self.assertLessEqual(compare_cache.size_bytes, compare_cache.max_bytes)
+        self.assertIsNotNone(compare_cache.get('base', 'head-1'))
+        self.assertIsNone(compare_cache.get('base', 'head-2'))
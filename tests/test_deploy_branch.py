@@ -1,4 +1,7 @@
 from actions.deploy_branch import BranchDeployAction, BranchDeployError, DeployPromptContext
+from commands.deploy_prompt import BranchApproval, generate_bulk_deploy_prompt_blocks
+from helpers.approval_tracker import ApprovalTracker
+from helpers.bulk_deploy_results import BulkDeployResultStore
 from slack_sdk import WebClient
 from typing import Dict
 from unittest import TestCase
@@ -42,6 +45,24 @@ def generate_command_body(
     }
 
 
+def generate_bulk_action_body(action_block_id: str) -> Dict:
+    branch_approvals = [
+        BranchApproval(branch_name=f'release/devex/{name}', commit_sha=f'sha-{name}', commit_subject=f'subject {name}',
+                       workflow_id=f'workflow-{name}', job_id=f'job-{name}')
+        for name in ('a', 'b')
+    ]
+    blocks = json.loads(json.dumps(generate_bulk_deploy_prompt_blocks(
+        branch_pattern='release/devex/*', recipient=None, branch_approvals=branch_approvals, skipped_branches={}
+    )))
+    action_block = next(block for block in blocks if block.get('block_id') == action_block_id)
+    return {
+        'user': {'id': 'user123'},
+        'channel': {'id': 'CBR2V3XEX', 'name': 'deploy-bot-testing'},
+        'message': {'ts': '1548261231.000200', 'blocks': blocks},
+        'actions': [{**action_block['elements'][0], 'block_id': action_block_id}],
+    }
+
+
 class TestDeployBranch(TestCase):
     class MockResponse:
         def __init__(self, status_code: int, content: str, json_data: Dict = None):
@@ -51,8 +72,16 @@ class TestDeployBranch(TestCase):
 
     def setUp(self) -> None:
         mock_client.reset_mock()
+        tracker_patcher = patch('actions.deploy_branch.get_approval_tracker', return_value=ApprovalTracker())
+        tracker_patcher.start()
+        self.addCleanup(tracker_patcher.stop)
+        self.bulk_deploy_result_store = BulkDeployResultStore()
+        results_patcher = patch('actions.deploy_branch.get_bulk_deploy_result_store',
+                                return_value=self.bulk_deploy_result_store)
+        results_patcher.start()
+        self.addCleanup(results_patcher.stop)
 
-    @patch('requests.post', return_value=MockResponse(status_code=400, content="Bad request"))
+    @patch('actions.deploy_branch.http_post', return_value=MockResponse(status_code=400, content="Bad request"))
     def test_bad_circle_ci_status(self, mock_post):
         body = generate_command_body()
         deploy_prompt = BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token)
@@ -66,3 +95,78 @@ class TestDeployBranch(TestCase):
         deploy_prompt = BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token)
         deploy_prompt.cancel_prompt()
         mock_client.chat_update.assert_called_once()
+
+    @patch('actions.deploy_branch.get_pending_approval_store')
+    @patch('actions.deploy_branch.http_post')
+    def test_deploy_all_reports_each_branch(self, mock_post, mock_get_store):
+        def approve(url: str, endpoint: str, headers: Dict):
+            if url.endswith('job-b'):
+                return self.MockResponse(status_code=400, content='Bad request')
+            return self.MockResponse(status_code=202, content='Accepted')
+
+        mock_post.side_effect = approve
+        body = generate_bulk_action_body(action_block_id='approve_all_deploys')
+        BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token).deploy_all()
+
+        self.assertEqual(2, mock_post.call_count)
+        mock_client.chat_update.assert_called_once()
+        _, kwargs = mock_client.chat_update.call_args
+        block_ids = [block.get('block_id') for block in kwargs['blocks'] if block.get('block_id')]
+        # The failed branch keeps its button, below the error, as does approve all
+        self.assertEqual(['deploy_result:release/devex/a', 'deploy_result:release/devex/b',
+                          'deploy_branch:release/devex/b', 'approve_all_deploys'], block_ids)
+        block_text = json.dumps(kwargs['blocks'])
+        self.assertIn('*release/devex/a*: DEPLOY APPROVED', block_text)
+        self.assertIn('*release/devex/b*: approval failed', block_text)
+
+    @patch('actions.deploy_branch.get_pending_approval_store')
+    @patch('actions.deploy_branch.http_post', return_value=MockResponse(status_code=202, content='Accepted'))
+    def test_deploy_one_branch_of_bulk_prompt(self, mock_post, mock_get_store):
+        body = generate_bulk_action_body(action_block_id='deploy_branch:release/devex/b')
+        BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token).deploy()
+
+        mock_post.assert_called_once()
+        self.assertTrue(mock_post.call_args[0][0].endswith('workflow-b/approve/job-b'))
+        _, kwargs = mock_client.chat_update.call_args
+        block_ids = [block.get('block_id') for block in kwargs['blocks'] if block.get('block_id')]
+        self.assertEqual(['deploy_branch:release/devex/a', 'deploy_result:release/devex/b', 'approve_all_deploys'],
+                         block_ids)
+
+    @patch('actions.deploy_branch.get_pending_approval_store')
+    @patch('actions.deploy_branch.http_post', return_value=MockResponse(status_code=202, content='Accepted'))
+    def test_close_approvals_of_bulk_prompt_keep_both_results(self, mock_post, mock_get_store):
+        # Both clicks were on the prompt as first posted, before either update landed
+        for branch in ('a', 'b'):
+            body = generate_bulk_action_body(action_block_id=f'deploy_branch:release/devex/{branch}')
+            BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token).deploy()
+
+        _, kwargs = mock_client.chat_update.call_args
+        block_ids = [block.get('block_id') for block in kwargs['blocks'] if block.get('block_id')]
+        self.assertEqual(['deploy_result:release/devex/a', 'deploy_result:release/devex/b'], block_ids)
+
+        # Rendering the updated prompt again shows each result once, in place
+        body = generate_bulk_action_body(action_block_id='deploy_branch:release/devex/b')
+        body['message']['blocks'] = kwargs['blocks']
+        action = BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token)
+        with self.bulk_deploy_result_store.record_results('CBR2V3XEX', '1548261231.000200', {}) as results:
+            self.assertEqual(kwargs['blocks'], action.generate_bulk_deploy_results_message(
+                results=results, timestamp='1548261231.000200'))
+
+    @patch('actions.deploy_branch.get_pending_approval_store')
+    @patch('actions.deploy_branch.http_post', return_value=MockResponse(status_code=202, content='Accepted'))
+    def test_duplicate_click_skips_circle_ci(self, mock_post, mock_get_store):
+        body = generate_command_body()
+        BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token).deploy()
+        BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token).deploy()
+        BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token).deploy()
+
+        mock_post.assert_called_once()
+        mock_client.chat_update.assert_called_once()
+
+    @patch('actions.deploy_branch.http_post', return_value=MockResponse(status_code=500, content='Server error'))
+    def test_failed_approval_is_retried(self, mock_post):
+        body = generate_command_body()
+        for _ in range(2):
+            with self.assertRaises(BranchDeployError):
+                BranchDeployAction(body=body, web_client=mock_client, circle_ci_token=mock_circle_token).deploy()
+        self.assertEqual(2, mock_post.call_count)
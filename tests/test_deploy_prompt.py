@@ -1,9 +1,13 @@
 from commands.deploy_prompt import PromptBranchDeploy, PromptBranchDeployError
+from helpers.circleci_cache import CircleCICache
+from helpers.pending_approvals import PendingApprovalStore
+from requests import Response
 from slack_bolt import Respond
 from slack_sdk import WebClient
-from typing import Optional
+from typing import Dict, Optional
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
+import json
 
 
 mock_respond = MagicMock(Respond)
@@ -19,6 +23,26 @@ def generate_command_text(branch_name: str, recipient: Optional[str] = None):
     }
 
 
+def generate_response(json_data: Dict) -> Response:
+    response = Response()
+    response.status_code = 200
+    response._content = json.dumps(json_data).encode('utf-8')
+    return response
+
+
+def get_circle_ci_response(url: str, endpoint: str, headers: Dict) -> Response:
+    if endpoint == 'circleci.pipelines':
+        return generate_response({'items': [
+            {'id': 'pipeline-2', 'vcs': {'revision': 'sha', 'commit': {'subject': 'commit subject'}}},
+        ]})
+    if endpoint == 'circleci.workflows':
+        return generate_response({'items': [{'id': 'workflow-2'}]})
+    return generate_response({'items': [
+        {'id': 'job-1', 'type': 'build', 'status': 'success'},
+        {'id': 'job-2', 'type': 'approval', 'status': 'on_hold'},
+    ]})
+
+
 class TestDeployPrompt(TestCase):
     def setUp(self) -> None:
         mock_respond.reset_mock()
@@ -54,3 +78,133 @@ class TestDeployPrompt(TestCase):
         mock_get_workflow.assert_called_once()
         mock_get_pipeline.assert_called_once()
         mock_client.chat_postMessage.assert_called_once()
+
+    @patch('commands.deploy_prompt.get_circleci_cache', return_value=CircleCICache())
+    @patch('commands.deploy_prompt.http_get', side_effect=get_circle_ci_response)
+    def test_reprompt_reuses_cached_workflow(self, mock_http_get, mock_get_circleci_cache):
+        command = generate_command_text(branch_name='release/test-deploy')
+        PromptBranchDeploy(command=command, web_client=mock_client, circle_ci_token=mock_circle_token).prompt_deploy()
+        self.assertEqual(3, mock_http_get.call_count)
+
+        mock_http_get.reset_mock()
+        PromptBranchDeploy(command=command, web_client=mock_client, circle_ci_token=mock_circle_token).prompt_deploy()
+
+        # The pipeline was fetched moments ago, so only its approval is rechecked
+        endpoints = [kwargs['endpoint'] for _, kwargs in mock_http_get.call_args_list]
+        self.assertEqual(['circleci.jobs'], endpoints)
+        self.assertEqual(2, mock_client.chat_postMessage.call_count)
+        _, kwargs = mock_client.chat_postMessage.call_args
+        self.assertIn('job-2', kwargs['blocks'])
+        self.assertIn('commit subject', kwargs['blocks'])
+
+        # Past its TTL, the pipeline lookup and the approval recheck are sent together
+        mock_http_get.reset_mock()
+        mock_get_circleci_cache.return_value.branch_pipeline_ttl_seconds = 0
+        PromptBranchDeploy(command=command, web_client=mock_client, circle_ci_token=mock_circle_token).prompt_deploy()
+        endpoints = sorted(kwargs['endpoint'] for _, kwargs in mock_http_get.call_args_list)
+        self.assertEqual(['circleci.jobs', 'circleci.pipelines'], endpoints)
+
+    @patch('commands.deploy_prompt.get_circleci_cache', return_value=CircleCICache())
+    @patch('commands.deploy_prompt.http_get')
+    def test_finds_approval_in_later_workflow_and_page(self, mock_http_get, mock_get_circleci_cache):
+        responses = {
+            ('circleci.pipelines', None): {'items': [
+                {'id': 'pipeline-1', 'vcs': {'revision': 'sha', 'commit': {'subject': 'commit subject'}}},
+            ]},
+            ('circleci.workflows', None): {'items': [{'id': 'workflow-1'}], 'next_page_token': 'workflows-2'},
+            ('circleci.workflows', 'workflows-2'): {'items': [{'id': 'workflow-2'}]},
+            ('circleci.jobs', None): {'items': [{'id': 'job-1', 'type': 'build', 'status': 'success'}],
+                                      'next_page_token': 'jobs-2'},
+            ('circleci.jobs', 'jobs-2'): {'items': [{'id': 'job-2', 'type': 'approval', 'status': 'on_hold'}],
+                                          'next_page_token': 'jobs-3'},
+        }
+
+        def get_paged_response(url: str, endpoint: str, headers: Dict, params: Optional[Dict] = None) -> Response:
+            page_token = (params or {}).get('page-token')
+            if endpoint == 'circleci.jobs' and url.endswith('workflow-1/job'):
+                return generate_response({'items': [{'id': 'job-0', 'type': 'build', 'status': 'running'}]})
+            return generate_response(responses[(endpoint, page_token)])
+
+        mock_http_get.side_effect = get_paged_response
+        command = generate_command_text(branch_name='release/test-deploy')
+        PromptBranchDeploy(command=command, web_client=mock_client, circle_ci_token=mock_circle_token).prompt_deploy()
+
+        _, kwargs = mock_client.chat_postMessage.call_args
+        self.assertIn('job-2', kwargs['blocks'])
+        self.assertIn('workflow-2', kwargs['blocks'])
+        # The page after the approval on hold is never requested, nor is the job list looked up again
+        page_tokens = [kwargs.get('params', {}).get('page-token') for _, kwargs in mock_http_get.call_args_list]
+        self.assertNotIn('jobs-3', page_tokens)
+        self.assertEqual(6, mock_http_get.call_count)
+        self.assertEqual('workflow-2', mock_get_circleci_cache.return_value.get_pipeline_workflow('pipeline-1'))
+
+    @patch('commands.deploy_prompt.get_pending_approval_store', return_value=PendingApprovalStore(':memory:'))
+    @patch('commands.deploy_prompt.get_circleci_cache', return_value=CircleCICache())
+    @patch('commands.deploy_prompt.http_get')
+    def test_bulk_prompt_for_branch_pattern(self, mock_http_get, mock_get_circleci_cache, mock_get_store):
+        def pipeline(pipeline_id: str, branch_name: str) -> Dict:
+            return {'id': pipeline_id, 'vcs': {'branch': branch_name, 'revision': f'sha-{pipeline_id}',
+                                               'commit': {'subject': f'subject {pipeline_id}'}}}
+
+        approval_statuses = {'workflow-3': 'on_hold', 'workflow-2': 'success', 'workflow-1': 'on_hold'}
+
+        def get_bulk_response(url: str, endpoint: str, headers: Dict) -> Response:
+            if endpoint == 'circleci.pipelines':
+                return generate_response({'items': [
+                    pipeline('3', 'release/devex/a'), pipeline('2', 'release/devex/b'),
+                    pipeline('4', 'release/other'), pipeline('1', 'release/devex/a'),
+                ]})
+            pipeline_id = url.split('/')[-2]
+            if endpoint == 'circleci.workflows':
+                return generate_response({'items': [{'id': f'workflow-{pipeline_id}'}]})
+            workflow_id = url.split('/')[-2]
+            return generate_response({'items': [
+                {'id': f'job-{workflow_id}', 'type': 'approval', 'status': approval_statuses[workflow_id]},
+            ]})
+
+        mock_http_get.side_effect = get_bulk_response
+        command = generate_command_text(branch_name='release/devex/*')
+        PromptBranchDeploy(command=command, web_client=mock_client, circle_ci_token=mock_circle_token).prompt_deploy()
+
+        mock_client.chat_postMessage.assert_called_once()
+        _, kwargs = mock_client.chat_postMessage.call_args
+        blocks = json.loads(kwargs['blocks'])
+        block_ids = [block.get('block_id') for block in blocks if block.get('block_id')]
+        # Only the newest pipeline of each matching branch, and only branches with an approval on hold get a button
+        self.assertEqual(['deploy_branch:release/devex/a', 'approve_all_deploys'], block_ids)
+        self.assertIn('job-workflow-3', kwargs['blocks'])
+        self.assertNotIn('job-workflow-1', kwargs['blocks'])
+        self.assertIn('release/devex/b', blocks[-3]['text']['text'])
+        self.assertNotIn('release/other', kwargs['blocks'])
+
+    @patch('commands.deploy_prompt.CIRCLE_CI_BULK_MAX_BRANCHES', 2)
+    @patch('commands.deploy_prompt.get_pending_approval_store', return_value=PendingApprovalStore(':memory:'))
+    @patch('commands.deploy_prompt.get_circleci_cache', return_value=CircleCICache())
+    @patch('commands.deploy_prompt.http_get')
+    def test_bulk_prompt_says_when_branches_are_left_out(self, mock_http_get, mock_get_circleci_cache,
+                                                         mock_get_store):
+        def get_bulk_response(url: str, endpoint: str, headers: Dict, params: Optional[Dict] = None) -> Response:
+            if endpoint == 'circleci.pipelines':
+                return generate_response({'items': [
+                    {'id': name, 'vcs': {'branch': f'release/{name}', 'revision': f'sha-{name}',
+                                         'commit': {'subject': f'subject {name}'}}}
+                    for name in ('a', 'b', 'c')
+                ], 'next_page_token': 'pipelines-2'})
+            if endpoint == 'circleci.workflows':
+                return generate_response({'items': [{'id': f'workflow-{url.split("/")[-2]}'}]})
+            return generate_response({'items': [
+                {'id': f'job-{url.split("/")[-2]}', 'type': 'approval', 'status': 'on_hold'},
+            ]})
+
+        mock_http_get.side_effect = get_bulk_response
+        command = generate_command_text(branch_name='release/*')
+        PromptBranchDeploy(command=command, web_client=mock_client, circle_ci_token=mock_circle_token).prompt_deploy()
+
+        _, kwargs = mock_client.chat_postMessage.call_args
+        blocks = json.loads(kwargs['blocks'])
+        block_ids = [block.get('block_id') for block in blocks if block.get('block_id')]
+        self.assertEqual(['deploy_branch:release/a', 'deploy_branch:release/b', 'approve_all_deploys'], block_ids)
+        # Enough branches were found on the first page, so the next isn't requested
+        endpoints = [kwargs['endpoint'] for _, kwargs in mock_http_get.call_args_list]
+        self.assertEqual(1, endpoints.count('circleci.pipelines'))
+        self.assertIn('Showing 2 of at least 3 branches matching `release/*`', blocks[-3]['text']['text'])
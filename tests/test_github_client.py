@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from github import Github
+from requests import Response, Session
+from threading import Barrier
+from unittest import TestCase
+from unittest.mock import patch
+
+from helpers.github_client import GitHubClientPool, RateLimitedGitHubConnection
+from helpers.metrics import MetricsRegistry
+from helpers.prometheus import render_metrics
+from helpers.rate_limiter import RateLimiter
+
+
+class TestGitHubClientPool(TestCase):
+    @patch.object(Github, 'get_repo')
+    def test_reuses_client_and_repository(self, mock_get_repo):
+        client_pool = GitHubClientPool(token='token', repository_ttl_seconds=60)
+        first_repository = client_pool.get_repository('StatesTitle/underwriter')
+        second_repository = client_pool.get_repository('StatesTitle/underwriter')
+
+        self.assertIs(first_repository, second_repository)
+        mock_get_repo.assert_called_once()
+        self.assertEqual(0.5, client_pool.repository_reuse_rate)
+        self.assertEqual(0.5, client_pool.client_reuse_rate)
+
+    @patch.object(Github, 'get_repo')
+    def test_refetches_repository_after_ttl(self, mock_get_repo):
+        client_pool = GitHubClientPool(token='token', repository_ttl_seconds=0)
+        client_pool.get_repository('StatesTitle/underwriter')
+        client_pool.get_repository('StatesTitle/underwriter')
+
+        self.assertEqual(2, mock_get_repo.call_count)
+        self.assertEqual(0, client_pool.repository_reuses)
+
+    @patch.object(Session, 'request')
+    def test_requests_go_through_rate_limited_connection(self, mock_request):
+        response = Response()
+        response.status_code = 200
+        response._content = b'{"full_name": "StatesTitle/underwriter", "url": "https://api.github.com/repos/a/b"}'
+        mock_request.return_value = response
+        rate_limiter = RateLimiter()
+
+        with patch('helpers.github_client.get_rate_limiter', return_value=rate_limiter):
+            GitHubClientPool(token='token').get_repository('StatesTitle/underwriter')
+
+        mock_request.assert_called_once()
+        self.assertEqual(1, rate_limiter.get_stats()['github']['granted'])
+
+
+class TestRateLimitedGitHubConnection(TestCase):
+    @patch('helpers.github_client.get_rate_limiter', return_value=RateLimiter())
+    @patch.object(Session, 'request')
+    def test_concurrent_requests_keep_their_own_url(self, mock_request, mock_get_rate_limiter):
+        def respond(verb, url, **kwargs):
+            response = Response()
+            response.status_code = 200
+            response._content = url.encode('utf-8')
+            return response
+        mock_request.side_effect = respond
+        connection = RateLimitedGitHubConnection('api.github.com')
+        # Every thread stores its request before any of them sends one
+        all_requested = Barrier(4)
+
+        def get_commit(sha: str) -> str:
+            connection.request('GET', f'/repos/StatesTitle/underwriter/commits/{sha}', None, {})
+            all_requested.wait()
+            return connection.getresponse().read()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            bodies = list(executor.map(get_commit, ['sha-1', 'sha-2', 'sha-3', 'sha-4']))
+
+        self.assertEqual([f'https://api.github.com:443/repos/StatesTitle/underwriter/commits/sha-{number}'
+                          for number in range(1, 5)], bodies)
+
+    @patch('helpers.github_client.get_rate_limiter', return_value=RateLimiter())
+    @patch.object(Session, 'request')
+    def test_requests_timed_by_endpoint(self, mock_request, mock_get_rate_limiter):
+        response = Response()
+        response.status_code = 200
+        response._content = b'{}'
+        mock_request.return_value = response
+        connection = RateLimitedGitHubConnection('api.github.com')
+
+        with patch('helpers.metrics._metrics_registry', MetricsRegistry()):
+            for url in ('/repos/StatesTitle/underwriter/compare/abc...def?page=2',
+                        '/repos/StatesTitle/underwriter/commits/abc/pulls',
+                        '/repos/StatesTitle/underwriter',
+                        '/repos/StatesTitle/underwriter/branches/stable/protection'):
+                connection.request('GET', url, None, {})
+                connection.getresponse()
+            metrics = render_metrics()
+
+        for endpoint in ('github.compare', 'github.commit-pulls', 'github.repo', 'github.rest'):
+            self.assertIn(f'slack_deploy_bot_upstream_request_seconds_count{{endpoint="{endpoint}"}} 1', metrics)
@@ -0,0 +1,46 @@
+from github import Github
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from benchmarks.stub_github import StubGitHub
+from commands.commit_list import CommitList
+from helpers.command_helpers import GITHUB_REPOSITORY, GitHubBackend
+from helpers.compare_cache import CompareCache
+from helpers.github_graphql import GraphQLCommitSource
+from helpers.github_client import reset_github_client_pool
+from helpers.pr_cache import PullRequestCache
+
+
+class TestGraphQLCommitSource(TestCase):
+    def setUp(self):
+        self.stub = StubGitHub(commit_count=60, latency=0).start()
+        reset_github_client_pool()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_get_compared_commits_pages_back_to_base(self):
+        graphql_source = GraphQLCommitSource(token='token', repository=GITHUB_REPOSITORY,
+                                             url=f'{self.stub.base_url}/graphql')
+        with patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:')):
+            compared_commits = graphql_source.get_compared_commits(base=self.stub.shas[5], head=self.stub.head)
+
+        self.assertEqual(self.stub.shas[6:], [commit.sha for commit in compared_commits])
+        self.assertEqual(tuple(self.stub.files[self.stub.head]), compared_commits[-1].filenames)
+        self.assertEqual(2, self.stub.request_count)
+
+    def test_backends_produce_the_same_blocks(self):
+        repo = Github(base_url=self.stub.base_url).get_repo(GITHUB_REPOSITORY)
+        command = {'text': 'stub-app app1', 'user_id': None, 'channel_id': None}
+        blocks = {}
+        for backend in GitHubBackend:
+            commit_list = CommitList(respond=MagicMock(), command=command, backend=backend)
+            with patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:')), \
+                    patch('commands.commit_list.get_compare_cache', return_value=CompareCache()), \
+                    patch('helpers.github_graphql.GITHUB_GRAPHQL_URL', f'{self.stub.base_url}/graphql'):
+                blocks[backend] = commit_list.get_commits_matching_filter(
+                    repo=repo, heroku_git_hash=self.stub.shas[30], latest_stable_commit=self.stub.head
+                )
+
+        self.assertEqual(6, len(blocks[GitHubBackend.REST]))
+        self.assertEqual(blocks[GitHubBackend.REST], blocks[GitHubBackend.GRAPHQL])
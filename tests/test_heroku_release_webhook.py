@@ -0,0 +1,90 @@
+from unittest import TestCase
+from unittest.mock import patch
+import base64
+import hashlib
+import hmac
+import json
+
+from helpers.deployed_hash_cache import DeployedHashCache, get_cached_heroku_git_hash
+from helpers.release_store import ReleaseStore
+from webhooks.heroku_release import HerokuReleaseWebhook, HerokuReleaseWebhookError, SIGNATURE_HEADER
+
+WEBHOOK_SECRET = 'FAKE_SECRET'
+
+
+def generate_release_body(app_name: str = 'hello_docker', status: str = 'succeeded') -> bytes:
+    return json.dumps({
+        'resource': 'release',
+        'action': 'update',
+        'data': {'app': {'name': app_name}, 'status': status, 'version': 42, 'created_at': '2021-11-01T14:00:00Z',
+                 'description': 'Deploy 1a2b3c4'},
+    }).encode('utf-8')
+
+
+def sign(body: bytes, secret: str = WEBHOOK_SECRET) -> dict:
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()
+    return {SIGNATURE_HEADER: base64.b64encode(digest).decode('utf-8')}
+
+
+class TestHerokuReleaseWebhook(TestCase):
+    def setUp(self):
+        self.deployed_hash_cache = DeployedHashCache(ttl_seconds=60)
+        self.deployed_hash_cache.put('hello_docker', 'abc123')
+        patcher = patch('webhooks.heroku_release.get_deployed_hash_cache', return_value=self.deployed_hash_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release_store = ReleaseStore(path=':memory:')
+        patcher = patch('webhooks.heroku_release.get_release_store', return_value=self.release_store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalid_signature(self):
+        body = generate_release_body()
+        webhook = HerokuReleaseWebhook(body=body, headers=sign(body, secret='wrong'), secret=WEBHOOK_SECRET)
+        with self.assertRaises(HerokuReleaseWebhookError):
+            webhook.handle()
+        self.assertEqual('abc123', self.deployed_hash_cache.get('hello_docker'))
+
+    @patch('webhooks.heroku_release.Thread')
+    def test_succeeded_release_invalidates_and_refreshes(self, mock_thread):
+        body = generate_release_body()
+        app_name = HerokuReleaseWebhook(body=body, headers=sign(body), secret=WEBHOOK_SECRET).handle()
+
+        self.assertEqual('hello_docker', app_name)
+        self.assertIsNone(self.deployed_hash_cache.get('hello_docker'))
+        _, kwargs = mock_thread.call_args
+        self.assertEqual(('hello_docker', 42), kwargs['args'])
+        mock_thread.return_value.start.assert_called_once()
+        self.assertEqual('1a2b3c4', self.release_store.get_release('hello_docker', 42).sha)
+
+    @patch('webhooks.heroku_release.Thread')
+    def test_pending_release_only_invalidates(self, mock_thread):
+        body = generate_release_body(status='pending')
+        HerokuReleaseWebhook(body=body, headers=sign(body), secret=WEBHOOK_SECRET).handle()
+
+        self.assertIsNone(self.deployed_hash_cache.get('hello_docker'))
+        mock_thread.assert_not_called()
+
+
+class TestDeployedHashCache(TestCase):
+    @patch('helpers.deployed_hash_cache.get_heroku_git_hash', return_value='abc123')
+    def test_only_asks_heroku_when_missing_or_forced(self, mock_get_heroku_git_hash):
+        with patch('helpers.deployed_hash_cache.get_deployed_hash_cache', return_value=DeployedHashCache()):
+            get_cached_heroku_git_hash('hello_docker')
+            get_cached_heroku_git_hash('hello_docker')
+            self.assertEqual(1, mock_get_heroku_git_hash.call_count)
+
+            get_cached_heroku_git_hash('hello_docker', force_refresh=True)
+            self.assertEqual(2, mock_get_heroku_git_hash.call_count)
+
+    def test_expires_after_ttl(self):
+        deployed_hash_cache = DeployedHashCache(ttl_seconds=0)
+        deployed_hash_cache.put('hello_docker', 'abc123')
+        self.assertIsNone(deployed_hash_cache.get('hello_docker'))
+
+    @patch('helpers.deployed_hash_cache.get_heroku_git_hash', return_value=None)
+    def test_falls_back_to_expired_hash(self, mock_get_heroku_git_hash):
+        deployed_hash_cache = DeployedHashCache(ttl_seconds=0)
+        deployed_hash_cache.put('hello_docker', 'abc123')
+        with patch('helpers.deployed_hash_cache.get_deployed_hash_cache', return_value=deployed_hash_cache):
+            self.assertEqual('abc123', get_cached_heroku_git_hash('hello_docker'))
@@ -0,0 +1,88 @@
+from requests import Response
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from helpers.http_cache import ConditionalRequestCache
+from helpers.http_client import HttpClient
+from helpers.rate_limiter import RateLimitExceeded
+
+
+def generate_response(status_code: int, content: bytes = b'', headers=None) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {})
+    return response
+
+
+class TestConditionalRequestCache(TestCase):
+    def setUp(self):
+        self.client = MagicMock(HttpClient)
+        self.cache = ConditionalRequestCache(client=self.client)
+
+    def test_serves_not_modified_from_cache(self):
+        self.client.get.side_effect = [
+            generate_response(200, b'{"GIT_HASH": "abc"}', {'ETag': '"v1"'}),
+            generate_response(304),
+        ]
+        first_response = self.cache.get('https://api.heroku.com/apps/app/config-vars', {}, 'heroku.config-vars')
+        second_response = self.cache.get('https://api.heroku.com/apps/app/config-vars', {}, 'heroku.config-vars')
+
+        self.assertEqual({'GIT_HASH': 'abc'}, second_response.json())
+        self.assertIs(first_response, second_response)
+        _, kwargs = self.client.get.call_args
+        self.assertEqual('"v1"', kwargs['headers']['If-None-Match'])
+        self.assertEqual({'hits': 1, 'misses': 1, 'hit_ratio': 0.5}, self.cache.get_stats()['heroku.config-vars'])
+
+    def test_entry_evicted_while_revalidating_counts_as_miss(self):
+        cache = ConditionalRequestCache(client=self.client, max_entries=1)
+        first_url, other_url = 'https://api.heroku.com/apps/app/config-vars', 'https://api.github.com/repos/o/r'
+
+        def evict_then_not_modified(url, endpoint, headers):
+            if url == other_url:
+                return generate_response(200, b'{}', {'ETag': '"other"'})
+            # Another thread caches a different response, evicting this one, before the 304 arrives
+            cache.get(other_url, {}, 'github.repo')
+            return generate_response(304)
+
+        self.client.get.side_effect = [generate_response(200, b'{"GIT_HASH": "abc"}', {'ETag': '"v1"'})]
+        cache.get(first_url, {}, 'heroku.config-vars')
+        self.client.get.side_effect = evict_then_not_modified
+        response = cache.get(first_url, {}, 'heroku.config-vars')
+
+        self.assertEqual({'GIT_HASH': 'abc'}, response.json())
+        self.assertEqual({'hits': 0, 'misses': 2, 'hit_ratio': 0.0}, cache.get_stats()['heroku.config-vars'])
+
+    def test_replaces_changed_response(self):
+        self.client.get.side_effect = [
+            generate_response(200, b'{"sha": "1"}', {'Last-Modified': 'Mon, 01 Nov 2021 00:00:00 GMT'}),
+            generate_response(200, b'{"sha": "2"}', {'Last-Modified': 'Tue, 02 Nov 2021 00:00:00 GMT'}),
+            generate_response(304),
+        ]
+        for _ in range(3):
+            response = self.cache.get('https://api.github.com/repos/o/r/branches/stable', {}, 'github.branch')
+
+        self.assertEqual({'sha': '2'}, response.json())
+        _, kwargs = self.client.get.call_args
+        self.assertEqual('Tue, 02 Nov 2021 00:00:00 GMT', kwargs['headers']['If-Modified-Since'])
+
+    def test_does_not_cache_errors(self):
+        self.client.get.side_effect = [generate_response(500, headers={'ETag': '"v1"'}), generate_response(500)]
+        self.cache.get('https://api.heroku.com/apps/app/config-vars', {}, 'heroku.config-vars')
+        self.cache.get('https://api.heroku.com/apps/app/config-vars', {}, 'heroku.config-vars')
+
+        _, kwargs = self.client.get.call_args
+        self.assertNotIn('If-None-Match', kwargs['headers'])
+
+    def test_serves_cached_response_when_rate_limited(self):
+        self.client.get.side_effect = [
+            generate_response(200, b'{"sha": "1"}', {'ETag': '"v1"'}),
+            RateLimitExceeded('github rate limit budget exhausted'),
+            RateLimitExceeded('github rate limit budget exhausted'),
+        ]
+        self.cache.get('https://api.github.com/repos/o/r/branches/stable', {}, 'github.branch')
+        response = self.cache.get('https://api.github.com/repos/o/r/branches/stable', {}, 'github.branch')
+
+        self.assertEqual({'sha': '1'}, response.json())
+        with self.assertRaises(RateLimitExceeded):
+            self.cache.get('https://api.github.com/repos/o/r/branches/main', {}, 'github.branch')
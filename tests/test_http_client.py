@@ -0,0 +1,95 @@
+from requests import ConnectionError, ConnectTimeout, ReadTimeout, Response, Session
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from helpers.http_client import HttpClient, parse_retry_after
+from helpers.metrics import MetricsRegistry
+
+
+def generate_response(status_code: int, headers=None) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return response
+
+
+@patch('helpers.http_client.time.sleep')
+class TestHttpClient(TestCase):
+    def setUp(self):
+        self.session = MagicMock(Session)
+        self.client = HttpClient(connect_timeout=1, read_timeout=2, max_retries=2, backoff_seconds=0.1)
+        patcher = patch.object(self.client, 'get_session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.metrics_registry = MetricsRegistry()
+        patcher = patch('helpers.metrics._metrics_registry', self.metrics_registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_server_errors_honoring_retry_after(self, mock_sleep):
+        self.session.request.side_effect = [generate_response(503, {'Retry-After': '3'}), generate_response(200)]
+        response = self.client.get('https://api.heroku.com/apps/app/config-vars', endpoint='heroku.config-vars')
+
+        self.assertEqual(200, response.status_code)
+        mock_sleep.assert_called_once_with(3.0)
+        _, kwargs = self.session.request.call_args
+        self.assertEqual((1, 2), kwargs['timeout'])
+        self.assertEqual(2, self.metrics_registry.get_stats()['heroku.config-vars']['count'])
+
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        self.session.request.return_value = generate_response(502)
+        response = self.client.get('https://circleci.com/api/v2/workflow/1/job', endpoint='circleci.jobs')
+
+        self.assertEqual(502, response.status_code)
+        self.assertEqual(3, self.session.request.call_count)
+        for args, _ in mock_sleep.call_args_list:
+            self.assertLessEqual(args[0], 0.4)
+
+    def test_post_only_retried_when_rate_limited(self, mock_sleep):
+        self.session.request.return_value = generate_response(500)
+        self.client.post('https://circleci.com/api/v2/workflow/1/approve/2', endpoint='circleci.approve')
+        self.assertEqual(1, self.session.request.call_count)
+
+        self.session.request.reset_mock()
+        self.session.request.side_effect = [generate_response(429), generate_response(202)]
+        response = self.client.post('https://circleci.com/api/v2/workflow/1/approve/2', endpoint='circleci.approve')
+        self.assertEqual(202, response.status_code)
+        self.assertEqual(2, self.session.request.call_count)
+
+    def test_post_read_timeout_not_retried(self, mock_sleep):
+        self.session.request.side_effect = ReadTimeout()
+        with self.assertRaises(ReadTimeout):
+            self.client.post('https://circleci.com/api/v2/workflow/1/approve/2', endpoint='circleci.approve')
+        self.assertEqual(1, self.session.request.call_count)
+
+        self.session.request.reset_mock()
+        self.session.request.side_effect = [ConnectTimeout(), generate_response(202)]
+        response = self.client.post('https://circleci.com/api/v2/workflow/1/approve/2', endpoint='circleci.approve')
+        self.assertEqual(202, response.status_code)
+        self.assertEqual(2, self.metrics_registry.get_stats()['circleci.approve']['errors'])
+
+    def test_post_retried_only_when_connection_was_never_made(self, mock_sleep):
+        refused = ConnectionError(MaxRetryError(None, '/approve', NewConnectionError(None, 'Connection refused')))
+        self.session.request.side_effect = [refused, generate_response(202)]
+        response = self.client.post('https://circleci.com/api/v2/workflow/1/approve/2', endpoint='circleci.approve')
+        self.assertEqual(202, response.status_code)
+
+        self.session.request.reset_mock()
+        self.session.request.side_effect = ConnectionError(ProtocolError('Connection aborted.'))
+        with self.assertRaises(ConnectionError):
+            self.client.post('https://circleci.com/api/v2/workflow/1/approve/2', endpoint='circleci.approve')
+        self.assertEqual(1, self.session.request.call_count)
+
+    def test_parse_retry_after(self, mock_sleep):
+        self.assertEqual(5.0, parse_retry_after('5'))
+        self.assertEqual(0.0, parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class TestHttpClientSessions(TestCase):
+    def test_reuses_session_per_host(self):
+        client = HttpClient()
+        self.assertIs(client.get_session('https://api.heroku.com/a'), client.get_session('https://api.heroku.com/b'))
+        self.assertIsNot(client.get_session('https://api.heroku.com/a'), client.get_session('https://circleci.com/a'))
@@ -1,10 +1,15 @@
+from datetime import datetime, timezone
 from github import Github
 from github.Repository import Repository
 from slack_bolt import Respond
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
-from commands.latest_deploy import LatestDeploy
+from commands.latest_deploy import LatestDeploy, parse_deployed_at
+from helpers.command_helpers import parse_app_names
+from helpers.github_client import reset_github_client_pool
+from helpers.pr_cache import CachedPullRequest, PullRequestCache
+from helpers.release_store import ReleaseStore, parse_release
 
 mock_respond = MagicMock(Respond)
 
@@ -17,14 +22,21 @@ def generate_command_text(app_name: str):
     }
 
 
+def generate_pr(number: int) -> CachedPullRequest:
+    return CachedPullRequest(number=number, title=f'PR {number}', html_url=f'https://github.com/pr/{number}',
+                             merged_at=datetime(2021, 11, 1))
+
+
 class TestLatestDeploy(TestCase):
     def setUp(self):
         mock_respond.reset_mock()
+        reset_github_client_pool()
 
-    @patch.object(LatestDeploy, 'get_latest_deployed_hash')
+    @patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:'))
+    @patch.object(LatestDeploy, 'get_latest_deployed_hash', return_value='abc123')
     @patch.object(Github, 'get_repo')
     @patch.object(Repository, 'get_commit')
-    def test_latest_deploy(self, mock_get_commit, mock_get_repo, mock_get_git_hash):
+    def test_latest_deploy(self, mock_get_commit, mock_get_repo, mock_get_git_hash, mock_get_pr_cache):
         command = generate_command_text('hello_docker')
         latest_deploy = LatestDeploy(command=command, respond=mock_respond)
         latest_deploy.get_latest_deployed_commit()
@@ -32,3 +44,75 @@ class TestLatestDeploy(TestCase):
         mock_get_git_hash.assert_called_once()
         mock_get_repo.assert_called_once()
         mock_respond.assert_called_once()
+
+    @patch('commands.latest_deploy.get_cached_heroku_git_hash')
+    @patch.object(LatestDeploy, 'get_commit_prs')
+    def test_latest_deploy_multiple_apps(self, mock_get_commit_prs, mock_get_cached_heroku_git_hash):
+        git_hashes = {'app-a': 'abc123', 'app-b': 'abc123', 'app-c': 'def456', 'app-d': None}
+        mock_get_cached_heroku_git_hash.side_effect = lambda app_name, force_refresh: git_hashes[app_name]
+        mock_get_commit_prs.side_effect = lambda git_hash: [generate_pr(1)] if git_hash == 'abc123' else []
+
+        command = generate_command_text('app-a,app-b,app-c,app-d')
+        blocks = LatestDeploy(command=command, respond=mock_respond).get_latest_deployed_commit()
+
+        mock_respond.assert_called_once()
+        self.assertEqual(2, mock_get_commit_prs.call_count)
+        # A section per app, followed by its PRs or a note that there are none
+        self.assertEqual(8, len(blocks))
+        self.assertIn('app-d', blocks[6]['text']['text'])
+        self.assertIn('Unable to find', blocks[7]['text']['text'])
+
+    @patch('commands.latest_deploy.get_cached_heroku_git_hash', return_value='abc123')
+    @patch.object(LatestDeploy, 'get_commit_prs', return_value=[generate_pr(number) for number in range(60)])
+    def test_latest_deploy_splits_at_block_limit(self, mock_get_commit_prs, mock_get_cached_heroku_git_hash):
+        command = generate_command_text('hello_docker')
+        LatestDeploy(command=command, respond=mock_respond).get_latest_deployed_commit()
+
+        self.assertEqual(2, mock_respond.call_count)
+
+    def test_parse_app_names_expands_groups(self):
+        app_groups = {'underwriter': ['stp-instant-cd', 'stp-resware-api-plus']}
+        self.assertEqual(['stp-instant-cd', 'stp-resware-api-plus', 'other'],
+                         parse_app_names('underwriter,stp-instant-cd,other', app_groups=app_groups))
+
+    @patch.object(ReleaseStore, 'sync')
+    @patch.object(LatestDeploy, 'get_commit_prs', return_value=[])
+    def test_latest_deploy_at_time(self, mock_get_commit_prs, mock_sync):
+        release_store = ReleaseStore(path=':memory:')
+        for version, created_at in ((1, '2021-11-01T10:00:00Z'), (2, '2021-11-01T16:00:00Z')):
+            release_store.record_release(parse_release('hello_docker', {
+                'version': version, 'created_at': created_at, 'description': f'Deploy {version}abcdef',
+            }))
+
+        with patch('commands.latest_deploy.get_release_store', return_value=release_store):
+            command = generate_command_text('hello_docker --at 2021-11-01 14:00 UTC')
+            LatestDeploy(command=command, respond=mock_respond).get_latest_deployed_commit()
+
+        mock_sync.assert_called_once_with('hello_docker')
+        mock_get_commit_prs.assert_called_once_with('1abcdef')
+
+    @patch.object(ReleaseStore, 'sync')
+    @patch('commands.latest_deploy.get_cached_heroku_git_hash', return_value='fedcba9')
+    def test_sync_releases_sets_current_sha_from_heroku(self, mock_get_cached_heroku_git_hash, mock_sync):
+        release_store = ReleaseStore(path=':memory:')
+        release_store.record_release(parse_release('hello_docker', {
+            'version': 1, 'created_at': '2021-11-01T10:00:00Z', 'description': 'Deploy 1abcdef',
+        }))
+        release_store.record_release(parse_release('hello_docker', {
+            'version': 2, 'created_at': '2021-11-01T16:00:00Z', 'description': 'Deployed web (0123abcd)',
+        }))
+
+        with patch('commands.latest_deploy.get_release_store', return_value=release_store), \
+                patch.object(release_store, 'needs_sync', return_value=False):
+            LatestDeploy(command=generate_command_text('hello_docker'), respond=mock_respond) \
+                .sync_releases('hello_docker')
+
+        mock_sync.assert_not_called()
+        mock_get_cached_heroku_git_hash.assert_called_once_with('hello_docker', force_refresh=True)
+        self.assertEqual('fedcba9', release_store.get_current_release('hello_docker').sha)
+
+    def test_parse_deployed_at(self):
+        self.assertEqual(datetime(2021, 11, 1, 14, tzinfo=timezone.utc), parse_deployed_at('2021-11-01 14:00 UTC'))
+        yesterday = parse_deployed_at('yesterday 14:00')
+        self.assertEqual((14, 0), (yesterday.hour, yesterday.minute))
+        self.assertLess(yesterday, datetime.now().astimezone())
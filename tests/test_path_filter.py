@@ -0,0 +1,35 @@
+from unittest import TestCase
+
+from helpers.path_filter import PathFilter
+
+
+class TestPathFilter(TestCase):
+    def test_literal_matches_whole_segments(self):
+        path_filter = PathFilter('fee')
+        self.assertTrue(path_filter.matches('fee/models.py'))
+        self.assertTrue(path_filter.matches('apps/fee/models.py'))
+        self.assertFalse(path_filter.matches('coffee/models.py'))
+        self.assertFalse(path_filter.matches('fee_collab/models.py'))
+
+    def test_literal_with_multiple_segments(self):
+        path_filter = PathFilter('shared/utils.py')
+        self.assertTrue(path_filter.matches('underwriter/shared/utils.py'))
+        self.assertFalse(path_filter.matches('shared/other/utils.py'))
+
+    def test_globs(self):
+        path_filter = PathFilter('shared/**/*.py')
+        self.assertTrue(path_filter.matches('shared/utils.py'))
+        self.assertTrue(path_filter.matches('shared/a/b/utils.py'))
+        self.assertFalse(path_filter.matches('shared/a/b/utils.js'))
+        self.assertFalse(path_filter.matches('notshared/utils.py'))
+
+        path_filter = PathFilter('fee*')
+        self.assertTrue(path_filter.matches('fee_collab/models.py'))
+        self.assertFalse(path_filter.matches('coffee/models.py'))
+
+    def test_multiple_patterns(self):
+        path_filter = PathFilter('fee_collab, shared/**/*.py,')
+        self.assertTrue(path_filter.matches('fee_collab/models.py'))
+        self.assertTrue(path_filter.matches('shared/a/utils.py'))
+        self.assertFalse(path_filter.matches('resware/models.py'))
+        self.assertTrue(path_filter.matches_any(['resware/models.py', 'fee_collab/models.py']))
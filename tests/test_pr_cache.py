@@ -0,0 +1,54 @@
+from datetime import datetime
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from helpers.pr_cache import CachedPullRequest, PullRequestCache, get_or_fetch_commit_pulls
+
+
+def generate_cached_pr(number: int) -> CachedPullRequest:
+    return CachedPullRequest(
+        number=number,
+        title=f'PR {number}',
+        html_url=f'https://github.com/StatesTitle/underwriter/pull/{number}',
+        merged_at=datetime(2021, 9, number),
+    )
+
+
+class TestPullRequestCache(TestCase):
+    def setUp(self):
+        self.pr_cache = PullRequestCache(path=':memory:', max_entries=2)
+
+    def test_round_trip(self):
+        self.pr_cache.put('sha-1', [generate_cached_pr(1), generate_cached_pr(2)])
+        self.assertEqual([generate_cached_pr(1), generate_cached_pr(2)], self.pr_cache.get('sha-1'))
+        self.assertIsNone(self.pr_cache.get('sha-2'))
+        self.assertEqual(1, self.pr_cache.hits)
+        self.assertEqual(1, self.pr_cache.misses)
+
+    def test_evicts_least_recently_used(self):
+        self.pr_cache.put('sha-1', [generate_cached_pr(1)])
+        self.pr_cache.put('sha-2', [generate_cached_pr(2)])
+        self.pr_cache.get('sha-1')
+        self.pr_cache.put('sha-3', [generate_cached_pr(3)])
+
+        self.assertEqual(2, len(self.pr_cache))
+        self.assertIsNotNone(self.pr_cache.get('sha-1'))
+        self.assertIsNone(self.pr_cache.get('sha-2'))
+        self.assertIsNotNone(self.pr_cache.get('sha-3'))
+
+    def test_get_or_fetch_only_fetches_once(self):
+        fetch_pulls = MagicMock(return_value=[generate_cached_pr(1)])
+        with patch('helpers.pr_cache.get_pr_cache', return_value=self.pr_cache):
+            get_or_fetch_commit_pulls('sha-1', fetch_pulls)
+            pulls = get_or_fetch_commit_pulls('sha-1', fetch_pulls)
+
+        fetch_pulls.assert_called_once()
+        self.assertEqual([generate_cached_pr(1)], pulls)
+
+    def test_get_or_fetch_does_not_cache_empty_results(self):
+        fetch_pulls = MagicMock(return_value=[])
+        with patch('helpers.pr_cache.get_pr_cache', return_value=self.pr_cache):
+            get_or_fetch_commit_pulls('sha-1', fetch_pulls)
+            get_or_fetch_commit_pulls('sha-1', fetch_pulls)
+
+        self.assertEqual(2, fetch_pulls.call_count)
@@ -0,0 +1,53 @@
+from helpers.metrics import MetricsRegistry, get_listener_timer, instrument_listener, mark_listener_failed
+from helpers.prometheus import render_metrics
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+
+class TestPrometheus(TestCase):
+    def setUp(self):
+        self.metrics_registry = MetricsRegistry()
+        patcher = patch('helpers.metrics._metrics_registry', self.metrics_registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_listener_times_ack_and_queued_work(self):
+        queued_work = []
+
+        def commit_list(ack, command):
+            ack()
+            queued_work.append(get_listener_timer().time_work(mark_listener_failed))
+
+        ack = MagicMock()
+        instrument_listener('/commit-list', commit_list)(ack=ack, command={'text': 'my-app'})
+
+        ack.assert_called_once_with()
+        stats = self.metrics_registry.get_stats()
+        self.assertEqual(1, stats['ack./commit-list']['count'])
+        # Not finished until the queued work has run
+        self.assertNotIn('listener./commit-list', stats)
+
+        queued_work[0]()
+        stats = self.metrics_registry.get_stats()
+        self.assertEqual(1, stats['listener./commit-list']['count'])
+        self.assertEqual(1, stats['listener./commit-list']['errors'])
+
+    def test_renders_histograms_and_counters(self):
+        self.metrics_registry.record_latency('heroku.config-vars', 0.2, 200)
+        self.metrics_registry.record_latency('heroku.config-vars', 3, 503)
+        self.metrics_registry.record_duration('ack.approve_deploy', 0.004)
+
+        metrics = render_metrics()
+
+        self.assertIn('# TYPE slack_deploy_bot_upstream_request_seconds histogram', metrics)
+        self.assertIn('slack_deploy_bot_upstream_request_seconds_bucket{endpoint="heroku.config-vars",le="0.1"} 0',
+                      metrics)
+        self.assertIn('slack_deploy_bot_upstream_request_seconds_bucket{endpoint="heroku.config-vars",le="0.25"} 1',
+                      metrics)
+        self.assertIn('slack_deploy_bot_upstream_request_seconds_bucket{endpoint="heroku.config-vars",le="+Inf"} 2',
+                      metrics)
+        self.assertIn('slack_deploy_bot_upstream_request_seconds_sum{endpoint="heroku.config-vars"} 3.2', metrics)
+        self.assertIn('slack_deploy_bot_upstream_request_errors_total{endpoint="heroku.config-vars"} 1', metrics)
+        self.assertIn('slack_deploy_bot_ack_seconds_count{listener="approve_deploy"} 1', metrics)
+        self.assertIn('slack_deploy_bot_cache_hits_total{cache="compare"}', metrics)
+        self.assertIn('slack_deploy_bot_rate_limit_granted_total{provider="github"}', metrics)
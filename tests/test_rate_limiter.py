@@ -0,0 +1,88 @@
+from threading import Thread
+from unittest import TestCase
+import time
+
+from helpers.rate_limiter import Priority, Provider, RateLimiter, RateLimitExceeded, get_provider, \
+    get_request_priority, request_priority, with_request_priority
+
+LIMITS_PER_HOUR = {provider: 7200 for provider in Provider}  # two requests per second
+BURSTS = {provider: 4 for provider in Provider}
+
+
+class TestRateLimiter(TestCase):
+    def setUp(self):
+        self.rate_limiter = RateLimiter(limits_per_hour=LIMITS_PER_HOUR, bursts=BURSTS)
+
+    def test_throttles_once_burst_is_spent(self):
+        for _ in range(4):
+            self.rate_limiter.acquire(Provider.GITHUB, max_wait_seconds=0)
+        with self.assertRaises(RateLimitExceeded):
+            self.rate_limiter.acquire(Provider.GITHUB, max_wait_seconds=0)
+
+        # Other providers have their own budget
+        self.rate_limiter.acquire(Provider.HEROKU, max_wait_seconds=0)
+        self.assertEqual({'granted': 4, 'throttled': 1},
+                         {key: self.rate_limiter.get_stats()['github'][key] for key in ('granted', 'throttled')})
+
+    def test_reported_remaining_caps_budget(self):
+        self.rate_limiter.update(Provider.GITHUB, {'X-RateLimit-Remaining': '1', 'X-RateLimit-Limit': '5000',
+                                                   'X-RateLimit-Reset': str(time.time() + 600)})
+        self.rate_limiter.acquire(Provider.GITHUB, max_wait_seconds=0)
+        with self.assertRaises(RateLimitExceeded):
+            self.rate_limiter.acquire(Provider.GITHUB, max_wait_seconds=1)
+
+    def test_reported_remaining_replaces_burst(self):
+        self.rate_limiter.update(Provider.GITHUB, {'X-RateLimit-Remaining': '4000', 'X-RateLimit-Limit': '5000',
+                                                   'X-RateLimit-Reset': str(time.time() + 600)})
+        for _ in range(10):
+            self.rate_limiter.acquire(Provider.GITHUB, max_wait_seconds=0)
+        self.assertEqual(3990, self.rate_limiter.get_stats()['github']['remaining'])
+
+    def test_budget_restored_at_reported_reset(self):
+        self.rate_limiter.update(Provider.GITHUB, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Limit': '5000',
+                                                   'X-RateLimit-Reset': str(time.time() + 0.2)})
+        self.rate_limiter.acquire(Provider.GITHUB, max_wait_seconds=1)
+        self.assertEqual(4999, self.rate_limiter.get_stats()['github']['remaining'])
+
+    def test_background_leaves_reserve_for_interactive(self):
+        self.rate_limiter.update(Provider.HEROKU, {'RateLimit-Remaining': '100'})
+        with self.assertRaises(RateLimitExceeded):
+            self.rate_limiter.acquire(Provider.HEROKU, priority=Priority.BACKGROUND, max_wait_seconds=0)
+        self.rate_limiter.acquire(Provider.HEROKU, priority=Priority.INTERACTIVE, max_wait_seconds=0)
+
+    def test_background_waits_for_interactive(self):
+        for _ in range(4):
+            self.rate_limiter.acquire(Provider.CIRCLE_CI, max_wait_seconds=0)
+
+        granted = []
+
+        def acquire(priority: Priority, delay: float):
+            time.sleep(delay)
+            self.rate_limiter.acquire(Provider.CIRCLE_CI, priority=priority, max_wait_seconds=5)
+            granted.append(priority)
+
+        threads = [Thread(target=acquire, args=(Priority.BACKGROUND, 0)),
+                   Thread(target=acquire, args=(Priority.INTERACTIVE, 0.1))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(Priority.INTERACTIVE, granted[0])
+
+    def test_priority_context(self):
+        self.assertIs(Priority.INTERACTIVE, get_request_priority())
+        with request_priority(Priority.BACKGROUND):
+            carried = with_request_priority(get_request_priority)
+        self.assertIs(Priority.INTERACTIVE, get_request_priority())
+
+        results = []
+        thread = Thread(target=lambda: results.append(carried()))
+        thread.start()
+        thread.join()
+        self.assertEqual([Priority.BACKGROUND], results)
+
+    def test_get_provider(self):
+        self.assertIs(Provider.GITHUB, get_provider('https://api.github.com/repos/o/r/branches/stable'))
+        self.assertIs(Provider.GITHUB_GRAPHQL, get_provider('https://api.github.com/graphql'))
+        self.assertIs(Provider.CIRCLE_CI, get_provider('https://circleci.com/api/v2/workflow/1/job'))
+        self.assertIsNone(get_provider('http://127.0.0.1:8080/graphql'))
@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from requests import Response
+from unittest import TestCase
+from unittest.mock import patch
+import json
+
+from helpers.commit_index import StableCommitIndex
+from helpers.pr_cache import PullRequestCache
+from helpers.release_store import Release, ReleaseStore, parse_release
+from tests.test_commit_index import FakeCommit, FakeRepository
+
+
+def generate_release(version: int, created_at: str, description: str = '', status: str = 'succeeded') -> dict:
+    return {'version': version, 'created_at': created_at, 'description': description, 'status': status}
+
+
+def generate_response(status_code: int, releases: list, headers=None) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response._content = json.dumps(releases).encode('utf-8')
+    response.headers.update(headers or {})
+    return response
+
+
+class TestReleaseStore(TestCase):
+    def setUp(self):
+        self.release_store = ReleaseStore(path=':memory:')
+
+    def record(self, *releases: dict) -> None:
+        for release in releases:
+            self.release_store.record_release(parse_release('hello_docker', release))
+
+    def test_release_at_time(self):
+        self.record(
+            generate_release(1, '2021-11-01T10:00:00Z', 'Deploy aaaaaaa'),
+            generate_release(2, '2021-11-01T13:00:00Z', 'Deploy bbbbbbb'),
+            generate_release(3, '2021-11-01T15:00:00Z', 'Deploy ccccccc', status='failed'),
+            generate_release(4, '2021-11-01T16:00:00Z', 'Rollback to v1'),
+        )
+        at = lambda hour: datetime(2021, 11, 1, hour, tzinfo=timezone.utc)
+
+        self.assertIsNone(self.release_store.get_release_at('hello_docker', at(9)))
+        self.assertEqual('bbbbbbb', self.release_store.get_release_at('hello_docker', at(14)).sha)
+        self.assertEqual('bbbbbbb', self.release_store.get_release_at('hello_docker', at(15)).sha)
+        self.assertEqual('aaaaaaa', self.release_store.get_release_at('hello_docker', at(17)).sha)
+        self.assertEqual([1, 4], [release.version for release in self.release_store.get_releases_by_sha('aaaaaaa')])
+
+    def test_webhook_sha_survives_release_update(self):
+        self.record(generate_release(5, '2021-11-01T10:00:00Z', 'Deployed web (0123abcd)', status='pending'))
+        self.release_store.set_release_sha('hello_docker', 5, 'abc123')
+        self.record(generate_release(5, '2021-11-01T10:00:00Z', 'Deployed web (0123abcd)'))
+
+        release = self.release_store.get_current_release('hello_docker')
+        self.assertEqual(('succeeded', 'abc123'), (release.status, release.sha))
+
+    def test_release_without_sha_takes_earlier_sha(self):
+        self.record(
+            generate_release(1, '2021-11-01T10:00:00Z', 'Deploy aaaaaaa'),
+            generate_release(2, '2021-11-01T11:00:00Z', 'Deploy bbbbbbb', status='failed'),
+            generate_release(3, '2021-11-01T12:00:00Z', 'Set FOO config vars'),
+        )
+
+        at_noon = datetime(2021, 11, 1, 12, tzinfo=timezone.utc)
+        self.assertEqual('aaaaaaa', self.release_store.get_release_at('hello_docker', at_noon).sha)
+        self.assertEqual('aaaaaaa', self.release_store.get_current_release('hello_docker').sha)
+        self.assertIsNone(self.release_store.get_current_release('hello_docker', with_earlier_sha=False).sha)
+
+    @patch('helpers.release_store.http_get', return_value=generate_response(200, []))
+    def test_sync_needed_only_after_ttl(self, mock_http_get):
+        self.assertTrue(self.release_store.needs_sync('hello_docker'))
+        self.release_store.sync('hello_docker')
+        self.assertFalse(self.release_store.needs_sync('hello_docker'))
+
+        self.release_store.sync_ttl_seconds = 0
+        self.assertTrue(self.release_store.needs_sync('hello_docker'))
+
+    @patch('helpers.release_store.http_get')
+    def test_sync_fetches_only_new_releases(self, mock_http_get):
+        mock_http_get.side_effect = [
+            generate_response(200, [generate_release(2, '2021-11-01T11:00:00Z'),
+                                    generate_release(1, '2021-11-01T10:00:00Z')]),
+            generate_response(206, [generate_release(3, '2021-11-01T12:00:00Z')], {'Next-Range': 'version ]3..'}),
+            generate_response(200, [generate_release(4, '2021-11-01T13:00:00Z')]),
+        ]
+        self.assertEqual(2, self.release_store.sync('hello_docker'))
+        self.assertEqual(2, self.release_store.sync('hello_docker'))
+
+        self.assertEqual(4, self.release_store.get_latest_version('hello_docker'))
+        ranges = [kwargs['headers']['Range'] for _, kwargs in mock_http_get.call_args_list]
+        self.assertTrue(ranges[0].startswith('version ..; order=desc'))
+        self.assertTrue(ranges[1].startswith('version ]2..; order=asc'))
+        self.assertEqual('version ]3..', ranges[2])
+
+    @patch('helpers.pr_cache.get_pr_cache', return_value=PullRequestCache(path=':memory:'))
+    def test_apps_containing_commit(self, mock_get_pr_cache):
+        first = FakeCommit('a1' * 20)
+        second = FakeCommit('b2' * 20, parent=first)
+        third = FakeCommit('c3' * 20, parent=second)
+        commit_index = StableCommitIndex(get_repo=lambda: FakeRepository(third), branch='stable', path=':memory:')
+        commit_index.append_commits([first, second, third])
+
+        for app_name, sha in (('app-a', 'b2b2b2b'), ('app-b', first.sha), ('app-c', None)):
+            self.release_store.record_release(Release(app_name=app_name, version=1, status='succeeded',
+                                                      created_at=datetime(2021, 11, 1, tzinfo=timezone.utc),
+                                                      description='', sha=sha))
+
+        containing = self.release_store.get_apps_containing(second.sha, ['app-a', 'app-b', 'app-c', 'app-d'],
+                                                            commit_index=commit_index)
+        self.assertEqual({'app-a': True, 'app-b': False, 'app-c': None, 'app-d': None}, containing)
+        self.assertTrue(self.release_store.get_apps_containing(first.sha, ['app-a'], commit_index)['app-a'])
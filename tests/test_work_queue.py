@@ -0,0 +1,81 @@
+from helpers.metrics import MetricsRegistry
+from helpers.work_queue import WorkQueue, WorkQueueFullError
+from threading import Event
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+import time
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for the work queue')
+        time.sleep(0.005)
+
+
+class TestWorkQueue(TestCase):
+    def setUp(self):
+        self.metrics_registry = MetricsRegistry()
+        patcher = patch('helpers.metrics._metrics_registry', self.metrics_registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release = Event()
+        self.addCleanup(self.release.set)
+
+    def test_command_limit_queues_without_blocking_other_commands(self):
+        work_queue = WorkQueue(max_workers=3, max_depth=10, command_limit=1)
+        finished = []
+
+        self.assertEqual(0, work_queue.submit('commit-list', self.release.wait))
+        self.assertEqual(1, work_queue.submit('commit-list', lambda: finished.append('commit-list')))
+        # Another command still starts straight away, ahead of the queued commit-list
+        self.assertEqual(0, work_queue.submit('latest-deploy', lambda: finished.append('latest-deploy')))
+        # The job's slot is freed just after it finishes
+        wait_for(lambda: finished == ['latest-deploy'] and work_queue.get_stats()['running'] == 1)
+        self.assertEqual({'depth': 1, 'running': 1, 'refused': 0}, work_queue.get_stats())
+
+        self.release.set()
+        wait_for(lambda: work_queue.get_stats()['running'] == 0)
+        self.assertEqual(['latest-deploy', 'commit-list'], finished)
+
+        stats = self.metrics_registry.get_stats()
+        self.assertEqual(2, stats['work_queue.run.commit-list']['count'])
+        self.assertEqual(2, stats['work_queue.wait.commit-list']['count'])
+        self.assertGreater(stats['work_queue.wait.commit-list']['max_seconds'], 0)
+        self.assertEqual(0, self.metrics_registry.get_gauges()['work_queue.depth'])
+
+    def test_refuses_jobs_beyond_max_depth(self):
+        work_queue = WorkQueue(max_workers=1, max_depth=2, command_limits={})
+        positions = [work_queue.submit('commit-list', self.release.wait) for _ in range(3)]
+        self.assertEqual([0, 1, 2], positions)
+        with self.assertRaises(WorkQueueFullError):
+            work_queue.submit('latest-deploy', self.release.wait)
+        self.assertEqual(1, work_queue.get_stats()['refused'])
+
+    def test_failed_job_frees_its_slot(self):
+        work_queue = WorkQueue(max_workers=1, max_depth=10, command_limits={})
+        finished = Event()
+
+        def fail():
+            raise RuntimeError('GitHub is down')
+
+        work_queue.submit('commit-list', fail)
+        work_queue.submit('commit-list', finished.set)
+        self.assertTrue(finished.wait(5))
+        wait_for(lambda: self.metrics_registry.get_stats().get('work_queue.run.commit-list', {}).get('count') == 2)
+        self.assertEqual(1, self.metrics_registry.get_stats()['work_queue.run.commit-list']['errors'])
+
+    def test_queued_notice_leaves_response_url_to_the_work(self):
+        from listeners import run_queued
+
+        work_queue = WorkQueue(max_workers=1, max_depth=10, command_limit=1)
+        work_queue.submit('commit-list', self.release.wait)
+        respond = MagicMock()
+        with patch('listeners.get_work_queue', return_value=work_queue), patch('listeners.client') as mock_client:
+            run_queued('commit-list', 'CBR2V3XEX', 'user123', respond, lambda: None)
+
+        _, kwargs = mock_client.chat_postEphemeral.call_args
+        self.assertEqual(('CBR2V3XEX', 'user123'), (kwargs['channel'], kwargs['user']))
+        self.assertIn('position 1', kwargs['text'])
+        respond.assert_not_called()
@@ -0,0 +1,128 @@
+from commands.deploy_prompt import APPROVAL_PENDING_STATUS, generate_deploy_prompt_blocks, get_final_approval_job
+from fnmatch import fnmatchcase
+from helpers.command_helpers import CIRCLE_CI_APPROVAL_CHANNEL, CIRCLE_CI_TOKEN, CIRCLE_CI_WEBHOOK_SECRET, \
+    SlackHerokuDeployError
+from helpers.pending_approvals import get_pending_approval_store
+from helpers.rate_limiter import Priority, request_priority
+from slack_sdk import WebClient
+from threading import Thread
+from typing import Mapping, Optional
+import hashlib
+import hmac
+import json
+import logging
+import os
+
+LOG = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'circleci-signature'
+SIGNATURE_VERSION = 'v1'
+WORKFLOW_COMPLETED = 'workflow-completed'
+JOB_COMPLETED = 'job-completed'
+JOB_SUCCEEDED = 'success'
+# Branches whose approvals are looked up as their jobs complete, costing a CircleCI call per job
+CIRCLE_CI_APPROVAL_BRANCHES = os.environ.get('CIRCLE_CI_APPROVAL_BRANCHES', 'release/*')
+
+
+class CircleCIWebhookError(SlackHerokuDeployError):
+    pass
+
+
+class CircleCIWebhook:
+    """ Handles CircleCI project webhooks for `workflow-completed` and `job-completed` events, keeping the
+    pending approval table that /deploy-by-branch reads up to date
+    """
+    def __init__(self,
+                 body: bytes,
+                 headers: Mapping[str, str],
+                 web_client: Optional[WebClient] = None,
+                 secret: Optional[str] = CIRCLE_CI_WEBHOOK_SECRET,
+                 circle_ci_token: Optional[str] = CIRCLE_CI_TOKEN,
+                 approval_channel: Optional[str] = CIRCLE_CI_APPROVAL_CHANNEL):
+        self.body = body
+        self.headers = headers
+        self.web_client = web_client
+        self.secret = secret
+        self.circle_headers = {'Circle-Token': circle_ci_token}
+        self.approval_channel = approval_channel
+
+    def handle(self) -> Optional[str]:
+        """ Track the newest workflow of the event's branch. Its approval job is looked up in the background as
+        jobs complete, and cleared once the workflow or the approval job itself completes. Returns the branch name,
+        if any.
+        """
+        self.verify_signature()
+
+        payload = json.loads(self.body)
+        event_type = payload.get('type')
+        if event_type not in (WORKFLOW_COMPLETED, JOB_COMPLETED):
+            LOG.info(f'Ignoring CircleCI webhook for {event_type}')
+            return None
+
+        pipeline = payload['pipeline']
+        vcs = pipeline.get('vcs') or {}
+        branch_name = vcs.get('branch')
+        if not branch_name:
+            return None
+
+        workflow_id = payload['workflow']['id']
+        pending_approval_store = get_pending_approval_store()
+        is_newest = pending_approval_store.record_workflow(
+            branch_name=branch_name, pipeline_id=pipeline['id'], pipeline_number=pipeline['number'],
+            workflow_id=workflow_id, commit_sha=vcs.get('revision', ''),
+            commit_subject=(vcs.get('commit') or {}).get('subject', '')
+        )
+        if not is_newest:
+            LOG.info(f'Ignoring {event_type} for an older pipeline of {branch_name}')
+            return branch_name
+
+        approval_job_id = pending_approval_store.get(branch_name).job_id
+        if event_type == WORKFLOW_COMPLETED or (approval_job_id and payload['job'].get('id') == approval_job_id):
+            # The workflow holding the approval is over, or its approval was given in CircleCI itself. Other
+            # workflows of the pipeline completing leave it be.
+            pending_approval_store.clear_approval_job(branch_name, workflow_id)
+        elif payload['job'].get('status') == JOB_SUCCEEDED and fnmatchcase(branch_name, CIRCLE_CI_APPROVAL_BRANCHES) \
+                and not approval_job_id:
+            Thread(target=self.discover_pending_approval, args=(branch_name, pipeline['id'], workflow_id),
+                   daemon=True).start()
+        return branch_name
+
+    def discover_pending_approval(self, branch_name: str, pipeline_id: str, workflow_id: str) -> None:
+        """ Record the workflow's approval job once it's on hold, announcing it in the approval channel unless
+        one of the pipeline's workflows already has its approval recorded
+        """
+        try:
+            with request_priority(Priority.BACKGROUND):
+                final_approval = get_final_approval_job(workflow_id=workflow_id, circle_headers=self.circle_headers)
+        except Exception as e:
+            LOG.error(f'Unable to look up the approval job of {branch_name} workflow {workflow_id}: {e}')
+            return
+        if not final_approval or final_approval.get('status') != APPROVAL_PENDING_STATUS:
+            return
+
+        if get_pending_approval_store().set_approval_job(branch_name, pipeline_id, workflow_id, final_approval['id']):
+            self.post_approval_prompt(branch_name)
+
+    def post_approval_prompt(self, branch_name: str) -> None:
+        pending_approval = get_pending_approval_store().get(branch_name)
+        if not self.web_client or not self.approval_channel or not pending_approval.job_id:
+            return
+
+        blocks = generate_deploy_prompt_blocks(
+            branch_name=branch_name, recipient=None, commit_subject=pending_approval.commit_subject,
+            commit_sha=pending_approval.commit_sha, workflow_id=pending_approval.workflow_id,
+            job_id=pending_approval.job_id
+        )
+        self.web_client.chat_postMessage(channel=self.approval_channel, blocks=json.dumps(blocks),
+                                         text=f'{branch_name} is waiting for approval')
+
+    def verify_signature(self) -> None:
+        if not self.secret:
+            raise CircleCIWebhookError('No CIRCLE_CI_WEBHOOK_SECRET configured')
+
+        expected_signature = hmac.new(self.secret.encode('utf-8'), self.body, hashlib.sha256).hexdigest()
+        # e.g. `v1=<hex digest>`, possibly alongside signatures of other versions
+        signatures = dict(signature.split('=', 1) for signature in self.headers.get(SIGNATURE_HEADER, '').split(',')
+                          if '=' in signature)
+        if not hmac.compare_digest(expected_signature, signatures.get(SIGNATURE_VERSION, '')):
+            raise CircleCIWebhookError('Invalid CircleCI webhook signature')
@@ -0,0 +1,69 @@
+from helpers.command_helpers import HEROKU_WEBHOOK_SECRET, SlackHerokuDeployError
+from helpers.deployed_hash_cache import get_cached_heroku_git_hash, get_deployed_hash_cache
+from helpers.rate_limiter import Priority, request_priority
+from helpers.release_store import get_release_store, parse_release
+from threading import Thread
+from typing import Mapping, Optional
+import base64
+import hashlib
+import hmac
+import json
+import logging
+
+LOG = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'Heroku-Webhook-Hmac-SHA256'
+RELEASE_RESOURCE = 'release'
+RELEASE_SUCCEEDED = 'succeeded'
+
+
+class HerokuReleaseWebhookError(SlackHerokuDeployError):
+    pass
+
+
+class HerokuReleaseWebhook:
+    """ Handles Heroku app webhooks for the `api:release` entity, e.g. subscribed with
+    heroku webhooks:add -i api:release -l notify -u https://<bot>/webhooks/heroku/release -s <secret> -a <app>
+    """
+    def __init__(self, body: bytes, headers: Mapping[str, str], secret: Optional[str] = HEROKU_WEBHOOK_SECRET):
+        self.body = body
+        self.headers = headers
+        self.secret = secret
+
+    def handle(self) -> Optional[str]:
+        """ Record the release and drop the cached deployed git hash of the released app, refetching it
+        in the background once the release succeeds. Returns the app name, if any.
+        """
+        self.verify_signature()
+
+        payload = json.loads(self.body)
+        if payload.get('resource') != RELEASE_RESOURCE:
+            LOG.info(f'Ignoring Heroku webhook for {payload.get("resource")}')
+            return None
+
+        release = payload['data']
+        app_name = release['app']['name']
+        LOG.info(f'Heroku release {release.get("version")} for {app_name} is {release.get("status")}')
+        get_release_store().record_release(parse_release(app_name, release))
+        get_deployed_hash_cache().invalidate(app_name)
+        if release.get('status') == RELEASE_SUCCEEDED:
+            Thread(target=refresh_released_git_hash, args=(app_name, release['version']), daemon=True).start()
+        return app_name
+
+    def verify_signature(self) -> None:
+        if not self.secret:
+            raise HerokuReleaseWebhookError('No HEROKU_WEBHOOK_SECRET configured')
+
+        digest = hmac.new(self.secret.encode('utf-8'), self.body, hashlib.sha256).digest()
+        expected_signature = base64.b64encode(digest).decode('utf-8')
+        if not hmac.compare_digest(expected_signature, self.headers.get(SIGNATURE_HEADER, '')):
+            raise HerokuReleaseWebhookError('Invalid Heroku webhook signature')
+
+
+def refresh_released_git_hash(app_name: str, version: int) -> None:
+    """ Re-warm the deployed git hash cache, recording the hash against the release for point-in-time lookups
+    """
+    with request_priority(Priority.BACKGROUND):
+        git_hash = get_cached_heroku_git_hash(app_name, force_refresh=True)
+    if git_hash:
+        get_release_store().set_release_sha(app_name, version, git_hash)